@@ -0,0 +1,278 @@
+"""
+Compact binary encoding for ASTs built from ast_nodes.py.
+
+Layout of a stream:
+
+    header  := MAGIC varint(FORMAT_VERSION)
+    value   := varint(tag) payload
+
+Nodes are written in prefix order: the tag of a node is NODE_BASE + kind,
+then varint(line) (0 when the node has no source line), then the values of
+its _fields in order. Lists and tuples carry a
+varint element count. Strings (identifiers, operators, literals) go through
+a string table that is built while streaming: the first occurrence is
+written inline with STR_NEW and every later one is a STR_REF index, so the
+decoder rebuilds the same table as it reads.
+
+Several values may be written to one stream; each call to
+ASTEncoder.write() / ASTDecoder.read() handles one top-level value
+(usually the statement list returned by Parser.parse()).
+"""
+
+import struct
+
+from ast_nodes import *
+
+MAGIC = b'MCAST'
+FORMAT_VERSION = 2
+
+# Node kinds. The index of a class is its wire id, so new node types must
+# only ever be appended (and FORMAT_VERSION bumped if the layout changes).
+NODE_KINDS = (
+    Program, Block, FunctionDeclaration, VariableDeclaration,
+    ExpressionStatement, AssignmentExpression, IfStatement, WhileStatement,
+    ForStatement, BreakStatement, ContinueStatement, SwitchStatement,
+    SwitchCase, ReturnStatement, BinaryOperation, UnaryOperation,
+    FunctionCallNode, VariableNode, Number, StringNode, CharNode,
+)
+KIND_OF = {cls: kind for kind, cls in enumerate(NODE_KINDS)}
+
+# Value tags
+T_NONE = 0
+T_FALSE = 1
+T_TRUE = 2
+T_STR_NEW = 3
+T_STR_REF = 4
+T_LIST = 5
+T_TUPLE = 6
+T_INT = 7
+T_FLOAT = 8
+NODE_BASE = 16
+
+_DOUBLE = struct.Struct('<d')
+
+
+def _write_varint(buf, n):
+    while n > 0x7f:
+        buf.append((n & 0x7f) | 0x80)
+        n >>= 7
+    buf.append(n)
+
+
+class ASTEncoder:
+    def __init__(self, out, chunk_size=65536):
+        self.out = out
+        self.chunk_size = chunk_size
+        self.buf = bytearray(MAGIC)
+        _write_varint(self.buf, FORMAT_VERSION)
+        self.strings = {}
+
+    def write(self, value):
+        buf = self.buf
+        strings = self.strings
+        stack = [value]
+        while stack:
+            value = stack.pop()
+            cls = type(value)
+
+            if value is None:
+                buf.append(T_NONE)
+            elif cls is str:
+                idx = strings.get(value)
+                if idx is None:
+                    strings[value] = len(strings)
+                    data = value.encode('utf-8')
+                    buf.append(T_STR_NEW)
+                    _write_varint(buf, len(data))
+                    buf += data
+                else:
+                    buf.append(T_STR_REF)
+                    _write_varint(buf, idx)
+            elif cls is bool:
+                buf.append(T_TRUE if value else T_FALSE)
+            elif cls is list or cls is tuple:
+                buf.append(T_LIST if cls is list else T_TUPLE)
+                _write_varint(buf, len(value))
+                stack.extend(reversed(value))
+            elif cls is int:
+                buf.append(T_INT)
+                _write_varint(buf, (value << 1) if value >= 0 else ((-value << 1) - 1))
+            elif cls is float:
+                buf.append(T_FLOAT)
+                buf += _DOUBLE.pack(value)
+            else:
+                kind = KIND_OF.get(cls)
+                if kind is None:
+                    raise TypeError(f"Cannot encode value of type {cls.__name__}")
+                _write_varint(buf, NODE_BASE + kind)
+                _write_varint(buf, value.line or 0)
+                stack.extend(getattr(value, f) for f in reversed(cls._fields))
+
+            if len(buf) >= self.chunk_size:
+                self.flush()
+
+    def flush(self):
+        if self.buf:
+            self.out.write(bytes(self.buf))
+            self.buf.clear()
+
+
+class ASTDecoder:
+    def __init__(self, src, chunk_size=65536):
+        self.src = src
+        self.chunk_size = chunk_size
+        self.buf = b''
+        self.pos = 0
+        self.strings = []
+
+        magic = self._read_bytes(len(MAGIC))
+        if magic != MAGIC:
+            raise ValueError("Not an AST stream (bad magic)")
+        version = self._read_varint()
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported AST format version {version} (expected {FORMAT_VERSION})")
+
+    def _fill(self, need):
+        # Make sure at least `need` unread bytes are buffered.
+        if len(self.buf) - self.pos >= need:
+            return True
+        chunks = [self.buf[self.pos:]]
+        have = len(chunks[0])
+        while have < need:
+            chunk = self.src.read(max(self.chunk_size, need - have))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            have += len(chunk)
+        self.buf = b''.join(chunks)
+        self.pos = 0
+        return have >= need
+
+    def _read_bytes(self, n):
+        if not self._fill(n):
+            raise ValueError("Truncated AST stream")
+        data = self.buf[self.pos:self.pos + n]
+        self.pos += n
+        return data
+
+    def _read_varint(self):
+        result = 0
+        shift = 0
+        while True:
+            if self.pos >= len(self.buf) and not self._fill(1):
+                raise ValueError("Truncated AST stream")
+            byte = self.buf[self.pos]
+            self.pos += 1
+            result |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+
+    def at_end(self):
+        return not self._fill(1)
+
+    def read(self):
+        strings = self.strings
+        # Open containers: [kind or container type, expected count, collected values, line]
+        stack = []
+        while True:
+            # Tags almost always fit in one byte; skip the varint loop for those.
+            pos = self.pos
+            buf = self.buf
+            if pos < len(buf) and buf[pos] < 0x80:
+                tag = buf[pos]
+                self.pos = pos + 1
+            else:
+                tag = self._read_varint()
+
+            if tag == T_NONE:
+                value = None
+            elif tag == T_STR_REF:
+                value = strings[self._read_varint()]
+            elif tag == T_STR_NEW:
+                value = self._read_bytes(self._read_varint()).decode('utf-8')
+                strings.append(value)
+            elif tag == T_FALSE:
+                value = False
+            elif tag == T_TRUE:
+                value = True
+            elif tag == T_INT:
+                n = self._read_varint()
+                value = (n >> 1) if not n & 1 else -((n + 1) >> 1)
+            elif tag == T_FLOAT:
+                value = _DOUBLE.unpack(self._read_bytes(8))[0]
+            elif tag == T_LIST or tag == T_TUPLE:
+                count = self._read_varint()
+                if count:
+                    stack.append([list if tag == T_LIST else tuple, count, [], 0])
+                    continue
+                value = [] if tag == T_LIST else ()
+            elif tag >= NODE_BASE and tag - NODE_BASE < len(NODE_KINDS):
+                cls = NODE_KINDS[tag - NODE_BASE]
+                line = self._read_varint()
+                if cls._fields:
+                    stack.append([cls, len(cls._fields), [], line])
+                    continue
+                value = cls.__new__(cls)
+                if line:
+                    value.line = line
+            else:
+                raise ValueError(f"Unknown tag {tag} in AST stream")
+
+            # Hand the finished value to its parent, closing every container it completes.
+            while stack:
+                frame = stack[-1]
+                frame[2].append(value)
+                if len(frame[2]) < frame[1]:
+                    break
+                stack.pop()
+                kind, _, values, line = frame
+                if kind is list:
+                    value = values
+                elif kind is tuple:
+                    value = tuple(values)
+                else:
+                    value = kind.__new__(kind)
+                    value.__dict__.update(zip(kind._fields, values))
+                    if line:
+                        value.line = line
+            else:
+                return value
+
+
+def dump(node, fp):
+    encoder = ASTEncoder(fp)
+    encoder.write(node)
+    encoder.flush()
+
+
+def dumps(node):
+    out = _ByteSink()
+    dump(node, out)
+    return b''.join(out.parts)
+
+
+def load(fp):
+    return ASTDecoder(fp).read()
+
+
+def loads(data):
+    return ASTDecoder(_ByteSource(data)).read()
+
+
+class _ByteSink:
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(data)
+
+
+class _ByteSource:
+    # Hands the whole buffer over on the first read so loads() never copies in chunks.
+    def __init__(self, data):
+        self.data = data
+
+    def read(self, n=-1):
+        data, self.data = self.data, b''
+        return data
@@ -0,0 +1,113 @@
+"""
+Structured JSON output for ASTs built from ast_nodes.py.
+
+Every node becomes
+
+    {"kind": "BinaryOperation", "line": 3,
+     "fields": {"operator": "+"},
+     "children": {"left": {...}, "right": {...}}}
+
+where "fields" holds the plain attributes (names, operators, literal text,
+parameter lists) and "children" the attributes that hold nodes or lists of
+nodes. A top-level statement list is encoded as a JSON array.
+
+iter_json() walks the tree with an explicit stack and yields the document
+as text chunks, so the whole tree is never built as nested dicts and can be
+streamed straight into a response or file.
+"""
+
+from json.encoder import encode_basestring_ascii as _quote
+
+from ast_nodes import ASTNode, Number, StringNode, CharNode
+
+# Attributes that never hold nodes; everything else in _fields is a child slot
+# (a node, a list of nodes, or null when the slot is empty).
+SCALAR_FIELDS = {'name', 'operator', 'postfix', 'var_type', 'return_type', 'parameters'}
+LITERAL_KINDS = (Number, StringNode, CharNode)
+
+
+class _Raw(str):
+    # Marks JSON punctuation on the work stack, so it is never mistaken for a string value
+    pass
+
+
+_CLOSE_NODE = _Raw('}}')
+_CLOSE_LIST = _Raw(']')
+_COMMA = _Raw(',')
+
+_layouts = {}
+
+
+def _layout(cls):
+    # (scalar field names, [(child field name, raw key prefix)]) for a node class, computed once
+    layout = _layouts.get(cls)
+    if layout is None:
+        literal = issubclass(cls, LITERAL_KINDS)
+        scalars = tuple(f for f in cls._fields if f in SCALAR_FIELDS or (literal and f == 'value'))
+        children = [f for f in cls._fields if f not in scalars]
+        keys = [(f, _Raw((',' if i else '') + _quote(f) + ':')) for i, f in enumerate(children)]
+        layout = _layouts[cls] = (scalars, keys[::-1])
+    return layout
+
+
+def _scalar(value):
+    if value is None:
+        return 'null'
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    if isinstance(value, str):
+        return _quote(value)
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, (list, tuple)):
+        return '[' + ','.join(_scalar(v) for v in value) + ']'
+    return _quote(str(value))
+
+
+def iter_json(node, chunk_size=8192):
+    parts = []
+    size = 0
+    # Work stack of pending output: literal strings, or values still to encode.
+    stack = [node]
+    while stack:
+        item = stack.pop()
+
+        if type(item) is _Raw:
+            piece = item
+        elif isinstance(item, ASTNode):
+            scalars, children = _layout(type(item))
+            line = 'null' if item.line is None else str(item.line)
+            piece = (
+                '{"kind":' + _quote(type(item).__name__) + ',"line":' + line
+                + ',"fields":{' + ','.join(_quote(name) + ':' + _scalar(getattr(item, name)) for name in scalars)
+                + '},"children":{'
+            )
+            stack.append(_CLOSE_NODE)
+            for name, key in children:
+                stack.append(getattr(item, name))
+                stack.append(key)
+        elif isinstance(item, (list, tuple)):
+            piece = '['
+            stack.append(_CLOSE_LIST)
+            for i in range(len(item) - 1, -1, -1):
+                stack.append(item[i])
+                if i:
+                    stack.append(_COMMA)
+        else:
+            piece = _scalar(item)
+
+        parts.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield ''.join(parts)
+            parts = []
+            size = 0
+
+    if parts:
+        yield ''.join(parts)
+
+
+def to_json(node):
+    return ''.join(iter_json(node))
@@ -1,9 +1,15 @@
 class ASTNode:
-    pass
+    # Names of the attributes that make up a node, in constructor order.
+    # Used by code that walks or serializes trees generically.
+    _fields = ()
+    # Source line of the node's first token, set by the Parser (None if unknown)
+    line = None
 
 # === Expressions ===
 
 class VariableNode(ASTNode):
+    _fields = ('name',)
+
     def __init__(self, name):
         self.name = name
 
@@ -14,6 +20,8 @@ class VariableNode(ASTNode):
         return self.name
 
 class Number(ASTNode):
+    _fields = ('value',)
+
     def __init__(self, value):
         self.value = value
 
@@ -24,6 +32,8 @@ class Number(ASTNode):
         return str(self.value)
 
 class StringNode(ASTNode):
+    _fields = ('value',)
+
     def __init__(self, value):
         self.value = value
 
@@ -34,6 +44,8 @@ class StringNode(ASTNode):
         return f'"{self.value}"'
 
 class CharNode(ASTNode):
+    _fields = ('value',)
+
     def __init__(self, value):
         self.value = value
 
@@ -44,6 +56,8 @@ class CharNode(ASTNode):
         return f"'{self.value}'"
 
 class UnaryOperation(ASTNode):
+    _fields = ('operator', 'operand', 'postfix')
+
     def __init__(self, operator, operand, postfix=False):
         self.operator = operator
         self.operand = operand
@@ -58,6 +72,8 @@ class UnaryOperation(ASTNode):
         return f"{self.operator}{self.operand}"
 
 class BinaryOperation(ASTNode):
+    _fields = ('operator', 'left', 'right')
+
     def __init__(self, operator, left, right):
         self.operator = operator
         self.left = left
@@ -70,6 +86,8 @@ class BinaryOperation(ASTNode):
         return f"({self.left} {self.operator} {self.right})"
 
 class FunctionCallNode(ASTNode):
+    _fields = ('name', 'args')
+
     def __init__(self, name, args):
         self.name = name
         self.args = args
@@ -83,6 +101,8 @@ class FunctionCallNode(ASTNode):
 # === Statements ===
 
 class ExpressionStatement(ASTNode):
+    _fields = ('expression',)
+
     def __init__(self, expression):
         self.expression = expression
 
@@ -93,6 +113,8 @@ class ExpressionStatement(ASTNode):
         return f"{self.expression};"
 
 class VariableDeclaration(ASTNode):
+    _fields = ('var_type', 'name', 'initializer')
+
     def __init__(self, var_type, name, initializer=None):
         self.var_type = var_type
         self.name = name
@@ -107,6 +129,8 @@ class VariableDeclaration(ASTNode):
         return f"{self.var_type} {self.name};"
     
 class AssignmentExpression(ASTNode):
+    _fields = ('operator', 'left', 'right')
+
     def __init__(self, operator, left, right):
         self.operator = operator  # '=', '+=', '-=', etc.
         self.left = left          # should be VariableNode or something assignable
@@ -120,6 +144,8 @@ class AssignmentExpression(ASTNode):
 
 
 class IfStatement(ASTNode):
+    _fields = ('condition', 'then_branch', 'else_branch')
+
     def __init__(self, condition, then_branch, else_branch=None):
         self.condition = condition
         self.then_branch = then_branch
@@ -135,6 +161,8 @@ class IfStatement(ASTNode):
         return result
 
 class WhileStatement(ASTNode):
+    _fields = ('condition', 'body')
+
     def __init__(self, condition, body):
         self.condition = condition
         self.body = body
@@ -146,6 +174,8 @@ class WhileStatement(ASTNode):
         return f"while ({self.condition}) {self.body}"
 
 class ForStatement(ASTNode):
+    _fields = ('init', 'condition', 'increment', 'body')
+
     def __init__(self, init, condition, increment, body):
         self.init = init
         self.condition = condition
@@ -159,6 +189,8 @@ class ForStatement(ASTNode):
         return f"for ({self.init}; {self.condition}; {self.increment}) {self.body}"
 
 class BreakStatement(ASTNode):
+    _fields = ()
+
     def __repr__(self):
         return "BreakStatement()"
 
@@ -166,6 +198,8 @@ class BreakStatement(ASTNode):
         return "break;"
 
 class ContinueStatement(ASTNode):
+    _fields = ()
+
     def __repr__(self):
         return "ContinueStatement()"
 
@@ -173,6 +207,8 @@ class ContinueStatement(ASTNode):
         return "continue;"
 
 class SwitchCase(ASTNode):
+    _fields = ('value', 'body')
+
     def __init__(self, value, body):
         self.value = value
         self.body = body
@@ -184,6 +220,8 @@ class SwitchCase(ASTNode):
         return f"case {self.value}:\n{self.body}"
 
 class SwitchStatement(ASTNode):
+    _fields = ('expression', 'cases', 'default')
+
     def __init__(self, expression, cases, default=None):
         self.expression = expression
         self.cases = cases  # list of SwitchCase
@@ -203,6 +241,8 @@ class SwitchStatement(ASTNode):
 
 
 class ReturnStatement(ASTNode):
+    _fields = ('value',)
+
     def __init__(self, value):
         self.value = value
 
@@ -213,10 +253,14 @@ class ReturnStatement(ASTNode):
         return f"return {self.value};"
     
 class Program(ASTNode):
+    _fields = ('statements',)
+
     def __init__(self, statements):
         self.statements = statements
 
 class Block(ASTNode):
+    _fields = ('statements',)
+
     def __init__(self, statements):
         self.statements = statements
 
@@ -228,6 +272,8 @@ class Block(ASTNode):
         return f"{{\n{body}\n}}"
 
 class FunctionDeclaration(ASTNode):
+    _fields = ('return_type', 'name', 'parameters', 'body')
+
     def __init__(self, return_type, name, parameters, body):
         self.return_type = return_type
         self.name = name
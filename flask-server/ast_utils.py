@@ -1,4 +1,52 @@
+import io
+import sys
+
 from ast_nodes import *
+
+_OPERATOR_NODES = ('BinaryOperation', 'AssignmentExpression', 'UnaryOperation', 'FunctionCallNode')
+
+
+def _operator_str(root):
+    # Operators and calls are rendered with an explicit stack (operands first, then the node
+    # joining them), so a long chain such as 1 + 1 + ... + 1 does not recurse per operator
+    parts = []
+    stack = [(root, False)]
+    while stack:
+        expr, ready = stack.pop()
+        t = type(expr).__name__
+        if not ready:
+            if t in _OPERATOR_NODES:
+                stack.append((expr, True))
+                if t == 'UnaryOperation':
+                    children = [expr.operand]
+                elif t == 'FunctionCallNode':
+                    children = expr.args
+                else:
+                    children = [expr.left, expr.right]
+                stack.extend((child, False) for child in reversed(children))
+            else:
+                parts.append(expression_to_str(expr))
+            continue
+        if t == 'FunctionCallNode':
+            args = parts[len(parts) - len(expr.args):]
+            del parts[len(parts) - len(expr.args):]
+            parts.append(f"{expr.name}({', '.join(args)})")
+        elif t == 'UnaryOperation':
+            operand = parts.pop()
+            if getattr(expr, 'postfix', False):
+                parts.append(f"({operand}{expr.operator})")
+            else:
+                parts.append(f"({expr.operator}{operand})")
+        else:
+            right = parts.pop()
+            left = parts.pop()
+            if t == 'BinaryOperation':
+                parts.append(f"({left} {expr.operator} {right})")
+            else:
+                parts.append(f"{left} {expr.operator} {right}")
+    return parts[0]
+
+
 def expression_to_str(expr):
     if expr is None:
         return "None"
@@ -7,22 +55,12 @@ def expression_to_str(expr):
         return str(expr.value)
     elif t == 'VariableNode':
         return expr.name
-    elif t == 'BinaryOperation':
-        return f"({expression_to_str(expr.left)} {expr.operator} {expression_to_str(expr.right)})"
-    elif t == 'FunctionCallNode':
-        args = ', '.join(expression_to_str(arg) for arg in expr.args)
-        return f"{expr.name}({args})"
-    elif t == 'UnaryOperation':
-        if getattr(expr, 'postfix', False):
-            return f"({expression_to_str(expr.operand)}{expr.operator})"
-        else:
-            return f"({expr.operator}{expression_to_str(expr.operand)})"
+    elif t in _OPERATOR_NODES:
+        return _operator_str(expr)
     elif t == 'StringNode':
         return f'"{expr.value}"'
     elif t == 'CharNode':
         return f"'{expr.value}'"
-    elif t == 'AssignmentExpression':
-        return f"{expression_to_str(expr.left)} {expr.operator} {expression_to_str(expr.right)}"
     elif t == 'VariableDeclaration':
         if expr.initializer:
             init_str = expression_to_str(expr.initializer)
@@ -50,13 +88,15 @@ def expression_to_str(expr):
         default_str = expression_to_str(expr.default) if expr.default else ""
         return f"switch ({expression_str}) {{ {cases_str} {default_str} }}"
     elif t == 'SwitchCase':
+        # Parser wraps case bodies in a Block; older trees used a plain list
+        body = expr.body.statements if type(expr.body).__name__ == 'Block' else expr.body
         if expr.value is None:
             # default case
-            body_str = ' '.join(expression_to_str(stmt) for stmt in expr.body)
+            body_str = ' '.join(expression_to_str(stmt) for stmt in body)
             return f"default: {{ {body_str} }}"
         else:
             case_str = expression_to_str(expr.value)
-            body_str = ' '.join(expression_to_str(stmt) for stmt in expr.body)
+            body_str = ' '.join(expression_to_str(stmt) for stmt in body)
             return f"case {case_str}: {{ {body_str} }}"
     elif t == 'BreakStatement':
         return "break;"
@@ -72,159 +112,239 @@ def expression_to_str(expr):
     return f"<UnknownExpr:{t}>"
 
 
-def pretty_print(node, indent=0):
-    indent_str = '  ' * indent
+class _ChunkWriter:
+    # Collects rendered lines and hands them to the sink in large chunks,
+    # so a big tree costs a handful of write() calls instead of one per line.
+    def __init__(self, out, chunk_size):
+        self.out = out
+        self.chunk_size = chunk_size
+        self.parts = []
+        self.size = 0
 
-    if node is None:
-        print(f"{indent_str}None")
-        return
-
-    #Root Program Node
-    if isinstance(node, Program):
-        print(f"{indent_str}Program:")
-        for stmt in node.statements:
-            pretty_print(stmt, indent + 1)
-        return
-
-    # Handle lists of nodes (used in things like BlockStatement, Switch cases, etc.)
-    if isinstance(node, (list, tuple)):
-        for stmt in node:
-            pretty_print(stmt, indent)
-        return
-    
+    def line(self, text):
+        self.parts.append(text)
+        self.parts.append('\n')
+        self.size += len(text) + 1
+        if self.size >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self.parts:
+            self.out.write(''.join(self.parts))
+            self.parts = []
+            self.size = 0
+
+
+def _tree_items(node, indent):
+    # Returns the output of one node as a list of lines (str) and children
+    # to expand in place ((child, indent) tuples), in print order.
+    indent_str = '  ' * indent
     t = type(node).__name__
 
     if t == 'FunctionDeclaration':
-        print(f"{indent_str}FunctionDefinition: {node.name}")
-        print(f"{indent_str}  ReturnType: {node.return_type}")
-        print(f"{indent_str}  Parameters: [{', '.join(f'{ptype} {pname}' for ptype, pname in node.parameters)}]")
-        print(f"{indent_str}  Body:")
-        pretty_print(node.body, indent + 2)
+        params = ', '.join(f'{ptype} {pname}' for ptype, pname in node.parameters)
+        return [
+            f"{indent_str}FunctionDefinition: {node.name}",
+            f"{indent_str}  ReturnType: {node.return_type}",
+            f"{indent_str}  Parameters: [{params}]",
+            f"{indent_str}  Body:",
+            (node.body, indent + 2),
+        ]
 
     elif t == 'Block':
-        print(f"{indent_str}Block {{")
-        for stmt in node.statements:
-            pretty_print(stmt, indent + 1)
-        print(f"{indent_str}}}")
+        items = [f"{indent_str}Block {{"]
+        items.extend((stmt, indent + 1) for stmt in node.statements)
+        items.append(f"{indent_str}}}")
+        return items
 
     elif t == 'VariableDeclaration':
         if node.initializer:
             init_str = expression_to_str(node.initializer)
-            print(f"{indent_str}Declaration: {node.var_type} {node.name} = {init_str}")
-        else:
-            print(f"{indent_str}Declaration: {node.var_type} {node.name}")
+            return [f"{indent_str}Declaration: {node.var_type} {node.name} = {init_str}"]
+        return [f"{indent_str}Declaration: {node.var_type} {node.name}"]
 
     elif t == 'AssignmentExpression':
-        print(f"{indent_str}AssignmentExpression:")
-        print(f"{indent_str}  operator: {node.operator}")
-        print(f"{indent_str}  left:")
-        pretty_print(node.left, indent + 2)
-        print(f"{indent_str}  right:")
-        pretty_print(node.right, indent + 2)
+        return [
+            f"{indent_str}AssignmentExpression:",
+            f"{indent_str}  operator: {node.operator}",
+            f"{indent_str}  left:",
+            (node.left, indent + 2),
+            f"{indent_str}  right:",
+            (node.right, indent + 2),
+        ]
 
     elif t == 'IfStatement':
-        print(f"{indent_str}IfStatement:")
-        print(f"{indent_str}  Condition:")
-        pretty_print(node.condition, indent + 2)
-        print(f"{indent_str}  ThenBlock:")
-        pretty_print(node.then_branch, indent + 2)
+        items = [
+            f"{indent_str}IfStatement:",
+            f"{indent_str}  Condition:",
+            (node.condition, indent + 2),
+            f"{indent_str}  ThenBlock:",
+            (node.then_branch, indent + 2),
+        ]
         if node.else_branch:
-            print(f"{indent_str}  ElseBlock:")
-            pretty_print(node.else_branch, indent + 2)
+            items.append(f"{indent_str}  ElseBlock:")
+            items.append((node.else_branch, indent + 2))
+        return items
 
     elif t == 'WhileStatement':
-        print(f"{indent_str}WhileStatement:")
-        print(f"{indent_str}  Condition:")
-        pretty_print(node.condition, indent + 2)
-        print(f"{indent_str}  Body:")
-        pretty_print(node.body, indent + 2)
+        return [
+            f"{indent_str}WhileStatement:",
+            f"{indent_str}  Condition:",
+            (node.condition, indent + 2),
+            f"{indent_str}  Body:",
+            (node.body, indent + 2),
+        ]
 
     elif t == 'ForStatement':
-        print(f"{indent_str}ForStatement:")
-        print(f"{indent_str}  Init:")
-        pretty_print(node.init, indent + 2)
-        print(f"{indent_str}  Condition:")
-        pretty_print(node.condition, indent + 2)
-        print(f"{indent_str}  Increment:")
-        pretty_print(node.increment, indent + 2)
-        print(f"{indent_str}  Body:")
-        pretty_print(node.body, indent + 2)
+        return [
+            f"{indent_str}ForStatement:",
+            f"{indent_str}  Init:",
+            (node.init, indent + 2),
+            f"{indent_str}  Condition:",
+            (node.condition, indent + 2),
+            f"{indent_str}  Increment:",
+            (node.increment, indent + 2),
+            f"{indent_str}  Body:",
+            (node.body, indent + 2),
+        ]
 
     elif t == 'SwitchStatement':
-        print(f"{indent_str}SwitchStatement:")
-        print(f"{indent_str}  Expression:")
-        pretty_print(node.expression, indent + 2)
-        print(f"{indent_str}  Cases:")
-        for case in node.cases:
-            pretty_print(case, indent + 2)
+        items = [
+            f"{indent_str}SwitchStatement:",
+            f"{indent_str}  Expression:",
+            (node.expression, indent + 2),
+            f"{indent_str}  Cases:",
+        ]
+        items.extend((case, indent + 2) for case in node.cases)
         if node.default:
-            print(f"{indent_str}  Default:")
-            pretty_print(node.default, indent + 2)
+            items.append(f"{indent_str}  Default:")
+            items.append((node.default, indent + 2))
+        return items
 
     elif t == 'SwitchCase':
         if node.value is None:
-            print(f"{indent_str}DefaultCase:")
-        else:
-            print(f"{indent_str}Case: {expression_to_str(node.value)}")
-        
-        # Check if node.body is a Block, then iterate its statements, else iterate directly
-        if type(node.body).__name__ == 'Block':
-            for stmt in node.body.statements:
-                pretty_print(stmt, indent + 2)
+            items = [f"{indent_str}DefaultCase:"]
         else:
-            for stmt in node.body:
-                pretty_print(stmt, indent + 2)
+            items = [f"{indent_str}Case: {expression_to_str(node.value)}"]
 
+        # Check if node.body is a Block, then iterate its statements, else iterate directly
+        body = node.body.statements if type(node.body).__name__ == 'Block' else node.body
+        items.extend((stmt, indent + 2) for stmt in body)
+        return items
 
     elif t == 'BreakStatement':
-        print(f"{indent_str}BreakStatement")
+        return [f"{indent_str}BreakStatement"]
 
     elif t == 'ContinueStatement':
-        print(f"{indent_str}ContinueStatement")
+        return [f"{indent_str}ContinueStatement"]
 
     elif t == 'ReturnStatement':
-        print(f"{indent_str}ReturnStatement:")
-        pretty_print(node.value, indent + 1)
+        return [f"{indent_str}ReturnStatement:", (node.value, indent + 1)]
 
     elif t == 'ExpressionStatement':
-        print(f"{indent_str}ExpressionStatement:")
-        pretty_print(node.expression, indent + 1)
+        return [f"{indent_str}ExpressionStatement:", (node.expression, indent + 1)]
 
     elif t == 'BinaryOperation':
-        print(f"{indent_str}BinaryExpression: {node.operator}")
-        print(f"{indent_str}  Left:")
-        pretty_print(node.left, indent + 2)
-        print(f"{indent_str}  Right:")
-        pretty_print(node.right, indent + 2)
+        return [
+            f"{indent_str}BinaryExpression: {node.operator}",
+            f"{indent_str}  Left:",
+            (node.left, indent + 2),
+            f"{indent_str}  Right:",
+            (node.right, indent + 2),
+        ]
 
     elif t == 'UnaryOperation':
         postfix = " (postfix)" if getattr(node, 'postfix', False) else ""
-        print(f"{indent_str}UnaryOperation: {node.operator}{postfix}")
-        print(f"{indent_str}  Operand:")
-        pretty_print(node.operand, indent + 2)
+        return [
+            f"{indent_str}UnaryOperation: {node.operator}{postfix}",
+            f"{indent_str}  Operand:",
+            (node.operand, indent + 2),
+        ]
 
     elif t == 'FunctionCallNode':
-        print(f"{indent_str}FunctionCall: {node.name}(")
-        for arg in node.args:
-            pretty_print(arg, indent + 2)
-        print(f"{indent_str})")
+        items = [f"{indent_str}FunctionCall: {node.name}("]
+        items.extend((arg, indent + 2) for arg in node.args)
+        items.append(f"{indent_str})")
+        return items
 
     elif t == 'VariableNode':
-        print(f"{indent_str}Identifier({node.name})")
+        return [f"{indent_str}Identifier({node.name})"]
 
     elif t == 'Number':
-        print(f"{indent_str}IntegerLiteral({node.value})")
+        return [f"{indent_str}IntegerLiteral({node.value})"]
 
     elif t == 'StringNode':
-        print(f'{indent_str}StringLiteral("{node.value}")')
+        return [f'{indent_str}StringLiteral("{node.value}")']
 
     elif t == 'CharNode':
-        print(f"{indent_str}CharLiteral('{node.value}')")
+        return [f"{indent_str}CharLiteral('{node.value}')"]
 
+    items = [f"{indent_str}{t}: (unknown node)"]
+    if hasattr(node, '__dict__'):
+        items.extend(f"{indent_str}  {attr}: {val}" for attr, val in vars(node).items())
     else:
-        print(f"{indent_str}{t}: (unknown node)")
-        if hasattr(node, '__dict__'):
-            for attr, val in vars(node).items():
-                print(f"{indent_str}  {attr}: {val}")
+        items.append(f"{indent_str}  {node} (no attributes)")
+    return items
+
+
+def render_tree(node, out=None, indent=0, max_depth=None, max_nodes=None, chunk_size=8192):
+    """
+    Render the AST in the pretty_print layout into any object with a write()
+    method (StringIO, open file, socket.makefile(), ...). Output is buffered
+    and written in chunks of roughly chunk_size characters.
+
+    max_depth limits how deep nodes are expanded and max_nodes caps the total
+    number of nodes rendered; elided parts are marked with '...' lines.
+    When out is None the rendering is returned as a string.
+    """
+    to_string = out is None
+    if to_string:
+        out = io.StringIO()
+    writer = _ChunkWriter(out, chunk_size)
+
+    rendered = 0
+    # Work stack of (item, depth): items are finished lines or (node, indent) pairs.
+    stack = [((node, indent), 0)]
+    while stack:
+        item, depth = stack.pop()
+        if type(item) is str:
+            writer.line(item)
+            continue
+
+        node, indent = item
+        indent_str = '  ' * indent
+
+        if node is None:
+            writer.line(f"{indent_str}None")
+            continue
+
+        # Handle lists of nodes (used in things like BlockStatement, Switch cases, etc.)
+        if isinstance(node, (list, tuple)):
+            stack.extend(((stmt, indent), depth) for stmt in reversed(node))
+            continue
+
+        if max_nodes is not None and rendered >= max_nodes:
+            writer.line(f"{indent_str}... (truncated after {max_nodes} nodes)")
+            break
+        if max_depth is not None and depth > max_depth:
+            writer.line(f"{indent_str}...")
+            continue
+        rendered += 1
+
+        #Root Program Node
+        if isinstance(node, Program):
+            items = [f"{indent_str}Program:"]
+            items.extend((stmt, indent + 1) for stmt in node.statements)
         else:
-            print(f"{indent_str}  {node} (no attributes)")
\ No newline at end of file
+            items = _tree_items(node, indent)
+        stack.extend((child, depth + 1) for child in reversed(items))
+
+    writer.flush()
+    if to_string:
+        return out.getvalue()
+    return rendered
+
+
+def pretty_print(node, indent=0, max_depth=None, max_nodes=None):
+    render_tree(node, sys.stdout, indent, max_depth, max_nodes)
+    sys.stdout.flush()
@@ -0,0 +1,145 @@
+"""
+Batch analysis over a pool of worker processes.
+
+Lexing, parsing and semantic analysis are pure Python and hold the GIL, so
+a batch of files is fanned out over a persistent ProcessPoolExecutor
+instead of threads. Workers are started once and warmed up (modules
+imported, every phase run on a tiny program) so a batch does not pay for
+process start-up.
+
+Results come back in input order. A file that raises, or whose worker
+dies, gets an {"error": ...} entry without affecting the rest of the batch.
+
+Jobs here run without time budgets, so the server only uses this pool when
+it has no workers.WorkerPool; otherwise batch files go through that pool.
+"""
+
+import concurrent.futures
+import multiprocessing
+import threading
+from concurrent.futures.process import BrokenProcessPool
+
+from pipeline import analyze_source
+
+WARM_UP_SOURCE = "int main() { int x = 1; return x; }"
+
+
+def _warm_up():
+    analyze_source(WARM_UP_SOURCE)
+
+
+def analyze_one(source):
+    try:
+        return analyze_source(source).to_dict()
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+
+
+def _mp_context():
+    # forkserver children start from a clean process instead of a copy of a threaded server
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+class BatchAnalyzer:
+    def __init__(self, max_workers=None, max_in_flight=None):
+        self.max_workers = max_workers or multiprocessing.cpu_count()
+        # Jobs submitted to the pool at once across all batches; bounds memory held by pending sources
+        self.in_flight = threading.BoundedSemaphore(max_in_flight or self.max_workers * 2)
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def _pool(self):
+        with self.lock:
+            if self.executor is None:
+                self.executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=_mp_context(), initializer=_warm_up)
+            return self.executor
+
+    def _reset(self, broken):
+        # Replace a pool whose worker died; other batches already holding it see the same error
+        with self.lock:
+            if self.executor is broken:
+                self.executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def start(self):
+        # Spawn and warm every worker ahead of the first batch
+        pool = self._pool()
+        for future in [pool.submit(_warm_up) for _ in range(self.max_workers)]:
+            future.result()
+
+    def _submit(self, source):
+        pool = self._pool()
+        try:
+            return pool.submit(analyze_one, source), pool
+        except BrokenProcessPool:
+            self._reset(pool)
+            pool = self._pool()
+            return pool.submit(analyze_one, source), pool
+
+    def analyze(self, sources):
+        results = [None] * len(sources)
+        crashed = []
+        futures = {}  # future -> (index, pool it runs on)
+
+        def collect(done):
+            for future in done:
+                index, pool = futures.pop(future)
+                self.in_flight.release()
+                try:
+                    results[index] = future.result()
+                except BrokenProcessPool:
+                    # Every job in flight on a pool fails when one worker dies; retry them alone below
+                    self._reset(pool)
+                    crashed.append(index)
+                except Exception as e:
+                    results[index] = {"error": f"{type(e).__name__}: {e}"}
+
+        for index, source in enumerate(sources):
+            # Wait for a slot; while our own jobs hold slots, harvest them instead of blocking
+            while not self.in_flight.acquire(blocking=not futures):
+                done, _ = concurrent.futures.wait(list(futures), return_when=concurrent.futures.FIRST_COMPLETED)
+                collect(done)
+            future, pool = self._submit(source)
+            futures[future] = (index, pool)
+            collect([f for f in futures if f.done()])
+
+        while futures:
+            done, _ = concurrent.futures.wait(list(futures), return_when=concurrent.futures.FIRST_COMPLETED)
+            collect(done)
+
+        # One at a time, so a file that kills its worker again only fails itself
+        for index in crashed:
+            with self.in_flight:
+                future, pool = self._submit(sources[index])
+                try:
+                    results[index] = future.result()
+                except BrokenProcessPool:
+                    self._reset(pool)
+                    results[index] = {"error": "Worker process crashed while analyzing this file"}
+                except Exception as e:
+                    results[index] = {"error": f"{type(e).__name__}: {e}"}
+        return results
+
+    def shutdown(self):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def analyze_batch(sources, max_workers=None, max_in_flight=None):
+    """
+    Analyze many sources in parallel and return one result dict per source,
+    in order (the /analyze response body, or {"error": ...}).
+    """
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = BatchAnalyzer(max_workers, max_in_flight)
+    return _default.analyze(sources)
@@ -0,0 +1,211 @@
+"""
+Per-phase throughput benchmark over seeded synthetic corpora (see corpus.py).
+
+    python bench.py run [--corpus NAME ...] [--repeat N] [--save PATH]
+    python bench.py compare BASELINE [CURRENT] [--threshold 0.1]
+
+For each corpus it reports the best of `repeat` runs of every phase:
+
+    lex        Lexical.get_tokens          chars/s
+    parse      Parser.parse                tokens/s
+    semantic   SemanticAnalyzer.analyze    nodes/s
+    serialize  to_dict + json.dumps        output bytes/s
+
+plus the peak memory traced (tracemalloc) over one full run. `--save`
+writes the results as a JSON baseline. `compare` checks results against a
+baseline (running the benchmark first unless CURRENT is given) and exits
+with status 1 if a phase got slower, or peak memory grew, by more than the
+threshold. Baselines only compare meaningfully on the same machine and
+Python version, both of which are recorded in the file.
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+from ast_nodes import Program
+from corpus import generate_sized
+from lexical import Lexical
+from parser import Parser
+from pipeline import ANALYZER_VERSION, AnalysisResult
+from semantic import SemanticAnalyzer
+
+CORPORA = {
+    "small": dict(chars=2000, seed=1),
+    "medium": dict(chars=50000, seed=2),
+    "large": dict(chars=400000, seed=3),
+    "nested": dict(chars=50000, seed=4, statements=3, depth=5),
+    "expressions": dict(chars=50000, seed=5, expr_depth=8),
+}
+
+UNITS = {"lex": "chars/s", "parse": "tokens/s", "semantic": "nodes/s", "serialize": "bytes/s"}
+
+
+def best_of(fn, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def _parse(tokens):
+    parser = Parser(tokens)
+    ast = parser.parse()
+    return ast, parser.errors, parser.node_count
+
+
+def _check(ast):
+    # A Program root, so the analyzer walks the whole tree
+    analyzer = SemanticAnalyzer()
+    analyzer.analyze(Program(ast))
+    return analyzer.errors
+
+
+def _serialize(tokens, lexical_errors, ast, parser_errors, semantic_errors):
+    result = AnalysisResult(tokens, lexical_errors, ast, parser_errors, semantic_errors)
+    return json.dumps(result.to_dict())
+
+
+def _full_run(source):
+    tokens, lexical_errors = Lexical(source).get_tokens()
+    ast, parser_errors, _ = _parse(tokens)
+    semantic_errors = _check(ast)
+    return _serialize(tokens, lexical_errors, ast, parser_errors, semantic_errors)
+
+
+def peak_memory(source):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        _full_run(source)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_corpus(options, repeat):
+    source = generate_sized(**options)
+    lex_time, (tokens, lexical_errors) = best_of(lambda: Lexical(source).get_tokens(), repeat)
+    # Parser errors go to stdout; a generated corpus should have none, but keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        parse_time, (ast, parser_errors, nodes) = best_of(lambda: _parse(tokens), repeat)
+    semantic_time, semantic_errors = best_of(lambda: _check(ast), repeat)
+    serialize_time, output = best_of(
+        lambda: _serialize(tokens, lexical_errors, ast, parser_errors, semantic_errors), repeat)
+
+    work = {"lex": len(source), "parse": len(tokens), "semantic": nodes, "serialize": len(output)}
+    seconds = {"lex": lex_time, "parse": parse_time, "semantic": semantic_time, "serialize": serialize_time}
+    return {
+        "chars": len(source),
+        "tokens": len(tokens),
+        "nodes": nodes,
+        "errors": len(lexical_errors) + len(parser_errors),
+        "phases": {phase: {"seconds": seconds[phase], "rate": work[phase] / seconds[phase] if seconds[phase] else 0.0,
+                           "unit": UNITS[phase]} for phase in UNITS},
+        "peakBytes": peak_memory(source),
+    }
+
+
+def run(names, repeat):
+    results = {}
+    for name in names:
+        results[name] = bench_corpus(CORPORA[name], repeat)
+        print(f"{name}: {results[name]['chars']} chars, {results[name]['tokens']} tokens, "
+              f"{results[name]['nodes']} nodes", file=sys.stderr)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "analyzerVersion": ANALYZER_VERSION,
+            "repeat": repeat,
+            "created": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        "results": results,
+    }
+
+
+def report(data):
+    print(f"{'corpus':<12} {'phase':<10} {'ms':>9} {'rate':>14}")
+    for name, result in data["results"].items():
+        for phase, timing in result["phases"].items():
+            print(f"{name:<12} {phase:<10} {timing['seconds'] * 1000:>9.2f} {timing['rate']:>14,.0f} {timing['unit']}")
+        print(f"{name:<12} {'peak':<10} {result['peakBytes'] / 1024:>9.0f} KiB  "
+              f"({result['peakBytes'] / result['chars']:.0f} bytes/char)")
+
+
+def compare(baseline, current, threshold):
+    # Returns the list of regressions, printing every comparison
+    regressions = []
+    print(f"{'corpus':<12} {'phase':<10} {'baseline':>14} {'current':>14} {'change':>8}")
+    for name, base in baseline["results"].items():
+        now = current["results"].get(name)
+        if now is None:
+            continue
+        for phase, timing in base["phases"].items():
+            old_rate, new_rate = timing["rate"], now["phases"][phase]["rate"]
+            change = new_rate / old_rate - 1 if old_rate else 0.0
+            flag = change < -threshold
+            print(f"{name:<12} {phase:<10} {old_rate:>14,.0f} {new_rate:>14,.0f} {change:>+8.1%}{'  REGRESSION' if flag else ''}")
+            if flag:
+                regressions.append(f"{name}/{phase}: {change:+.1%} {timing['unit']}")
+        change = now["peakBytes"] / base["peakBytes"] - 1 if base["peakBytes"] else 0.0
+        flag = change > threshold
+        print(f"{name:<12} {'peak':<10} {base['peakBytes']:>14,} {now['peakBytes']:>14,} {change:>+8.1%}{'  REGRESSION' if flag else ''}")
+        if flag:
+            regressions.append(f"{name}/peak memory: {change:+.1%}")
+    for key in ("python", "platform"):
+        if baseline["meta"].get(key) != current["meta"].get(key):
+            print(f"note: baseline {key} {baseline['meta'].get(key)!r} differs from {current['meta'].get(key)!r}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analysis phases on synthetic corpora.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_parser = sub.add_parser("run")
+    run_parser.add_argument("--corpus", nargs="+", choices=list(CORPORA), default=list(CORPORA))
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument("--save", help="write the results as a JSON baseline")
+    compare_parser = sub.add_parser("compare")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current", nargs="?", help="saved results to compare (default: run now)")
+    compare_parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown, 0.10 = 10%%")
+    compare_parser.add_argument("--repeat", type=int)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        data = run(args.corpus, args.repeat)
+        report(data)
+        if args.save:
+            with open(args.save, 'w') as f:
+                json.dump(data, f, indent=2)
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if args.current:
+        with open(args.current) as f:
+            current = json.load(f)
+    else:
+        names = [name for name in baseline["results"] if name in CORPORA]
+        current = run(names, args.repeat or baseline["meta"]["repeat"])
+    regressions = compare(baseline, current, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
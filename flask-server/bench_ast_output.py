@@ -0,0 +1,67 @@
+"""
+Size and latency of the /analyze AST outputs.
+
+    python bench_ast_output.py [copies]
+
+Compares the flattened astString (expression_to_str per top-level
+statement; it has no FunctionDeclaration case, so function bodies are
+rendered directly), the structured JSON produced by ast_json.iter_json, and
+the same document built the naive way as nested dicts plus json.dumps.
+"""
+
+import json
+import sys
+
+from ast_json import _layout, iter_json
+from ast_nodes import ASTNode, FunctionDeclaration
+from ast_utils import expression_to_str
+from bench_serialization import SAMPLE, best_of
+from lexical import Lexical
+from parser import Parser
+
+
+def to_nested_dict(value):
+    if isinstance(value, ASTNode):
+        scalars, children = _layout(type(value))
+        return {
+            "kind": type(value).__name__,
+            "line": value.line,
+            "fields": {name: getattr(value, name) for name in scalars},
+            "children": {name: to_nested_dict(getattr(value, name)) for name, _ in reversed(children)},
+        }
+    if isinstance(value, (list, tuple)):
+        return [to_nested_dict(v) for v in value]
+    return value
+
+
+def flatten(stmt):
+    if isinstance(stmt, FunctionDeclaration):
+        return f"{stmt.return_type} {stmt.name} {expression_to_str(stmt.body)}"
+    return expression_to_str(stmt)
+
+
+def main():
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    source = ''.join(SAMPLE.format(n=i) for i in range(copies))
+    tokens, _ = Lexical(source).get_tokens()
+    ast = Parser(tokens).parse()
+
+    outputs = {
+        'astString': lambda: ' '.join(flatten(stmt) for stmt in ast),
+        'json stream': lambda: ''.join(iter_json(ast)),
+        'json dicts': lambda: json.dumps(to_nested_dict(ast), separators=(',', ':')),
+    }
+
+    print(f"{copies} copies, {len(source)} chars, {len(tokens)} tokens")
+    print(f"{'output':<12} {'bytes':>10} {'ms':>10}")
+    for name, produce in outputs.items():
+        elapsed, text = best_of(produce)
+        print(f"{name:<12} {len(text.encode('utf-8')):>10} {elapsed * 1000:>10.2f}")
+
+    # Time until the first chunk is ready, which is what a streaming client waits for
+    elapsed, _ = best_of(lambda: next(iter_json(ast)))
+    print(f"json stream first chunk: {elapsed * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+Per-phase memory accounting over seeded corpora of increasing size.
+
+    python bench_memory.py run [--chars N ...] [--save PATH]
+    python bench_memory.py compare BASELINE [CURRENT] [--threshold 0.05]
+
+Each phase runs under tracemalloc with the outputs of the earlier phases
+already in memory, and reports:
+
+    peak       the most memory the phase had allocated at once, above what
+               was live when it started
+    retained   what it still holds when it returns (its output)
+
+both per source character and per AST node. Retained memory is broken down
+by allocation site into the categories in CATEGORIES (Tokens objects,
+strings built by the lexer's collect_* methods, AST nodes, symbol_table
+copies, tokens_list dicts, expression_to_str strings, ...). A "full" row
+gives the peak of a whole analysis holding every output until the response
+is built, which is the number to size a worker's memory limit from: take
+the largest peak per character and add the interpreter's baseline RSS,
+since tracemalloc only sees allocations made through Python's allocators.
+
+`--save` writes the results as a JSON baseline; `compare` exits with
+status 1 if any peak or retained bytes per character grew by more than the
+threshold. Python and platform are recorded, as allocation sizes differ
+between versions.
+"""
+
+import argparse
+import ast
+import contextlib
+import gc
+import io
+import json
+import linecache
+import platform
+import re
+import sys
+import time
+import tracemalloc
+
+from ast_nodes import Program
+from corpus import generate_sized
+from lexical import Lexical
+from parser import Parser
+from pipeline import ANALYZER_VERSION, AnalysisResult
+from semantic import SemanticAnalyzer
+
+SIZES = (10000, 50000, 200000)
+PHASES = ('lex', 'parse', 'semantic', 'serialize')
+
+# Allocation sites are matched in order: (category, file, function regex, source line regex).
+# Objects are allocated on the line that calls their class, so constructor calls are matched by line.
+CATEGORIES = [
+    ("Tokens objects", "lexical.py", r"^Tokens\.", None),
+    ("Tokens objects", "lexical.py", None, r"\bTokens\("),
+    ("collect_* strings", "lexical.py", r"\.collect_", None),
+    ("token list", "lexical.py", r"\.get_tokens$", None),
+    ("lexer messages", "lexical.py", None, None),
+    ("AST nodes", "ast_nodes.py", None, None),
+    ("AST nodes", "parser.py", None, r"\b[A-Z]\w*\("),
+    ("parser lists and messages", "parser.py", None, None),
+    ("scope records", "semantic.py", None, r"scopes"),
+    ("semantic messages", "semantic.py", None, None),
+    ("IR for data-flow checks", "ir.py", None, None),
+    ("CFG arrays", "cfg.py", None, None),
+    ("data-flow bit sets", "dataflow.py", None, None),
+    ("tokens_list dicts", "pipeline.py", r"\.tokens_list$", None),
+    ("expression_to_str strings", "ast_utils.py", r"^expression_to_str$", None),
+    ("response dict", "pipeline.py", None, None),
+    ("JSON text", "json/", None, None),
+]
+
+_functions = {}
+
+
+def _enclosing_function(filename, lineno):
+    # Qualified name of the innermost def around a line, from the file's own syntax tree
+    spans = _functions.get(filename)
+    if spans is None:
+        spans = _functions[filename] = []
+        try:
+            with open(filename) as f:
+                tree = ast.parse(f.read())
+        except (OSError, SyntaxError):
+            tree = None
+
+        def visit(node, prefix):
+            for child in ast.iter_child_nodes(node):
+                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                    name = prefix + child.name
+                    if not isinstance(child, ast.ClassDef):
+                        spans.append((child.lineno, child.end_lineno, name))
+                    visit(child, name + '.')
+                else:
+                    visit(child, prefix)
+        if tree is not None:
+            visit(tree, '')
+    best = ''
+    for start, end, name in spans:
+        if start <= lineno <= end and len(name) >= len(best):
+            best = name
+    return best
+
+
+def classify(filename, lineno):
+    path = filename.replace('\\', '/')
+    for category, file_part, function_pattern, line_pattern in CATEGORIES:
+        if not (path.endswith('/' + file_part) or file_part.endswith('/') and '/' + file_part in path):
+            continue
+        if function_pattern and not re.search(function_pattern, _enclosing_function(filename, lineno)):
+            continue
+        if line_pattern and not re.search(line_pattern, linecache.getline(filename, lineno)):
+            continue
+        return category
+    return "other"
+
+
+def _run_phase(phase, state):
+    if phase == 'lex':
+        state['tokens'], state['lexical_errors'] = Lexical(state['source']).get_tokens()
+    elif phase == 'parse':
+        with contextlib.redirect_stdout(io.StringIO()):
+            parser = Parser(state['tokens'])
+            state['ast'] = parser.parse()
+        state['parser_errors'] = parser.errors
+        state['nodes'] = parser.node_count
+    elif phase == 'semantic':
+        # A Program root, so the analyzer walks the whole tree
+        analyzer = SemanticAnalyzer()
+        analyzer.analyze(Program(state['ast']))
+        state['semantic_errors'] = analyzer.errors
+    else:
+        result = AnalysisResult(state['tokens'], state['lexical_errors'], state['ast'],
+                                state['parser_errors'], state['semantic_errors'])
+        state['response'] = result.to_dict()
+        state['body'] = json.dumps(state['response'])
+
+
+def _breakdown(snapshot):
+    totals = {}
+    for stat in snapshot.statistics('lineno'):
+        frame = stat.traceback[0]
+        category = classify(frame.filename, frame.lineno)
+        totals[category] = totals.get(category, 0) + stat.size
+    return dict(sorted(totals.items(), key=lambda item: -item[1]))
+
+
+def measure(source):
+    state = {'source': source}
+    phases = {}
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+    for phase in PHASES:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            _run_phase(phase, state)
+            gc.collect()
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot().filter_traces(filters)
+        finally:
+            tracemalloc.stop()
+        phases[phase] = {"peak": peak - before, "retained": current - before, "categories": _breakdown(snapshot)}
+
+    full = {'source': source}
+    gc.collect()
+    tracemalloc.start()
+    try:
+        for phase in PHASES:
+            _run_phase(phase, full)
+        full_peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"chars": len(source), "tokens": len(state['tokens']), "nodes": state['nodes'],
+            "phases": phases, "fullPeak": full_peak}
+
+
+def run(sizes):
+    results = {}
+    for chars in sizes:
+        result = results[str(chars)] = measure(generate_sized(chars, seed=chars))
+        print(f"{chars}: {result['chars']} chars, {result['tokens']} tokens, {result['nodes']} nodes", file=sys.stderr)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "analyzerVersion": ANALYZER_VERSION,
+            "created": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        "results": results,
+    }
+
+
+def report(data):
+    print(f"{'size':>8} {'phase':<10} {'peak KiB':>10} {'retained KiB':>13} {'peak B/char':>12} "
+          f"{'kept B/char':>12} {'kept B/node':>12}")
+    for size, result in data["results"].items():
+        chars, nodes = result["chars"], result["nodes"] or 1
+        for phase, usage in result["phases"].items():
+            print(f"{size:>8} {phase:<10} {usage['peak'] / 1024:>10.0f} {usage['retained'] / 1024:>13.0f} "
+                  f"{usage['peak'] / chars:>12.1f} {usage['retained'] / chars:>12.1f} {usage['retained'] / nodes:>12.1f}")
+        print(f"{size:>8} {'full':<10} {result['fullPeak'] / 1024:>10.0f} {'':>13} {result['fullPeak'] / chars:>12.1f}")
+
+    # Breakdown for the largest corpus, where fixed costs matter least
+    size, result = list(data["results"].items())[-1]
+    print(f"\nretained by category ({size} chars)")
+    for phase, usage in result["phases"].items():
+        for category, size_bytes in usage["categories"].items():
+            if size_bytes >= 1024:
+                print(f"  {phase:<10} {category:<28} {size_bytes / 1024:>10.0f} KiB "
+                      f"{size_bytes / result['chars']:>8.1f} B/char")
+    worst = max(r["fullPeak"] / r["chars"] for r in data["results"].values())
+    print(f"\nworst full-analysis peak: {worst:.0f} bytes per source character")
+
+
+def compare(baseline, current, threshold):
+    # Returns the list of regressions, printing every comparison
+    regressions = []
+    print(f"{'size':>8} {'phase':<10} {'measure':<9} {'baseline':>10} {'current':>10} {'change':>8}")
+    for size, base in baseline["results"].items():
+        now = current["results"].get(size)
+        if now is None:
+            continue
+        rows = [(phase, key, base["phases"][phase][key] / base["chars"], now["phases"][phase][key] / now["chars"])
+                for phase in base["phases"] for key in ("peak", "retained")]
+        rows.append(("full", "peak", base["fullPeak"] / base["chars"], now["fullPeak"] / now["chars"]))
+        for phase, key, old, new in rows:
+            change = new / old - 1 if old else 0.0
+            flag = change > threshold
+            print(f"{size:>8} {phase:<10} {key:<9} {old:>10.1f} {new:>10.1f} {change:>+8.1%}{'  REGRESSION' if flag else ''}")
+            if flag:
+                regressions.append(f"{size}/{phase} {key}: {change:+.1%} bytes/char")
+    for key in ("python", "platform"):
+        if baseline["meta"].get(key) != current["meta"].get(key):
+            print(f"note: baseline {key} {baseline['meta'].get(key)!r} differs from {current['meta'].get(key)!r}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Account memory use per analysis phase.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_parser = sub.add_parser("run")
+    run_parser.add_argument("--chars", nargs="+", type=int, default=list(SIZES), help="corpus sizes")
+    run_parser.add_argument("--save", help="write the results as a JSON baseline")
+    compare_parser = sub.add_parser("compare")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current", nargs="?", help="saved results to compare (default: run now)")
+    compare_parser.add_argument("--threshold", type=float, default=0.05, help="allowed growth, 0.05 = 5%%")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        data = run(sorted(args.chars))
+        report(data)
+        if args.save:
+            with open(args.save, 'w') as f:
+                json.dump(data, f, indent=2)
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if args.current:
+        with open(args.current) as f:
+            current = json.load(f)
+    else:
+        current = run(sorted(int(size) for size in baseline["results"]))
+    regressions = compare(baseline, current, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
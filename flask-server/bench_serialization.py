@@ -0,0 +1,120 @@
+"""
+Size and speed comparison of ast_binary against pickle and JSON.
+
+    python bench_serialization.py [copies]
+
+The input is the sample program from test.py repeated `copies` times
+(with renamed functions), parsed once and then serialized with each format.
+"""
+
+import json
+import pickle
+import sys
+import time
+
+import ast_binary
+from ast_nodes import ASTNode
+from lexical import Lexical
+from parser import Parser
+
+SAMPLE = """
+int add{n}(int a, int b) {{
+    return a + b;
+}}
+
+int main{n}() {{
+    int x = 10;
+    if (x > 5) {{
+        x = x - 1;
+    }} else {{
+        x = x + 1;
+    }}
+
+    for (int i = 0; i < 3; i++) {{
+        int y = i * 2;
+    }}
+
+    while (x < 20) {{
+        x++;
+    }}
+
+    switch (x) {{
+        case 5:
+            x += 1;
+            break;
+        case 10:
+            x += 2;
+            break;
+        default:
+            x = 0;
+    }}
+
+    printf("%d\\n", add{n}(x, 2));
+    return 0;
+}}
+"""
+
+
+NODE_CLASSES = {cls.__name__: cls for cls in ast_binary.NODE_KINDS}
+
+
+def to_json_obj(value):
+    if isinstance(value, ASTNode):
+        obj = {"kind": type(value).__name__, "line": value.line}
+        for field in value._fields:
+            obj[field] = to_json_obj(getattr(value, field))
+        return obj
+    if isinstance(value, (list, tuple)):
+        return [to_json_obj(v) for v in value]
+    return value
+
+
+def from_json_obj(value):
+    if isinstance(value, dict):
+        cls = NODE_CLASSES[value["kind"]]
+        node = cls.__new__(cls)
+        if value["line"] is not None:
+            node.line = value["line"]
+        for field in cls._fields:
+            setattr(node, field, from_json_obj(value[field]))
+        return node
+    if isinstance(value, list):
+        return [from_json_obj(v) for v in value]
+    return value
+
+
+def best_of(fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    source = ''.join(SAMPLE.format(n=i) for i in range(copies))
+    tokens, _ = Lexical(source).get_tokens()
+    ast = Parser(tokens).parse()
+
+    formats = {
+        'binary': (ast_binary.dumps, ast_binary.loads),
+        'pickle': (lambda t: pickle.dumps(t, protocol=pickle.HIGHEST_PROTOCOL), pickle.loads),
+        'json': (lambda t: json.dumps(to_json_obj(t), separators=(',', ':')).encode('utf-8'),
+                 lambda d: from_json_obj(json.loads(d))),
+    }
+
+    reference = ast_binary.dumps(ast)
+    print(f"{copies} copies, {len(source)} chars, {len(tokens)} tokens")
+    print(f"{'format':<8} {'bytes':>10} {'encode ms':>10} {'decode ms':>10}  round trip")
+    for name, (encode, decode) in formats.items():
+        enc_time, data = best_of(lambda: encode(ast))
+        dec_time, tree = best_of(lambda: decode(data))
+        # JSON has no tuples, so function parameter pairs come back as lists
+        exact = 'exact' if ast_binary.dumps(tree) == reference else 'lossy'
+        print(f"{name:<8} {len(data):>10} {enc_time * 1000:>10.2f} {dec_time * 1000:>10.2f}  {exact}")
+
+
+if __name__ == "__main__":
+    main()
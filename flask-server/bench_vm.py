@@ -0,0 +1,440 @@
+"""
+Benchmark of the bytecode VM (vm.py), the closure compiler (closures.py)
+and the Python transpiler (transpile.py) against a naive tree-walking
+evaluator.
+
+    python bench_vm.py run [--program NAME ...] [--repeat N] [--save PATH]
+    python bench_vm.py compare BASELINE [CURRENT] [--threshold 0.1]
+
+Each program is run by every engine, best of `repeat`, and must print the
+same output and return the same exit code; a mismatch is reported and
+exits with status 1, so the benchmark doubles as a cross-check of the
+compilers. The evaluator walks the AST on every execution, keeps variables
+in dicts and unwinds break, continue and return with exceptions: what
+running the parser's tree directly would cost. `--save` writes the
+results as a JSON baseline; `compare` exits with status 1 if an engine
+got slower on a program by more than the threshold. Baselines only
+compare meaningfully on the same machine and Python version, both
+recorded in the file.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import sys
+import time
+
+import closures
+import transpile
+from ast_nodes import *
+from lexical import Lexical
+from optimizer import constant_value
+from parser import Parser
+from vm import (CompileError, compile_program, divide, float_divide, float_to_int, format_printf, parse_format,
+                run, unescape, wrap_char, wrap_int, INT_MAX, INT_MIN, STORAGE)
+
+PROGRAMS = {
+    "fib": """
+int fib(int n) {
+    if (n < 2) return n;
+    return fib(n - 1) + fib(n - 2);
+}
+int main() {
+    printf("%d\\n", fib(20));
+    return 0;
+}
+""",
+    "primes": """
+int main() {
+    int count = 0;
+    for (int n = 2; n < 4000; n++) {
+        int prime = 1;
+        for (int d = 2; d * d <= n; d++) {
+            if (n % d == 0) { prime = 0; break; }
+        }
+        count += prime;
+    }
+    printf("%d primes\\n", count);
+    return 0;
+}
+""",
+    "float": """
+int main() {
+    double sum = 0.0;
+    double sign = 1.0;
+    for (int k = 0; k < 40000; k++) {
+        sum += sign / (2 * k + 1);
+        sign = -sign;
+    }
+    printf("pi ~ %.6f\\n", 4 * sum);
+    return 0;
+}
+""",
+    "switch": """
+int main() {
+    int state = 0;
+    int hits = 0;
+    for (int i = 0; i < 30000; i++) {
+        switch (state) {
+            case 0: state = 1; break;
+            case 1: state = 2; hits++;
+            case 2: state = 3; break;
+            default: state = 0; hits += 2;
+        }
+    }
+    printf("%d %d\\n", state, hits);
+    return 0;
+}
+""",
+    "collatz": """
+int steps(int n) {
+    int count = 0;
+    while (n != 1) {
+        if (n % 2 == 0) n = n / 2;
+        else n = 3 * n + 1;
+        count++;
+    }
+    return count;
+}
+int main() {
+    int best = 0;
+    int arg = 0;
+    for (int i = 1; i < 3000; i++) {
+        int s = steps(i);
+        if (s > best) { best = s; arg = i; }
+    }
+    printf("%d takes %d steps\\n", arg, best);
+    return 0;
+}
+""",
+}
+
+
+class _Break(Exception):
+    pass
+
+
+class _Continue(Exception):
+    pass
+
+
+class _Return(Exception):
+    def __init__(self, value):
+        self.value = value
+
+
+class TreeWalker:
+    """Evaluates the AST directly, with the same semantics as the VM."""
+
+    def __init__(self, tree):
+        self.functions = {s.name: s for s in tree if isinstance(s, FunctionDeclaration)}
+        self.globals = {}
+        self.scopes = []
+        self.output = []
+        self.statements = tree
+
+    def run(self):
+        self.scopes = [self.globals]
+        for stmt in self.statements:
+            if not isinstance(stmt, FunctionDeclaration):
+                self.execute(stmt)
+        return self.call('main', [])
+
+    def store(self, name, value):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                storage = scope[name][0]
+                scope[name] = (storage, self.convert(value, storage))
+                return scope[name][1]
+        raise CompileError(f"Variable '{name}' is not declared.")
+
+    def convert(self, value, storage):
+        if storage == 'float':
+            return float(value)
+        if isinstance(value, float):
+            value = float_to_int(value)
+        return wrap_char(value) if storage == 'char' else value
+
+    def call(self, name, args):
+        function = self.functions[name]
+        saved = self.scopes
+        self.scopes = [self.globals, {}]
+        for (declared, param), value in zip(function.parameters, args):
+            self.scopes[-1][param] = (STORAGE[declared], self.convert(value, STORAGE[declared]))
+        try:
+            self.execute(function.body)
+            value = 0
+        except _Return as r:
+            value = r.value
+        self.scopes = saved
+        if function.return_type in STORAGE:
+            return self.convert(value, STORAGE[function.return_type])
+        return 0
+
+    def execute(self, node):
+        if isinstance(node, Block):
+            self.scopes.append({})
+            try:
+                for stmt in node.statements:
+                    self.execute(stmt)
+            finally:
+                self.scopes.pop()
+        elif isinstance(node, VariableDeclaration):
+            storage = STORAGE[node.var_type]
+            value = self.evaluate(node.initializer) if node.initializer is not None else 0
+            self.scopes[-1][node.name] = (storage, self.convert(value, storage))
+        elif isinstance(node, ExpressionStatement):
+            self.evaluate(node.expression)
+        elif isinstance(node, IfStatement):
+            if self.evaluate(node.condition):
+                self.execute(node.then_branch)
+            elif node.else_branch is not None:
+                self.execute(node.else_branch)
+        elif isinstance(node, WhileStatement):
+            while self.evaluate(node.condition):
+                try:
+                    self.execute(node.body)
+                except _Break:
+                    break
+                except _Continue:
+                    pass
+        elif isinstance(node, ForStatement):
+            self.scopes.append({})
+            try:
+                if node.init is not None:
+                    self.execute(node.init)
+                while node.condition is None or self.evaluate(node.condition):
+                    try:
+                        self.execute(node.body)
+                    except _Break:
+                        break
+                    except _Continue:
+                        pass
+                    if node.increment is not None:
+                        self.evaluate(node.increment)
+            finally:
+                self.scopes.pop()
+        elif isinstance(node, SwitchStatement):
+            value = self.evaluate(node.expression)
+            bodies = [case.body for case in node.cases] + ([node.default.body] if node.default else [])
+            start = next((i for i, case in enumerate(node.cases) if self.evaluate(case.value) == value),
+                         len(node.cases) if node.default else None)
+            if start is not None:
+                try:
+                    for body in bodies[start:]:
+                        self.execute(body)
+                except _Break:
+                    pass
+        elif isinstance(node, BreakStatement):
+            raise _Break()
+        elif isinstance(node, ContinueStatement):
+            raise _Continue()
+        elif isinstance(node, ReturnStatement):
+            raise _Return(self.evaluate(node.value) if node.value is not None else 0)
+
+    def evaluate(self, node):
+        if isinstance(node, Number):
+            value = constant_value(node)
+            return value if isinstance(value, float) else wrap_int(value)
+        if isinstance(node, CharNode):
+            return wrap_char(ord(unescape(node.value)))
+        if isinstance(node, StringNode):
+            return unescape(node.value)
+        if isinstance(node, VariableNode):
+            for scope in reversed(self.scopes):
+                if node.name in scope:
+                    return scope[node.name][1]
+            raise CompileError(f"Variable '{node.name}' is not declared.")
+        if isinstance(node, BinaryOperation):
+            if node.operator == '=':
+                if isinstance(node.left, BinaryOperation) and node.left.operator == '=':
+                    inner = BinaryOperation('=', node.left.right, node.right)
+                    return self.store(node.left.left.name, self.evaluate(inner))
+                return self.store(node.left.name, self.evaluate(node.right))
+            if node.operator == '&&':
+                return 1 if self.evaluate(node.left) and self.evaluate(node.right) else 0
+            if node.operator == '||':
+                return 1 if self.evaluate(node.left) or self.evaluate(node.right) else 0
+            return self.arithmetic(node.operator, self.evaluate(node.left), self.evaluate(node.right))
+        if isinstance(node, AssignmentExpression):
+            right = self.evaluate(node.right)
+            if node.operator != '=':
+                right = self.arithmetic(node.operator[0], self.evaluate(node.left), right)
+            return self.store(node.left.name, right)
+        if isinstance(node, UnaryOperation):
+            if node.operator in ('++', '--'):
+                old = self.evaluate(node.operand)
+                new = self.store(node.operand.name, self.arithmetic(node.operator[0], old, 1))
+                return old if node.postfix else new
+            value = self.evaluate(node.operand)
+            if node.operator == '-':
+                return -value if isinstance(value, float) else wrap_int(-value)
+            if node.operator == '!':
+                return 0 if value else 1
+            if node.operator == '~':
+                return ~value
+            return value
+        if isinstance(node, FunctionCallNode):
+            args = [self.evaluate(arg) for arg in node.args]
+            if node.name == 'printf':
+                text = format_printf(parse_format(args[0], node.line), args[1:])
+                self.output.append(text)
+                return len(text)
+            return self.call(node.name, args)
+        raise CompileError(f"Cannot evaluate {type(node).__name__}.")
+
+    def arithmetic(self, op, a, b):
+        if op in ('<', '<=', '>', '>=', '==', '!='):
+            return int({'<': a < b, '<=': a <= b, '>': a > b, '>=': a >= b, '==': a == b, '!=': a != b}[op])
+        if isinstance(a, float) or isinstance(b, float):
+            a, b = float(a), float(b)
+            return {'+': lambda: a + b, '-': lambda: a - b, '*': lambda: a * b,
+                    '/': lambda: float_divide(a, b)}[op]()
+        if op in ('/', '%'):
+            return divide(a, b, op)
+        value = a + b if op == '+' else a - b if op == '-' else a * b
+        return value if INT_MIN <= value <= INT_MAX else wrap_int(value)
+
+
+def parse(source):
+    tokens, _ = Lexical(source).get_tokens()
+    with contextlib.redirect_stdout(io.StringIO()):
+        return Parser(tokens).parse()
+
+
+def best_of(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None or elapsed < best else best
+    return best, value
+
+
+def run_benchmark(names, repeat):
+    results = {}
+    for name in names:
+        tree = parse(PROGRAMS[name])
+        compile_time, bytecode = best_of(lambda: compile_program(tree), repeat)
+
+        def tree_walk():
+            walker = TreeWalker(tree)
+            code = walker.run()
+            return ''.join(walker.output), code
+
+        walk_time, (walk_output, walk_code) = best_of(tree_walk, repeat)
+        vm_time, result = best_of(lambda: run(bytecode, max_instructions=10 ** 9, max_seconds=600), repeat)
+        closure_compile_time, program = best_of(lambda: closures.compile_program(tree, cache=None), repeat)
+        closure_time, closure_result = best_of(
+            lambda: closures.run(program, max_steps=10 ** 9, max_seconds=600), repeat)
+        closure_same = closure_result.error is None and \
+            (closure_result.output, closure_result.exit_code) == (walk_output, walk_code)
+        transpile_compile_time, transpiled = best_of(lambda: transpile.compile_program(tree, cache=None), repeat)
+        python_time, python_result = best_of(
+            lambda: transpile.run(transpiled, max_steps=10 ** 9, max_seconds=600), repeat)
+        python_same = python_result.error is None and \
+            (python_result.output, python_result.exit_code) == (walk_output, walk_code)
+        results[name] = {
+            "treeSeconds": walk_time,
+            "vmSeconds": vm_time,
+            "closuresSeconds": closure_time,
+            "pythonSeconds": python_time,
+            "compileSeconds": compile_time,
+            "closuresCompileSeconds": closure_compile_time,
+            "pythonCompileSeconds": transpile_compile_time,
+            "speedup": walk_time / vm_time,
+            "closuresSpeedup": walk_time / closure_time,
+            "pythonSpeedup": walk_time / python_time,
+            "instructions": result.instructions,
+            "codeCells": len(bytecode.code),
+            "matches": closure_same and python_same and result.error is None and
+                       (result.output, result.exit_code) == (walk_output, walk_code),
+        }
+        if not results[name]["matches"]:
+            results[name]["detail"] = {"vm": [result.output, result.exit_code, result.error],
+                                       "closures": [closure_result.output, closure_result.exit_code,
+                                                    closure_result.error],
+                                       "python": [python_result.output, python_result.exit_code,
+                                                  python_result.error],
+                                       "tree": [walk_output, walk_code]}
+    return {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(), "repeat": repeat},
+        "results": results,
+    }
+
+
+def report(data):
+    print(f"{'program':<10} {'tree ms':>9} {'vm ms':>9} {'speedup':>8} {'closures ms':>12} {'speedup':>8} "
+          f"{'python ms':>10} {'speedup':>8} {'instructions':>13} {'M instr/s':>10}")
+    for name, r in data["results"].items():
+        mark = "" if r["matches"] else "  OUTPUT DIFFERS"
+        print(f"{name:<10} {r['treeSeconds'] * 1000:9.1f} {r['vmSeconds'] * 1000:9.1f} {r['speedup']:7.1f}x "
+              f"{r['closuresSeconds'] * 1000:12.1f} {r['closuresSpeedup']:7.1f}x "
+              f"{r['pythonSeconds'] * 1000:10.1f} {r['pythonSpeedup']:7.1f}x "
+              f"{r['instructions']:13d} {r['instructions'] / r['vmSeconds'] / 1e6:10.2f}{mark}")
+
+
+def compare(baseline, current, threshold):
+    regressions = []
+    for name, base in baseline["results"].items():
+        now = current["results"].get(name)
+        if now is None:
+            continue
+        for key, engine in (("vmSeconds", "VM"), ("closuresSeconds", "closures"), ("pythonSeconds", "transpiled")):
+            if key not in base or key not in now:
+                continue  # baselines saved before the engine existed
+            ratio = now[key] / base[key]
+            if ratio > 1 + threshold:
+                regressions.append(f"{name}: {engine} {ratio - 1:.0%} slower ({base[key] * 1000:.1f} ms -> "
+                                   f"{now[key] * 1000:.1f} ms)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the VM, closure and transpiler engines against a tree-walking evaluator.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_parser = sub.add_parser("run")
+    run_parser.add_argument("--program", nargs="+", choices=list(PROGRAMS), default=list(PROGRAMS))
+    run_parser.add_argument("--repeat", type=int, default=3)
+    run_parser.add_argument("--save", help="write the results as a JSON baseline")
+    compare_parser = sub.add_parser("compare")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current", nargs="?", help="saved results to compare (default: run now)")
+    compare_parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown, 0.10 = 10%%")
+    compare_parser.add_argument("--repeat", type=int)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        data = run_benchmark(args.program, args.repeat)
+        report(data)
+        if args.save:
+            with open(args.save, 'w') as f:
+                json.dump(data, f, indent=2)
+        mismatches = [name for name, r in data["results"].items() if not r["matches"]]
+        if mismatches:
+            for name in mismatches:
+                print(f"{name}: {data['results'][name]['detail']}")
+            sys.exit(1)
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if args.current:
+        with open(args.current) as f:
+            current = json.load(f)
+    else:
+        names = [name for name in baseline["results"] if name in PROGRAMS]
+        current = run_benchmark(names, args.repeat or baseline["meta"]["repeat"])
+    regressions = compare(baseline, current, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+In-process cache for analysis results.
+
+Entries are stored per (source key, phase) so a request can reuse whatever
+survived eviction: the tokens, the AST or the semantic diagnostics. Values
+are kept serialized (see PHASE_CODECS), which makes the byte budget exact
+and hands every caller a fresh copy it is free to modify.
+
+An optional backing store (disk_cache.DiskCache) acts as a second tier:
+misses fall through to it, results found there are promoted into memory,
+and new results are written through to it.
+"""
+
+import json
+import threading
+from collections import OrderedDict
+
+import ast_binary
+from lexical import Tokens
+
+# Rough per-entry bookkeeping cost (key string, tuple, OrderedDict slot)
+ENTRY_OVERHEAD = 200
+
+
+def encode_tokens(value):
+    tokens, errors = value
+    return json.dumps([[[t.type, t.value, t.line] for t in tokens], errors], separators=(',', ':')).encode('utf-8')
+
+
+def decode_tokens(blob):
+    tokens, errors = json.loads(blob)
+    return [Tokens(*t) for t in tokens], errors
+
+
+def encode_ast(value):
+    ast, errors = value
+    return ast_binary.dumps([ast, errors])
+
+
+def decode_ast(blob):
+    ast, errors = ast_binary.loads(blob)
+    return ast, errors
+
+
+def encode_diagnostics(errors):
+    return json.dumps(errors, separators=(',', ':')).encode('utf-8')
+
+
+def decode_diagnostics(blob):
+    return json.loads(blob)
+
+
+PHASE_CODECS = {
+    'tokens': (encode_tokens, decode_tokens),
+    'ast': (encode_ast, decode_ast),
+    'diagnostics': (encode_diagnostics, decode_diagnostics),
+}
+
+
+class ResultCache:
+    def __init__(self, max_bytes=64 * 1024 * 1024, backing=None):
+        self.max_bytes = max_bytes
+        self.backing = backing
+        self.entries = OrderedDict()  # (key, phase) -> blob, least recently used first
+        self.size = 0
+        self.lock = threading.Lock()
+        self.hits = dict.fromkeys(PHASE_CODECS, 0)
+        self.misses = dict.fromkeys(PHASE_CODECS, 0)
+        self.evictions = 0
+        self.backing_hits = 0
+
+    def get_blob(self, key, phase):
+        with self.lock:
+            blob = self.entries.get((key, phase))
+            if blob is not None:
+                self.entries.move_to_end((key, phase))
+                self.hits[phase] += 1
+                return blob
+            self.misses[phase] += 1
+
+        if self.backing is None:
+            return None
+        blob = self.backing.get_blob(key, phase)
+        if blob is not None:
+            with self.lock:
+                self.backing_hits += 1
+            self.put_blob(key, phase, blob, write_through=False)
+        return blob
+
+    def put_blob(self, key, phase, blob, write_through=True):
+        if write_through and self.backing is not None:
+            self.backing.put_blob(key, phase, blob)
+        cost = len(blob) + ENTRY_OVERHEAD
+        if cost > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop((key, phase), None)
+            if old is not None:
+                self.size -= len(old) + ENTRY_OVERHEAD
+            self.entries[(key, phase)] = blob
+            self.size += cost
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted) + ENTRY_OVERHEAD
+                self.evictions += 1
+
+    def get(self, key, phase):
+        blob = self.get_blob(key, phase)
+        if blob is None:
+            return None
+        return PHASE_CODECS[phase][1](blob)
+
+    def put(self, key, phase, value):
+        self.put_blob(key, phase, PHASE_CODECS[phase][0](value))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self.lock:
+            stats = {
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "maxBytes": self.max_bytes,
+                "hits": dict(self.hits),
+                "misses": dict(self.misses),
+                "evictions": self.evictions,
+                "backingHits": self.backing_hits,
+            }
+        if self.backing is not None:
+            stats["disk"] = self.backing.stats()
+        return stats
@@ -0,0 +1,289 @@
+"""
+Control-flow graphs over the three-address IR (see ir.py).
+
+    python cfg.py dot FILE.c [--function NAME] [--dominators]
+    python cfg.py bench [--functions N] [--seed N]
+
+build(function) splits an IRFunction into basic blocks and returns a CFG;
+build_all(module) does so for every function. A block starts at the first
+instruction, at every label and after every jump or return, so the
+structure comes from the lowering: if/else and loops from their labels
+and jumps, break and continue from their jumps, switch fall-through from
+a case body running into the next case's label, and an early return from
+the return ending its block (code after it lands in a block nothing
+reaches).
+
+Everything is kept in integer arrays, not objects per block or edge:
+
+    starts                  first instruction of each block (the block ends where the next starts)
+    succ_offsets, succ      successors of block b: succ[succ_offsets[b]:succ_offsets[b + 1]]
+    pred_offsets, pred      predecessors, laid out the same way
+    rpo                     reachable blocks in reverse postorder from the entry, block 0
+    idom                    immediate dominator of each block (-1 for the entry and unreachable blocks)
+    dom_pre, dom_post       dominator tree numbering, so dominates() takes constant time
+
+Dominators are computed with the iterative algorithm of Cooper, Harvey and
+Kennedy over the reverse postorder. to_dot() exports a graph, with the
+instructions of each block and optionally the dominator tree, for
+Graphviz.
+"""
+
+import argparse
+import time
+from array import array
+from bisect import bisect_right
+
+from ir import OPCODE_IDS, format_instruction
+
+JUMP = OPCODE_IDS['jump']
+JUMPIF = OPCODE_IDS['jumpif']
+JUMPIFNOT = OPCODE_IDS['jumpifnot']
+RETURN = OPCODE_IDS['return']
+LABEL = OPCODE_IDS['label']
+
+
+def _csr(count, edges):
+    # Offsets and targets for (source, target) pairs grouped by source
+    offsets = array('i', bytes(4 * (count + 1)))
+    for source, _ in edges:
+        offsets[source + 1] += 1
+    for b in range(count):
+        offsets[b + 1] += offsets[b]
+    targets = array('i', bytes(4 * len(edges)))
+    fill = array('i', offsets[:-1])
+    for source, target in edges:
+        targets[fill[source]] = target
+        fill[source] += 1
+    return offsets, targets
+
+
+class CFG:
+    def __init__(self, function):
+        self.function = function
+        ops, a, b, dst = function.ops, function.a, function.b, function.dst
+        n = len(ops)
+
+        leader = bytearray(n)
+        if n:
+            leader[0] = 1
+        for i in range(n):
+            op = ops[i]
+            if op == LABEL:
+                leader[i] = 1
+            elif (op == JUMP or op == JUMPIF or op == JUMPIFNOT or op == RETURN) and i + 1 < n:
+                leader[i + 1] = 1
+        self.starts = array('i', (i for i in range(n) if leader[i]))
+        count = len(self.starts)
+
+        # Label operand -> block it starts
+        label_block = {}
+        for block, start in enumerate(self.starts):
+            if ops[start] == LABEL:
+                label_block[dst[start]] = block
+
+        edges = []
+        self.branch_targets = array('i', [-1]) * count  # block taken when a conditional jump jumps
+        for block in range(count):
+            last = (self.starts[block + 1] if block + 1 < count else n) - 1
+            op = ops[last]
+            if op == JUMP:
+                edges.append((block, label_block[a[last]]))
+            elif op == JUMPIF or op == JUMPIFNOT:
+                target = label_block[b[last]]
+                self.branch_targets[block] = target
+                edges.append((block, target))
+                if block + 1 < count and block + 1 != target:
+                    edges.append((block, block + 1))
+            elif op != RETURN and block + 1 < count:
+                edges.append((block, block + 1))
+        self.succ_offsets, self.succ = _csr(count, edges)
+        self.pred_offsets, self.pred = _csr(count, [(t, s) for s, t in edges])
+
+        self._order()
+        self._dominators()
+
+    def __len__(self):
+        return len(self.starts)
+
+    def successors(self, block):
+        return self.succ[self.succ_offsets[block]:self.succ_offsets[block + 1]]
+
+    def predecessors(self, block):
+        return self.pred[self.pred_offsets[block]:self.pred_offsets[block + 1]]
+
+    def instructions(self, block):
+        # Range of instruction indexes in the block
+        end = self.starts[block + 1] if block + 1 < len(self.starts) else len(self.function)
+        return range(self.starts[block], end)
+
+    def block_of(self, instruction):
+        return bisect_right(self.starts, instruction) - 1
+
+    def reachable(self, block):
+        return self.rpo_index[block] >= 0
+
+    def _order(self):
+        # Reverse postorder of the blocks reachable from the entry, by an iterative DFS
+        count = len(self)
+        self.rpo_index = array('i', [-1]) * count
+        postorder = []
+        if count:
+            visited = bytearray(count)
+            visited[0] = 1
+            stack = [(0, self.succ_offsets[0])]
+            while stack:
+                block, edge = stack[-1]
+                if edge < self.succ_offsets[block + 1]:
+                    stack[-1] = (block, edge + 1)
+                    target = self.succ[edge]
+                    if not visited[target]:
+                        visited[target] = 1
+                        stack.append((target, self.succ_offsets[target]))
+                else:
+                    stack.pop()
+                    postorder.append(block)
+        self.rpo = array('i', reversed(postorder))
+        for index, block in enumerate(self.rpo):
+            self.rpo_index[block] = index
+
+    def _dominators(self):
+        count = len(self)
+        idom = array('i', [-1]) * count
+        rpo_index = self.rpo_index
+        if count:
+            idom[0] = 0
+            changed = True
+            while changed:
+                changed = False
+                for block in self.rpo[1:]:
+                    new = -1
+                    for p in self.predecessors(block):
+                        if idom[p] == -1:
+                            continue
+                        if new == -1:
+                            new = p
+                            continue
+                        # Intersect: walk both up the tree until they meet
+                        x, y = p, new
+                        while x != y:
+                            while rpo_index[x] > rpo_index[y]:
+                                x = idom[x]
+                            while rpo_index[y] > rpo_index[x]:
+                                y = idom[y]
+                        new = x
+                    if idom[block] != new:
+                        idom[block] = new
+                        changed = True
+            idom[0] = -1
+        self.idom = idom
+
+        # Dominator tree children, then pre/post numbers for constant-time dominance tests
+        self.dom_offsets, self.dom_children = _csr(count, [(idom[b], b) for b in range(count) if idom[b] >= 0])
+        self.dom_pre = array('i', [-1]) * count
+        self.dom_post = array('i', [-1]) * count
+        if count:
+            clock = 0
+            stack = [(0, self.dom_offsets[0])]
+            self.dom_pre[0] = clock
+            while stack:
+                block, edge = stack[-1]
+                if edge < self.dom_offsets[block + 1]:
+                    stack[-1] = (block, edge + 1)
+                    child = self.dom_children[edge]
+                    clock += 1
+                    self.dom_pre[child] = clock
+                    stack.append((child, self.dom_offsets[child]))
+                else:
+                    stack.pop()
+                    clock += 1
+                    self.dom_post[block] = clock
+
+    def dominates(self, a, b):
+        # True if every path from the entry to b passes through a (a block dominates itself)
+        if self.dom_pre[a] < 0 or self.dom_pre[b] < 0:
+            return False
+        return self.dom_pre[a] <= self.dom_pre[b] and self.dom_post[b] <= self.dom_post[a]
+
+    def nbytes(self):
+        arrays = (self.starts, self.branch_targets, self.succ_offsets, self.succ, self.pred_offsets, self.pred,
+                  self.rpo, self.rpo_index, self.idom, self.dom_offsets, self.dom_children, self.dom_pre, self.dom_post)
+        return sum(len(x) * x.itemsize for x in arrays)
+
+
+def build(function):
+    return CFG(function)
+
+
+def build_all(module):
+    return {name: CFG(function) for name, function in module.functions.items()}
+
+
+def _dot_text(text):
+    return text.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def to_dot(cfg, dominators=False):
+    """Graphviz source for the graph; with dominators, the dominator tree is drawn as dashed edges."""
+    function = cfg.function
+    lines = [f'digraph "{_dot_text(function.name)}" {{',
+             '  node [shape=box, fontname="monospace"];']
+    for block in range(len(cfg)):
+        body = [f"b{block}" + ("" if cfg.reachable(block) else " (unreachable)")]
+        for i in cfg.instructions(block):
+            op, dst, a, b, _ = function.instruction(i)
+            body.append(format_instruction(op, dst, a, b))
+        label = ''.join(_dot_text(line) + '\\l' for line in body)
+        style = '' if cfg.reachable(block) else ', style=dashed'
+        lines.append(f'  b{block} [label="{label}"{style}];')
+    for block in range(len(cfg)):
+        last = function.instruction(cfg.instructions(block)[-1])[0]
+        for target in cfg.successors(block):
+            attrs = ''
+            if cfg.branch_targets[block] >= 0:
+                taken = target == cfg.branch_targets[block]
+                attrs = f' [label="{"true" if taken == (last == "jumpif") else "false"}"]'
+            lines.append(f'  b{block} -> b{target}{attrs};')
+    if dominators:
+        for block in range(len(cfg)):
+            if cfg.idom[block] >= 0:
+                lines.append(f'  b{cfg.idom[block]} -> b{block} [style=dashed, color=gray, constraint=false];')
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+
+def main():
+    from ir import _lower_source
+    parser = argparse.ArgumentParser(description="Build control-flow graphs from C source.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    dot_parser = sub.add_parser("dot")
+    dot_parser.add_argument("file")
+    dot_parser.add_argument("--function", help="only this function (default: all)")
+    dot_parser.add_argument("--dominators", action="store_true", help="also draw the dominator tree")
+    bench_parser = sub.add_parser("bench")
+    bench_parser.add_argument("--functions", type=int, default=2000)
+    bench_parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == "dot":
+        with open(args.file) as f:
+            module = _lower_source(f.read())
+        for name, function in module.functions.items():
+            if args.function in (None, name):
+                print(to_dot(build(function), args.dominators), end='')
+        return
+
+    from corpus import generate
+    module = _lower_source(generate(args.seed, functions=args.functions, statements=4, depth=2))
+    instructions = sum(len(function) for function in module.functions.values())
+    start = time.perf_counter()
+    graphs = build_all(module)
+    elapsed = time.perf_counter() - start
+    blocks = sum(len(g) for g in graphs.values())
+    edges = sum(len(g.succ) for g in graphs.values())
+    print(f"{len(graphs)} functions, {instructions} instructions, {blocks} blocks, {edges} edges")
+    print(f"built in {elapsed * 1000:.1f} ms ({elapsed / len(graphs) * 1e6:.0f} us per function), "
+          f"{sum(g.nbytes() for g in graphs.values()) / blocks:.0f} bytes per block")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,903 @@
+"""
+Closure-compiling execution engine: the AST compiled once into nested
+Python closures.
+
+    python closures.py run FILE.c [--max-steps N] [--max-seconds S]
+
+compile_program(tree) turns every node into a closure taking the current
+frame, a list of slots: [runtime, return value, parameters..., locals...].
+Variables are resolved to slot indexes (or global indexes) and operators,
+conversions and callees to specialised closures while compiling, so
+running a FunctionDeclaration is a chain of direct closure calls with no
+name lookups. Statements return None, or BREAK, CONTINUE or RETURN to
+unwind to the enclosing loop or call. Semantics are those of vm.py:
+same types, wraparound, C division, printf subset and errors, though a
+runtime error carries no source line.
+
+Compiled functions are cached by fingerprint (see fingerprint()): a hash
+of the function's tree, source lines included, and of the program's global
+variables and function signatures, which are all the compiled code
+depends on. Runtime state lives in a Runtime object reached through slot
+0 rather than captured, so one compiled function serves any number of
+runs and threads at once; after an edit, only the functions that changed
+are compiled again.
+
+Running is sandboxed by a step budget, with one step per AST node along
+the straight-line code of a function body or loop iteration charged on
+entry to it (an upper bound on the nodes evaluated). Steps are handed out
+in slices; when a slice runs out, Runtime.refill() enforces max_steps and
+max_seconds and calls the `hook` passed to run(), which can inspect
+runtime.steps() and raise to stop the program. Call depth and output are
+bounded as in vm.py.
+"""
+
+import argparse
+import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from ast_nodes import *
+from optimizer import constant_value
+from vm import (COMPOUND, DEFAULT_MAX_DEPTH, DEFAULT_MAX_OUTPUT, DEFAULT_MAX_SECONDS, INT_MAX, INT_MIN, STORAGE,
+                CompileError, RunResult, VMError, divide, float_divide, float_to_int, format_printf, parse_format,
+                unescape, wrap_char, wrap_int)
+
+BREAK, CONTINUE, RETURN = 1, 2, 3
+
+DEFAULT_MAX_STEPS = 10_000_000
+SLICE_STEPS = 1 << 16        # steps handed out between refill() checks
+FRAMES_PER_CALL = 64         # Python frames allowed per C call when raising the recursion limit
+CACHE_SIZE = 1024            # compiled functions kept by the default cache
+
+COMPARISONS = ('<', '<=', '>', '>=', '==', '!=')
+
+
+class Runtime:
+    """The state of one run, reached by compiled code through slot 0 of every frame."""
+
+    __slots__ = ('globals', 'functions', 'remaining', 'granted', 'max_steps', 'deadline', 'hook',
+                 'depth', 'max_depth', 'output', 'printed', 'max_output')
+
+    def __init__(self, program, max_steps, max_seconds, max_output, max_depth, hook):
+        self.globals = list(program.globals)
+        self.functions = [function.invoke for function in program.functions]
+        self.max_steps = max_steps
+        self.granted = self.remaining = min(SLICE_STEPS, max_steps)
+        self.deadline = time.perf_counter() + max_seconds
+        self.hook = hook
+        self.depth = 0
+        self.max_depth = max_depth
+        self.output = []
+        self.printed = 0
+        self.max_output = max_output
+
+    def steps(self):
+        return self.granted - self.remaining
+
+    def refill(self):
+        # Called by compiled code once `remaining` drops below zero
+        used = self.granted - self.remaining
+        if used > self.max_steps:
+            raise VMError(f"step limit of {self.max_steps} exceeded", 'instructions')
+        if time.perf_counter() > self.deadline:
+            raise VMError("time limit exceeded", 'seconds')
+        if self.hook is not None:
+            self.hook(self)
+        self.remaining = min(SLICE_STEPS, self.max_steps - used)
+        self.granted = used + self.remaining
+
+    def write(self, text):
+        self.printed += len(text)
+        if self.printed > self.max_output:
+            self.output.append(text[:len(text) - (self.printed - self.max_output)])
+            raise VMError(f"output limit of {self.max_output} characters exceeded", 'output')
+        self.output.append(text)
+
+
+def straight_cost(node):
+    # Nodes evaluated along node's code outside loops (loop conditions and bodies charge per iteration)
+    count = 0
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, list):
+            stack.extend(item)
+        elif isinstance(item, ASTNode):
+            count += 1
+            if isinstance(item, WhileStatement):
+                continue
+            if isinstance(item, ForStatement):
+                stack.append(item.init)
+                continue
+            stack.extend(getattr(item, field, None) for field in item._fields)
+    return count
+
+
+def fingerprint(node):
+    """A hash of a tree's structure, values and source lines."""
+    digest = hashlib.sha256()
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, (list, tuple)):
+            digest.update(f"[{type(item).__name__}{len(item)}".encode())
+            stack.extend(reversed(item))
+        elif isinstance(item, ASTNode):
+            digest.update(f"<{type(item).__name__}:{item.line}".encode())
+            stack.extend(reversed([getattr(item, field, None) for field in item._fields]))
+        else:
+            digest.update(repr(item).encode() + b'\0')
+    return digest.hexdigest()
+
+
+class FunctionCache:
+    """Compiled functions by key, least recently used evicted first."""
+
+    def __init__(self, max_entries=CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            function = self.entries.get(key)
+            if function is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.entries.move_to_end(key)
+            return function
+
+    def put(self, key, function):
+        with self.lock:
+            self.entries[key] = function
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "maxEntries": self.max_entries,
+                    "hits": self.hits, "misses": self.misses}
+
+
+function_cache = FunctionCache()
+
+
+class CompiledFunction:
+    def __init__(self, name, return_type, params, invoke):
+        self.name = name
+        self.return_type = return_type
+        self.params = params
+        self.invoke = invoke  # invoke(runtime, args) -> return value
+
+
+class ClosureProgram:
+    def __init__(self, functions, globals_, entry, cache_hits):
+        self.functions = functions    # CompiledFunction by index; the last one initializes globals and calls main
+        self.globals = globals_       # initial value of each global
+        self.entry = entry
+        self.cache_hits = cache_hits  # functions that came from the cache
+
+
+def _zero(storage):
+    return 0.0 if storage == 'float' else 0
+
+
+def _kind(storage):
+    return 'float' if storage == 'float' else 'int'
+
+
+class _FunctionCompiler:
+    """Compiles one function body; `environment` holds the globals and signatures it may refer to."""
+
+    def __init__(self, environment, params, return_type):
+        self.global_scope, self.signatures = environment
+        self.return_type = return_type
+        self.scopes = [{}]
+        self.slots = 2  # runtime, return value
+        self.locals = []
+        for storage, name in params:
+            self.scopes[-1][name] = ('local', self.slots, storage)
+            self.slots += 1
+        self.loop_depth = 0
+        self.switch_depth = 0
+
+    def declare(self, name, storage):
+        slot = self.slots
+        self.slots += 1
+        self.locals.append(_zero(storage))
+        self.scopes[-1][name] = ('local', slot, storage)
+        return slot
+
+    def resolve(self, name, line):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        if name in self.global_scope:
+            return self.global_scope[name]
+        raise CompileError(f"Variable '{name}' at line {line} is not declared.")
+
+    # Statements
+
+    def statement(self, node):
+        if node is None:
+            raise CompileError("Cannot run a program with parse errors.")
+        line = node.line or 0
+        if isinstance(node, Block):
+            self.scopes.append({})
+            statements = [self.statement(stmt) for stmt in node.statements]
+            self.scopes.pop()
+            return self.sequence(statements)
+        if isinstance(node, VariableDeclaration):
+            storage = STORAGE.get(node.var_type)
+            if storage is None:
+                raise CompileError(f"Type '{node.var_type}' at line {line} cannot hold a value.")
+            if node.initializer is not None:
+                # The initializer is evaluated before the name comes into scope
+                value = self.converted(node.initializer, storage, line)
+                slot = self.declare(node.name, storage)
+
+                def declare(frame):
+                    frame[slot] = value(frame)
+                return declare
+            slot = self.declare(node.name, storage)
+            zero = _zero(storage)
+
+            def declare(frame):
+                frame[slot] = zero
+            return declare
+        if isinstance(node, ExpressionStatement):
+            if node.expression is None:
+                return lambda frame: None
+            expr = self.expression(node.expression)[0]
+
+            def evaluate(frame):
+                expr(frame)
+            return evaluate
+        if isinstance(node, IfStatement):
+            test = self.test(node.condition, line)
+            then = self.statement(node.then_branch)
+            if node.else_branch is None:
+                def branch(frame):
+                    if test(frame):
+                        return then(frame)
+                return branch
+            otherwise = self.statement(node.else_branch)
+
+            def branch(frame):
+                if test(frame):
+                    return then(frame)
+                return otherwise(frame)
+            return branch
+        if isinstance(node, WhileStatement):
+            return self.loop(None, node.condition, node.body, None, line)
+        if isinstance(node, ForStatement):
+            self.scopes.append({})
+            init = self.statement(node.init) if node.init is not None else None
+            loop = self.loop(init, node.condition, node.body, node.increment, line)
+            self.scopes.pop()
+            return loop
+        if isinstance(node, SwitchStatement):
+            return self.switch(node, line)
+        if isinstance(node, BreakStatement):
+            if not self.loop_depth and not self.switch_depth:
+                raise CompileError(f"'break' at line {line} is not inside a loop or switch.")
+            return lambda frame: BREAK
+        if isinstance(node, ContinueStatement):
+            if not self.loop_depth:
+                raise CompileError(f"'continue' at line {line} is not inside a loop.")
+            return lambda frame: CONTINUE
+        if isinstance(node, ReturnStatement):
+            if node.value is None or self.return_type == 'void':
+                if node.value is None:
+                    return lambda frame: RETURN
+                expr = self.expression(node.value)[0]
+
+                def leave(frame):
+                    expr(frame)
+                    return RETURN
+                return leave
+            value = self.converted(node.value, self.return_type, line)
+
+            def leave(frame):
+                frame[1] = value(frame)
+                return RETURN
+            return leave
+        if isinstance(node, FunctionDeclaration):
+            raise CompileError(f"Function '{node.name}' at line {line} is defined inside another function.")
+        raise CompileError(f"Cannot run {type(node).__name__} at line {line}.")
+
+    def sequence(self, statements):
+        if not statements:
+            return lambda frame: None
+        if len(statements) == 1:
+            return statements[0]
+        if len(statements) == 2:
+            first, second = statements
+
+            def pair(frame):
+                return first(frame) or second(frame)
+            return pair
+        statements = tuple(statements)
+
+        def block(frame):
+            for stmt in statements:
+                signal = stmt(frame)
+                if signal:
+                    return signal
+        return block
+
+    def loop(self, init, condition, body_node, increment, line):
+        # while loops have no init or increment; a missing condition loops forever
+        test = self.test(condition, line) if condition is not None else (lambda frame: True)
+        self.loop_depth += 1
+        body = self.statement(body_node)
+        self.loop_depth -= 1
+        step = self.expression(increment)[0] if increment is not None else None
+        cost = max(1, straight_cost(condition) + straight_cost(body_node) + straight_cost(increment))
+
+        def run_loop(frame):
+            runtime = frame[0]
+            while test(frame):
+                runtime.remaining -= cost
+                if runtime.remaining < 0:
+                    runtime.refill()
+                signal = body(frame)
+                if signal:
+                    if signal == BREAK:
+                        break
+                    if signal == RETURN:
+                        return signal
+                if step is not None:
+                    step(frame)
+
+        if init is None:
+            return run_loop
+
+        def loop_with_init(frame):
+            init(frame)
+            return run_loop(frame)
+        return loop_with_init
+
+    def switch(self, node, line):
+        value = self.converted(node.expression, 'int', line)
+        cases = node.cases
+        tests = [self.converted(case.value, 'int', case.line or line) for case in cases]
+        constants = [constant_value(case.value) if isinstance(case.value, Number) else
+                     wrap_char(ord(unescape(case.value.value))) if isinstance(case.value, CharNode) else None
+                     for case in cases]
+        self.switch_depth += 1
+        bodies = [self.statement(case.body) for case in cases]
+        if node.default is not None:
+            bodies.append(self.statement(node.default.body))
+        self.switch_depth -= 1
+        default = len(cases) if node.default is not None else len(bodies)
+        bodies = tuple(bodies)
+
+        if all(isinstance(c, int) for c in constants):
+            # Constant cases: a dict from value to the first body to run (the first case wins on duplicates)
+            starts = {}
+            for index, constant in enumerate(constants):
+                starts.setdefault(wrap_int(constant), index)
+
+            def choose(frame):
+                return starts.get(value(frame), default)
+        else:
+            def choose(frame):
+                selected = value(frame)
+                for index, test in enumerate(tests):
+                    if test(frame) == selected:
+                        return index
+                return default
+
+        def dispatch(frame):
+            for body in bodies[choose(frame):]:
+                signal = body(frame)
+                if signal:
+                    return None if signal == BREAK else signal
+        return dispatch
+
+    # Expressions
+
+    def converted(self, node, storage, line):
+        fn, kind = self.expression(node)
+        return self.convert(fn, kind, storage, line)
+
+    def convert(self, fn, kind, storage, line):
+        if kind == 'str':
+            raise CompileError(f"A string at line {line} can only be passed to printf.")
+        if kind == 'void':
+            raise CompileError(f"A void value at line {line} is used.")
+        if storage == 'float':
+            return fn if kind == 'float' else (lambda frame: float(fn(frame)))
+        if kind == 'float':
+            if storage == 'char':
+                return lambda frame: wrap_char(float_to_int(fn(frame)))
+            return lambda frame: float_to_int(fn(frame))
+        if storage == 'char':
+            return lambda frame: wrap_char(fn(frame))
+        return fn
+
+    def test(self, node, line):
+        # A closure giving the truth of a condition, comparisons as plain bools
+        if isinstance(node, BinaryOperation) and node.operator in COMPARISONS:
+            return self.comparison(node, line, as_int=False)
+        fn, kind = self.expression(node)
+        if kind in ('str', 'void'):
+            raise CompileError(f"The condition at line {line} is not a number.")
+        return fn
+
+    def expression(self, node):
+        # (closure, type): type is 'int', 'float', 'str' or 'void'
+        if node is None:
+            raise CompileError("Cannot run a program with parse errors.")
+        line = node.line or 0
+        if isinstance(node, Number):
+            value = constant_value(node)
+            if value is None:
+                raise CompileError(f"'{node.value}' at line {line} is not a valid number.")
+            value = value if isinstance(value, float) else wrap_int(value)
+            return (lambda frame: value), 'float' if isinstance(value, float) else 'int'
+        if isinstance(node, CharNode):
+            text = unescape(node.value)
+            if len(text) != 1:
+                raise CompileError(f"'{node.value}' at line {line} is not a single character.")
+            value = wrap_char(ord(text))
+            return (lambda frame: value), 'int'
+        if isinstance(node, StringNode):
+            text = unescape(node.value)
+            return (lambda frame: text), 'str'
+        if isinstance(node, VariableNode):
+            scope, slot, storage = self.resolve(node.name, line)
+            if scope == 'local':
+                return (lambda frame: frame[slot]), _kind(storage)
+            return (lambda frame: frame[0].globals[slot]), _kind(storage)
+        if isinstance(node, BinaryOperation):
+            if node.operator == '=':
+                return self.assign(node.left, node.right, line)
+            if node.operator in ('&&', '||'):
+                return self.logical(node, line)
+            if node.operator in COMPARISONS:
+                return self.comparison(node, line, as_int=True), 'int'
+            left, left_kind = self.expression(node.left)
+            right, right_kind = self.expression(node.right)
+            return self.arithmetic(node.operator, left, left_kind, right, right_kind, line,
+                                   self.leaf(node.left), self.leaf(node.right))
+        if isinstance(node, AssignmentExpression):
+            if node.operator == '=':
+                return self.assign(node.left, node.right, line)
+            variable = self.variable(node.left, line)
+            current, kind = self.expression(node.left)
+            right, right_kind = self.expression(node.right)
+            value, value_kind = self.arithmetic(COMPOUND[node.operator], current, kind, right, right_kind, line,
+                                                self.leaf(node.left), self.leaf(node.right))
+            return self.store(variable, self.convert(value, value_kind, variable[2], line)), _kind(variable[2])
+        if isinstance(node, UnaryOperation):
+            if node.operator in ('++', '--'):
+                return self.increment(node, line)
+            operand, kind = self.expression(node.operand)
+            if kind in ('str', 'void'):
+                raise CompileError(f"Operator '{node.operator}' at line {line} needs a number.")
+            if node.operator == '-':
+                if kind == 'float':
+                    return (lambda frame: -operand(frame)), kind
+                return (lambda frame: wrap_int(-operand(frame))), kind
+            if node.operator == '!':
+                return (lambda frame: 0 if operand(frame) else 1), 'int'
+            if node.operator == '~':
+                if kind == 'float':
+                    raise CompileError(f"Operator '~' at line {line} needs an integer.")
+                return (lambda frame: ~operand(frame)), kind
+            if node.operator == '+':
+                return operand, kind
+            raise CompileError(f"Unknown operator '{node.operator}' at line {line}.")
+        if isinstance(node, FunctionCallNode):
+            return self.call(node, line)
+        raise CompileError(f"Cannot run {type(node).__name__} at line {line}.")
+
+    def leaf(self, node):
+        # ('local', slot) or ('const', value) for operands that specialised closures read directly
+        if isinstance(node, VariableNode):
+            for scope in reversed(self.scopes):
+                if node.name in scope:
+                    return ('local', scope[node.name][1]) if scope[node.name][0] == 'local' else None
+            return None
+        if isinstance(node, Number):
+            value = constant_value(node)
+            if isinstance(value, int) and INT_MIN <= value <= INT_MAX:
+                return ('const', value)
+        return None
+
+    def comparison(self, node, line, as_int):
+        left, left_kind = self.expression(node.left)
+        right, right_kind = self.expression(node.right)
+        if {left_kind, right_kind} & {'str', 'void'}:
+            raise CompileError(f"Operator '{node.operator}' at line {line} needs numbers.")
+        op = node.operator
+        a, b = self.leaf(node.left), self.leaf(node.right)
+        if not as_int and a is not None and a[0] == 'local' and b is not None:
+            # The common loop test: a local against a constant or another local
+            s = a[1]
+            if b[0] == 'const':
+                c = b[1]
+                if op == '<':
+                    return lambda frame: frame[s] < c
+                if op == '<=':
+                    return lambda frame: frame[s] <= c
+                if op == '>':
+                    return lambda frame: frame[s] > c
+                if op == '>=':
+                    return lambda frame: frame[s] >= c
+                if op == '==':
+                    return lambda frame: frame[s] == c
+                return lambda frame: frame[s] != c
+            t = b[1]
+            if op == '<':
+                return lambda frame: frame[s] < frame[t]
+            if op == '<=':
+                return lambda frame: frame[s] <= frame[t]
+            if op == '>':
+                return lambda frame: frame[s] > frame[t]
+            if op == '>=':
+                return lambda frame: frame[s] >= frame[t]
+            if op == '==':
+                return lambda frame: frame[s] == frame[t]
+            return lambda frame: frame[s] != frame[t]
+        if op == '<':
+            test = lambda frame: left(frame) < right(frame)
+        elif op == '<=':
+            test = lambda frame: left(frame) <= right(frame)
+        elif op == '>':
+            test = lambda frame: left(frame) > right(frame)
+        elif op == '>=':
+            test = lambda frame: left(frame) >= right(frame)
+        elif op == '==':
+            test = lambda frame: left(frame) == right(frame)
+        else:
+            test = lambda frame: left(frame) != right(frame)
+        if not as_int:
+            return test
+        return lambda frame: 1 if test(frame) else 0
+
+    def arithmetic(self, op, left, left_kind, right, right_kind, line, a=None, b=None):
+        if {left_kind, right_kind} & {'str', 'void'}:
+            raise CompileError(f"Operator '{op}' at line {line} needs numbers.")
+        if left_kind == 'float' or right_kind == 'float':
+            # The int side is promoted; Python mixes int and float the same way
+            if op == '+':
+                return (lambda frame: left(frame) + right(frame)), 'float'
+            if op == '-':
+                return (lambda frame: left(frame) - right(frame)), 'float'
+            if op == '*':
+                return (lambda frame: left(frame) * right(frame)), 'float'
+            if op == '/':
+                return (lambda frame: float_divide(float(left(frame)), float(right(frame)))), 'float'
+            if op == '%':
+                raise CompileError(f"Operator '%' at line {line} needs integers.")
+            raise CompileError(f"Unknown operator '{op}' at line {line}.")
+        if op in ('+', '-') and a is not None and a[0] == 'local' and b is not None and b[0] == 'const':
+            s, c = a[1], b[1] if op == '+' else -b[1]
+
+            def add_constant(frame):
+                v = frame[s] + c
+                return v if INT_MIN <= v <= INT_MAX else wrap_int(v)
+            return add_constant, 'int'
+        if op == '+':
+            def add(frame):
+                v = left(frame) + right(frame)
+                return v if INT_MIN <= v <= INT_MAX else wrap_int(v)
+            return add, 'int'
+        if op == '-':
+            def subtract(frame):
+                v = left(frame) - right(frame)
+                return v if INT_MIN <= v <= INT_MAX else wrap_int(v)
+            return subtract, 'int'
+        if op == '*':
+            def multiply(frame):
+                v = left(frame) * right(frame)
+                return v if INT_MIN <= v <= INT_MAX else wrap_int(v)
+            return multiply, 'int'
+        if op in ('/', '%'):
+            return (lambda frame: divide(left(frame), right(frame), op)), 'int'
+        raise CompileError(f"Unknown operator '{op}' at line {line}.")
+
+    def logical(self, node, line):
+        left, left_kind = self.expression(node.left)
+        right, right_kind = self.expression(node.right)
+        if {left_kind, right_kind} & {'str', 'void'}:
+            raise CompileError(f"Operator '{node.operator}' at line {line} needs numbers.")
+        if node.operator == '&&':
+            return (lambda frame: 1 if left(frame) and right(frame) else 0), 'int'
+        return (lambda frame: 1 if left(frame) or right(frame) else 0), 'int'
+
+    def variable(self, node, line):
+        if not isinstance(node, VariableNode):
+            raise CompileError(f"The left side of the assignment at line {line} is not a variable.")
+        return self.resolve(node.name, line)
+
+    def store(self, variable, value):
+        # A closure assigning value() to the variable and returning it
+        scope, slot, _ = variable
+        if scope == 'local':
+            def assign(frame):
+                v = frame[slot] = value(frame)
+                return v
+            return assign
+
+        def assign_global(frame):
+            v = frame[0].globals[slot] = value(frame)
+            return v
+        return assign_global
+
+    def assign(self, left, right, line):
+        # ((a = b) = c) from the parser's left-associative '=' means a = (b = c)
+        if isinstance(left, BinaryOperation) and left.operator == '=':
+            inner = BinaryOperation('=', left.right, right)
+            inner.line = line
+            return self.assign(left.left, inner, line)
+        variable = self.variable(left, line)
+        return self.store(variable, self.converted(right, variable[2], line)), _kind(variable[2])
+
+    def increment(self, node, line):
+        variable = self.variable(node.operand, line)
+        scope, slot, storage = variable
+        delta = 1 if node.operator == '++' else -1
+        if scope == 'local' and storage == 'int':
+            if node.postfix:
+                def post_increment(frame):
+                    old = frame[slot]
+                    v = old + delta
+                    frame[slot] = v if INT_MIN <= v <= INT_MAX else wrap_int(v)
+                    return old
+                return post_increment, 'int'
+
+            def pre_increment(frame):
+                v = frame[slot] + delta
+                v = frame[slot] = v if INT_MIN <= v <= INT_MAX else wrap_int(v)
+                return v
+            return pre_increment, 'int'
+        current = self.expression(node.operand)[0]
+        if storage == 'float':
+            new = lambda frame: current(frame) + delta
+        elif storage == 'char':
+            new = lambda frame: wrap_char(current(frame) + delta)
+        else:
+            new = lambda frame: wrap_int(current(frame) + delta)
+        assign = self.store(variable, new)
+        if not node.postfix:
+            return assign, _kind(storage)
+
+        def post(frame):
+            old = current(frame)
+            assign(frame)
+            return old
+        return post, _kind(storage)
+
+    def call(self, node, line):
+        if node.name == 'printf':
+            if not node.args or not isinstance(node.args[0], StringNode):
+                raise CompileError(f"printf at line {line} needs a string literal format.")
+            pieces = parse_format(unescape(node.args[0].value), line)
+            conversions = [piece[1] for piece in pieces if not isinstance(piece, str)]
+            if len(node.args) - 1 < len(conversions):
+                raise CompileError(f"printf at line {line} has {len(conversions)} conversion(s) "
+                                   f"but {len(node.args) - 1} argument(s).")
+            args = []
+            for arg, conversion in zip(node.args[1:], conversions + [None] * len(node.args)):
+                fn, kind = self.expression(arg)
+                if kind == 'void' or (conversion is not None and (kind == 'str') != (conversion == 's')):
+                    raise CompileError(f"printf argument at line {line} does not match its '%{conversion}' conversion.")
+                args.append(fn)
+            args = tuple(args)
+
+            def printf(frame):
+                text = format_printf(pieces, [arg(frame) for arg in args])
+                frame[0].write(text)
+                return len(text)
+            return printf, 'int'
+
+        signature = self.signatures.get(node.name)
+        if signature is None:
+            raise CompileError(f"Function '{node.name}' at line {line} is not defined.")
+        index, return_type, params = signature
+        if len(node.args) != len(params):
+            raise CompileError(f"Function '{node.name}' at line {line} takes {len(params)} "
+                               f"argument(s), not {len(node.args)}.")
+        args = tuple(self.converted(arg, storage, line) for arg, storage in zip(node.args, params))
+        kind = 'void' if return_type == 'void' else _kind(return_type)
+        if not args:
+            return (lambda frame: frame[0].functions[index](frame[0], [])), kind
+        if len(args) == 1:
+            first, = args
+            return (lambda frame: frame[0].functions[index](frame[0], [first(frame)])), kind
+        if len(args) == 2:
+            first, second = args
+            return (lambda frame: frame[0].functions[index](frame[0], [first(frame), second(frame)])), kind
+        return (lambda frame: frame[0].functions[index](frame[0], [arg(frame) for arg in args])), kind
+
+
+def _compile_function(environment, name, params, return_type, body, line):
+    compiler = _FunctionCompiler(environment, params, return_type)
+    run_body = compiler.statement(body)
+    local_values = compiler.locals
+    zero = _zero(return_type) if return_type != 'void' else 0
+    cost = max(1, straight_cost(body))
+
+    def invoke(runtime, args):
+        if runtime.depth >= runtime.max_depth:
+            raise VMError(f"call depth limit of {runtime.max_depth} exceeded", 'depth')
+        runtime.remaining -= cost
+        if runtime.remaining < 0:
+            runtime.refill()
+        runtime.depth += 1
+        frame = [runtime, zero]
+        frame += args
+        frame += local_values
+        run_body(frame)
+        runtime.depth -= 1
+        return frame[1]
+    return CompiledFunction(name, return_type, [storage for storage, _ in params], invoke)
+
+
+def _storage(declared, line):
+    storage = STORAGE.get(declared)
+    if storage is None:
+        raise CompileError(f"Type '{declared}' at line {line} cannot hold a value.")
+    return storage
+
+
+def compile_program(tree, cache=function_cache):
+    """Compile a parsed tree to a ClosureProgram, reusing cached functions; raises CompileError."""
+    try:
+        return _compile_program(tree, cache)
+    except RecursionError:
+        raise CompileError("The program is nested too deeply to compile.") from None
+
+
+def _compile_program(tree, cache):
+    statements = tree.statements if isinstance(tree, Program) else tree
+    if not isinstance(statements, list):
+        statements = [statements]
+    if any(stmt is None for stmt in statements):
+        raise CompileError("Cannot run a program with parse errors.")
+
+    signatures = {}  # name -> (index, return storage or 'void', [param storage])
+    declarations = []
+    for stmt in statements:
+        if isinstance(stmt, FunctionDeclaration):
+            if stmt.name in signatures or stmt.name == 'printf':
+                raise CompileError(f"Function '{stmt.name}' at line {stmt.line} is defined twice.")
+            if stmt.body is None:
+                raise CompileError(f"Function '{stmt.name}' at line {stmt.line} has no body.")
+            params = [(_storage(t, stmt.line), name) for t, name in stmt.parameters]
+            return_type = 'void' if stmt.return_type == 'void' else _storage(stmt.return_type, stmt.line)
+            signatures[stmt.name] = (len(declarations), return_type, [storage for storage, _ in params])
+            declarations.append((stmt, params, return_type))
+    if 'main' not in signatures:
+        raise CompileError("The program has no main function.")
+
+    global_scope = {}
+    globals_ = []
+    for stmt in statements:
+        if isinstance(stmt, VariableDeclaration):
+            storage = _storage(stmt.var_type, stmt.line)
+            global_scope[stmt.name] = ('global', len(globals_), storage)
+            globals_.append(_zero(storage))
+    environment = (global_scope, signatures)
+    # What compiled code depends on besides its own tree
+    environment_key = repr((sorted(global_scope.items()), sorted(signatures.items())))
+
+    functions = []
+    hits = 0
+    for stmt, params, return_type in declarations:
+        key = hashlib.sha256((fingerprint(stmt) + environment_key).encode()).hexdigest()
+        function = cache.get(key) if cache is not None else None
+        if function is None:
+            function = _compile_function(environment, stmt.name, params, return_type, stmt.body, stmt.line)
+            if cache is not None:
+                cache.put(key, function)
+        else:
+            hits += 1
+        functions.append(function)
+
+    # Global initializers and other top-level statements, then main; not cached, as they are rarely large.
+    # As in vm.py, an initializer sees only the globals declared before it.
+    compiler = _FunctionCompiler(({}, signatures), [], 'int')
+    steps = []
+    for stmt in statements:
+        if isinstance(stmt, VariableDeclaration):
+            variable = global_scope[stmt.name]
+            if stmt.initializer is not None:
+                value = compiler.converted(stmt.initializer, variable[2], stmt.line or 0)
+                steps.append(_statement(compiler.store(variable, value)))
+            compiler.global_scope[stmt.name] = variable
+        elif not isinstance(stmt, FunctionDeclaration):
+            steps.append(compiler.statement(stmt))
+    main = signatures['main'][0]
+
+    def call_main(frame):
+        frame[1] = frame[0].functions[main](frame[0], [])
+    steps.append(call_main)
+    run_init = compiler.sequence(steps)
+    local_values = compiler.locals
+
+    def invoke_init(runtime, args):
+        frame = [runtime, 0] + local_values
+        run_init(frame)
+        return frame[1]
+    functions.append(CompiledFunction('.init', 'int', [], invoke_init))
+    return ClosureProgram(functions, globals_, len(functions) - 1, hits)
+
+
+def _statement(fn):
+    # An expression closure used as a statement: its value must not be taken for a signal
+    def statement(frame):
+        fn(frame)
+    return statement
+
+
+def run(program, max_steps=DEFAULT_MAX_STEPS, max_seconds=DEFAULT_MAX_SECONDS, max_output=DEFAULT_MAX_OUTPUT,
+        max_depth=DEFAULT_MAX_DEPTH, hook=None):
+    """Run a ClosureProgram and return a RunResult (instructions counts steps); errors are reported in it."""
+    needed = max_depth * FRAMES_PER_CALL + 1000
+    if sys.getrecursionlimit() < needed:
+        sys.setrecursionlimit(needed)  # only ever raised, other threads may be running compiled code
+    runtime = Runtime(program, max_steps, max_seconds, max_output, max_depth, hook)
+    started = time.perf_counter()
+    try:
+        exit_code = runtime.functions[program.entry](runtime, [])
+        error = limit = None
+    except VMError as e:
+        exit_code, error, limit = None, str(e), e.limit
+    except RecursionError:
+        exit_code, error, limit = None, "expressions or calls nested too deeply", 'depth'
+    return RunResult(''.join(runtime.output), exit_code, min(runtime.steps(), max_steps),
+                     time.perf_counter() - started, error, limit)
+
+
+def compile_source(source, cache=function_cache):
+    """Lex, parse and compile source text; raises CompileError listing lexical or syntax errors."""
+    import contextlib
+    import io
+    from lexical import Lexical
+    from parser import Parser
+    tokens, lexical_errors = Lexical(source).get_tokens()
+    with contextlib.redirect_stdout(io.StringIO()):
+        parser = Parser(tokens)
+        tree = parser.parse()
+    errors = list(lexical_errors) + list(parser.errors)
+    if errors:
+        raise CompileError(f"{len(errors)} error(s) before compiling, first: {errors[0]}")
+    return compile_program(tree, cache)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile a C-subset program to closures and run it.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_parser = sub.add_parser("run")
+    run_parser.add_argument("file")
+    run_parser.add_argument("--max-steps", type=int, default=DEFAULT_MAX_STEPS)
+    run_parser.add_argument("--max-seconds", type=float, default=DEFAULT_MAX_SECONDS)
+    args = parser.parse_args()
+
+    with open(args.file) as f:
+        source = f.read()
+    try:
+        program = compile_source(source)
+    except CompileError as e:
+        sys.exit(f"error: {e}")
+    result = run(program, args.max_steps, args.max_seconds)
+    sys.stdout.write(result.output)
+    if result.error is not None:
+        sys.exit(f"error: {result.error}")
+    print(f"[exit {result.exit_code}, {result.instructions} steps, {result.seconds:.3f}s]", file=sys.stderr)
+    sys.exit(result.exit_code & 0xFF)
+
+
+if __name__ == "__main__":
+    main()
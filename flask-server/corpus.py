@@ -0,0 +1,177 @@
+"""
+Seeded generator of C programs in the subset the analyzer supports.
+
+    python corpus.py [--seed N] [--functions N] [--statements N] [--depth N]
+                     [--expr-depth N] [--chars N]
+
+The same seed and options always give the same program. Programs lex and
+parse without errors: every variable is declared (with a type keyword,
+which is also how the lexer learns identifiers) before it is used and only
+in scope, names are unique, and only int, float and char are used. Calls
+resolve, since every function is declared before it is called, and every
+variable is initialized where it is declared. The only semantic output is
+for variables that, the program being random, are never read.
+
+- functions:  functions before main; each takes two ints and returns one
+- statements: statements per block
+- depth:      how deep if/while/for/switch bodies may nest
+- expr_depth: how deep binary expression trees may grow
+
+generate_sized() keeps adding functions until the program reaches a
+number of characters, for corpora of a given size.
+"""
+
+import argparse
+import random
+
+BINARY_OPS = ('+', '-', '*', '/', '%', '<', '>', '<=', '>=', '==', '!=', '&&', '||')
+COMPOUND_OPS = ('=', '+=', '-=', '*=')
+
+
+class _Generator:
+    def __init__(self, rng, statements, depth, expr_depth):
+        self.rng = rng
+        self.statements = statements
+        self.depth = depth
+        self.expr_depth = expr_depth
+        self.functions = []
+        self.counter = 0
+        self.ints = []
+
+    def name(self, prefix):
+        self.counter += 1
+        return f"{prefix}{self.counter}"
+
+    def operand(self, calls=True):
+        rng = self.rng
+        choice = rng.random()
+        if choice < 0.5 and self.ints:
+            return rng.choice(self.ints)
+        if choice < 0.6 and calls and self.functions:
+            return f"{rng.choice(self.functions)}({self.operand(False)}, {self.operand(False)})"
+        return str(rng.randint(1, 99))
+
+    def expression(self, depth=None):
+        depth = self.expr_depth if depth is None else depth
+        if depth <= 0 or self.rng.random() < 0.3:
+            return self.operand()
+        op = self.rng.choice(BINARY_OPS)
+        left = self.expression(depth - 1)
+        right = self.expression(depth - 1) if op not in ('/', '%') else str(self.rng.randint(1, 9))
+        if self.rng.random() < 0.3:
+            return f"({left} {op} {right})"
+        return f"{left} {op} {right}"
+
+    def block(self, indent, depth):
+        # Variables declared in the block go out of scope at its end
+        visible = len(self.ints)
+        lines = []
+        for _ in range(self.statements):
+            lines.extend(self.statement(indent, depth))
+        del self.ints[visible:]
+        return lines
+
+    def statement(self, indent, depth):
+        rng = self.rng
+        pad = '    ' * indent
+        kind = rng.random()
+        if depth > 0 and kind < 0.12:
+            lines = [f"{pad}if ({self.expression()}) {{"]
+            lines += self.block(indent + 1, depth - 1)
+            if rng.random() < 0.5:
+                lines.append(f"{pad}}} else {{")
+                lines += self.block(indent + 1, depth - 1)
+            return lines + [f"{pad}}}"]
+        if depth > 0 and kind < 0.2:
+            counter = self.name('w')
+            lines = [f"{pad}int {counter} = 0;", f"{pad}while ({counter} < {rng.randint(2, 10)}) {{"]
+            lines += self.block(indent + 1, depth - 1)
+            lines.append(f"{pad}    {counter}++;")
+            self.ints.append(counter)
+            return lines + [f"{pad}}}"]
+        if depth > 0 and kind < 0.28:
+            counter = self.name('i')
+            lines = [f"{pad}for (int {counter} = 0; {counter} < {rng.randint(2, 10)}; {counter}++) {{"]
+            self.ints.append(counter)
+            lines += self.block(indent + 1, depth - 1)
+            self.ints.remove(counter)
+            return lines + [f"{pad}}}"]
+        if depth > 0 and kind < 0.33:
+            lines = [f"{pad}switch ({self.expression(1)}) {{"]
+            # Case bodies are braced: a declaration may not follow a label directly
+            for value in rng.sample(range(10), rng.randint(1, 4)):
+                lines.append(f"{pad}    case {value}: {{")
+                lines += self.block(indent + 2, depth - 1)
+                lines.append(f"{pad}        break;")
+                lines.append(f"{pad}    }}")
+            lines.append(f"{pad}    default: {{")
+            lines += self.block(indent + 2, depth - 1)
+            lines.append(f"{pad}    }}")
+            return lines + [f"{pad}}}"]
+        if kind < 0.5:
+            name = self.name('v')
+            line = f"{pad}int {name} = {self.expression()};"
+            self.ints.append(name)
+            return [line]
+        if kind < 0.55:
+            return [f"{pad}float {self.name('f')} = {rng.randint(0, 99)}.{rng.randint(0, 9)};"]
+        if kind < 0.58:
+            return [f"{pad}char {self.name('c')} = '{rng.choice('abcxyz')}';"]
+        if kind < 0.65:
+            return [f'{pad}printf("%d\\n", {self.expression(1)});']
+        if self.ints:
+            target = rng.choice(self.ints)
+            return [f"{pad}{target} {rng.choice(COMPOUND_OPS)} {self.expression()};"]
+        name = self.name('v')
+        line = f"{pad}int {name} = {self.expression()};"
+        self.ints.append(name)
+        return [line]
+
+    def function(self, name, params):
+        self.ints = list(params)
+        header = ', '.join(f"int {p}" for p in params)
+        lines = [f"int {name}({header}) {{"]
+        lines += self.block(1, self.depth)
+        lines.append(f"    return {self.expression(1)};")
+        lines.append("}")
+        self.functions.append(name)
+        return '\n'.join(lines) + '\n\n'
+
+
+def generate(seed=0, functions=10, statements=6, depth=2, expr_depth=3):
+    gen = _Generator(random.Random(seed), statements, depth, expr_depth)
+    parts = [gen.function(gen.name('fn'), (gen.name('a'), gen.name('b'))) for _ in range(functions)]
+    parts.append(gen.function('main', ()))
+    return ''.join(parts)
+
+
+def generate_sized(chars, seed=0, statements=6, depth=2, expr_depth=3):
+    # Functions are added one at a time until the program has at least `chars` characters
+    gen = _Generator(random.Random(seed), statements, depth, expr_depth)
+    parts = []
+    size = 0
+    while size < chars:
+        part = gen.function(gen.name('fn'), (gen.name('a'), gen.name('b')))
+        parts.append(part)
+        size += len(part)
+    parts.append(gen.function('main', ()))
+    return ''.join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a C program for benchmarks.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--functions", type=int, default=10)
+    parser.add_argument("--statements", type=int, default=6)
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--expr-depth", type=int, default=3)
+    parser.add_argument("--chars", type=int, help="generate at least this many characters instead of --functions")
+    args = parser.parse_args()
+    if args.chars:
+        print(generate_sized(args.chars, args.seed, args.statements, args.depth, args.expr_depth), end='')
+    else:
+        print(generate(args.seed, args.functions, args.statements, args.depth, args.expr_depth), end='')
+
+
+if __name__ == "__main__":
+    main()
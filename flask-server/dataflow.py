@@ -0,0 +1,260 @@
+"""
+Iterative bit-vector data-flow analysis over control-flow graphs (cfg.py).
+
+Every analysis here is a gen/kill problem: each instruction maps a set of
+facts to gen | (set & ~kill). Sets are Python ints used as bit vectors,
+so meeting, transferring and comparing them costs a few machine words per
+64 facts. Per-instruction gen/kill pairs are composed into one pair per
+block, and solve() iterates the block equations to a fixpoint with a
+worklist ordered by reverse postorder (postorder for backward problems),
+which settles acyclic code in a single pass and loops in a few.
+
+    reaching_definitions(cfg)   forward, may:  instructions whose assignment can reach a point
+    liveness(cfg)               backward, may: variables that can be read before being assigned again
+    definite_assignment(cfg)    forward, must: variables assigned on every path to a point
+
+The facts are about a function's locals and parameters (its `decl`
+operands and params), not temporaries or globals. An analysis result
+keeps the state at the entry and exit of every block; walk(block) replays
+a block to give the state at each instruction. Blocks that the entry
+never reaches are left out of the iteration.
+"""
+
+import heapq
+
+from ir import NONE, OPCODE_IDS
+
+DECL = OPCODE_IDS['decl']
+CALL = OPCODE_IDS['call']
+# Opcodes that read their a and b operands and write dst (copy, arithmetic, comparisons, unary)
+_COMPUTE = frozenset(OPCODE_IDS[op] for op in (
+    'copy', 'add', 'sub', 'mul', 'div', 'mod', 'lt', 'le', 'gt', 'ge', 'eq', 'ne', 'neg', 'not', 'bitnot'))
+# Opcodes that read only a
+_READ_A = frozenset(OPCODE_IDS[op] for op in ('jumpif', 'jumpifnot', 'param', 'return'))
+
+
+def reads(function, i):
+    # Operand indexes read by instruction i
+    op = function.ops[i]
+    if op in _COMPUTE:
+        a, b = function.a[i], function.b[i]
+        return [x for x in (a, b) if x != NONE]
+    if op in _READ_A and function.a[i] != NONE:
+        return [function.a[i]]
+    return []
+
+
+def writes(function, i):
+    # Operand index assigned by instruction i, or NONE
+    op = function.ops[i]
+    return function.dst[i] if op in _COMPUTE or op == CALL else NONE
+
+
+class Variables:
+    """The locals and parameters of a function, numbered as bits."""
+
+    def __init__(self, function):
+        self.bits = {}   # operand index -> bit
+        self.names = []  # IR names by bit (shadowing locals are renamed x.1, x.2, ...)
+        self.params = 0  # mask of the parameters
+        for _, name in function.params:
+            self.params |= 1 << self.add(function.operand_ids.get(('var', name)), name)
+        for i in range(len(function)):
+            if function.ops[i] == DECL:
+                index = function.dst[i]
+                self.add(index, function.operands[index][1])
+        self.all = (1 << len(self.names)) - 1
+
+    def add(self, index, name):
+        if index is None:
+            # A parameter the body never mentions has no operand; give it a bit anyway
+            index = ('unused param', name)
+        if index not in self.bits:
+            self.bits[index] = len(self.names)
+            self.names.append(name)
+        return self.bits[index]
+
+    def __len__(self):
+        return len(self.names)
+
+
+def solve(cfg, gen, kill, forward=True, may=True, boundary=0, universe=0):
+    """
+    Solve the block equations for gen/kill lists indexed by block. A may
+    problem meets with union, a must problem with intersection, starting
+    from `universe` everywhere but the boundary. `boundary` is the state
+    at the entry block's start (forward) or at every exit's end
+    (backward). Returns (entry, exit) lists: the state at the start and at
+    the end of each block.
+    """
+    count = len(cfg)
+    initial = 0 if may else universe
+    before = [initial] * count  # state flowing into each block, in analysis direction
+    after = [initial] * count
+    if forward:
+        sources, targets, priority = cfg.predecessors, cfg.successors, cfg.rpo_index
+    else:
+        sources, targets, priority = cfg.successors, cfg.predecessors, [-index for index in cfg.rpo_index]
+
+    queued = bytearray(count)
+    worklist = []
+    for block in cfg.rpo:
+        queued[block] = 1
+        worklist.append((priority[block], block))
+    heapq.heapify(worklist)
+    while worklist:
+        _, block = heapq.heappop(worklist)
+        queued[block] = 0
+        inputs = [after[s] for s in sources(block) if cfg.reachable(s)]
+        if block == 0 if forward else not cfg.successors(block):
+            inputs.append(boundary)
+        state = inputs[0] if inputs else initial
+        for value in inputs[1:]:
+            state = state | value if may else state & value
+        before[block] = state
+        out = gen[block] | (state & ~kill[block])
+        if out != after[block]:
+            after[block] = out
+            for target in targets(block):
+                if cfg.reachable(target) and not queued[target]:
+                    queued[target] = 1
+                    heapq.heappush(worklist, (priority[target], target))
+    return (before, after) if forward else (after, before)
+
+
+class Analysis:
+    """Base for a gen/kill problem; subclasses define transfer(i) and the facts."""
+
+    forward = True
+    may = True
+
+    def __init__(self, cfg, variables=None):
+        self.cfg = cfg
+        self.function = cfg.function
+        self.variables = variables if variables is not None else Variables(cfg.function)
+        self.prepare()
+        count = len(cfg)
+        gen, kill = [0] * count, [0] * count
+        for block in range(count):
+            g = k = 0
+            for i in self._order(block):
+                ig, ik = self.transfer(i)
+                g, k = ig | (g & ~ik), k | ik
+            gen[block], kill[block] = g, k
+        self.entry, self.exit = solve(cfg, gen, kill, self.forward, self.may, self.boundary(), self.universe())
+
+    def prepare(self):
+        pass
+
+    def boundary(self):
+        return 0
+
+    def universe(self):
+        return 0
+
+    def transfer(self, i):
+        raise NotImplementedError
+
+    def _order(self, block):
+        instructions = self.cfg.instructions(block)
+        return instructions if self.forward else reversed(instructions)
+
+    def walk(self, block):
+        """Yield (instruction, state) through the block in analysis direction, the state just before it applies."""
+        state = self.entry[block] if self.forward else self.exit[block]
+        for i in self._order(block):
+            yield i, state
+            gen, kill = self.transfer(i)
+            state = gen | (state & ~kill)
+
+
+class ReachingDefinitions(Analysis):
+    """
+    Facts are definitions, numbered densely: self.definitions[d] is the
+    instruction of definition d, and the value parameter k arrives with is
+    definition len(self.definitions) + k. A `decl` counts as a definition
+    too, of the variable's indeterminate initial value, so a read that one
+    reaches may see an uninitialized variable.
+    """
+
+    def prepare(self):
+        function, bits = self.function, self.variables.bits
+        self.definitions = []  # definition -> instruction
+        self.numbers = {}      # instruction -> definition
+        self.variable_of = []  # definition -> variable bit
+        for i in range(len(function)):
+            target = writes(function, i) if function.ops[i] != DECL else function.dst[i]
+            if target in bits:
+                self.numbers[i] = len(self.definitions)
+                self.definitions.append(i)
+                self.variable_of.append(bits[target])
+        for _, name in function.params:
+            self.variable_of.append(bits[function.operand_ids.get(('var', name), ('unused param', name))])
+        self.by_variable = [0] * len(self.variables)  # variable bit -> mask of its definitions
+        for d, bit in enumerate(self.variable_of):
+            self.by_variable[bit] |= 1 << d
+
+    def boundary(self):
+        first = len(self.definitions)
+        return ((1 << len(self.function.params)) - 1) << first
+
+    def transfer(self, i):
+        d = self.numbers.get(i)
+        if d is None:
+            return 0, 0
+        return 1 << d, self.by_variable[self.variable_of[d]]
+
+    def instruction(self, d):
+        # Instruction of definition d, or None for a parameter's incoming value
+        return self.definitions[d] if d < len(self.definitions) else None
+
+
+class Liveness(Analysis):
+    """Facts are variables; a variable is live where its current value may still be read."""
+
+    forward = False
+
+    def transfer(self, i):
+        function, bits = self.function, self.variables.bits
+        uses = 0
+        for index in reads(function, i):
+            if index in bits:
+                uses |= 1 << bits[index]
+        target = writes(function, i) if function.ops[i] != DECL else function.dst[i]
+        kill = 1 << bits[target] if target in bits else 0
+        return uses, kill
+
+
+class DefiniteAssignment(Analysis):
+    """Facts are variables; a variable is in the set where every path to that point assigned it."""
+
+    may = False
+
+    def boundary(self):
+        return self.variables.params
+
+    def universe(self):
+        return self.variables.all
+
+    def transfer(self, i):
+        function, bits = self.function, self.variables.bits
+        if function.ops[i] == DECL:
+            index = function.dst[i]
+            return 0, (1 << bits[index]) if index in bits else 0
+        target = writes(function, i)
+        if target in bits:
+            bit = 1 << bits[target]
+            return bit, bit
+        return 0, 0
+
+
+def reaching_definitions(cfg, variables=None):
+    return ReachingDefinitions(cfg, variables)
+
+
+def liveness(cfg, variables=None):
+    return Liveness(cfg, variables)
+
+
+def definite_assignment(cfg, variables=None):
+    return DefiniteAssignment(cfg, variables)
@@ -0,0 +1,236 @@
+"""
+Dead-code elimination over the parser's AST.
+
+eliminate() returns a copy of a tree (the top-level statement list from
+Parser.parse, a Program or any single node) with code removed that can
+never run or whose result is never used, together with counts of what
+was removed. Like optimize(), it leaves the tree passed in unchanged.
+
+- functions that neither main nor a global initializer calls, directly
+  or through other functions (only when the tree defines main; a name
+  used as a plain value counts as a call)
+- statements in a block after one that never falls through: return,
+  break, continue, a block ending in one, or an if whose branches all
+  end in one
+- if branches and while loops that a constant condition rules out
+- local variables that their function never refers to, when their
+  initializer has no side effects (repeated, as removing one may leave
+  another unused)
+
+When a `warnings` list is passed, a message is appended for each removal,
+so the pass can double as an unreachable-code and unused-code check. Run
+optimize() first to turn constant expressions into the literals this
+pass recognises.
+"""
+
+import copy
+
+from ast_nodes import *
+from optimizer import constant_branch_message, constant_value, count_nodes
+
+
+def walk(tree):
+    # Every node below tree, in no particular order
+    stack = [tree]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, list):
+            stack.extend(item)
+        elif isinstance(item, ASTNode):
+            yield item
+            stack.extend(getattr(item, field, None) for field in item._fields)
+
+
+def has_side_effects(expr):
+    for node in walk(expr):
+        if isinstance(node, (FunctionCallNode, AssignmentExpression)):
+            return True
+        if isinstance(node, BinaryOperation) and node.operator == '=':
+            # The parser builds plain assignments as BinaryOperation('=')
+            return True
+        if isinstance(node, UnaryOperation) and node.operator in ('++', '--'):
+            return True
+    return False
+
+
+def leaves_block(stmt):
+    # True if control never continues to the statement after stmt
+    if isinstance(stmt, (ReturnStatement, BreakStatement, ContinueStatement)):
+        return True
+    if isinstance(stmt, Block):
+        return any(leaves_block(s) for s in stmt.statements)
+    if isinstance(stmt, IfStatement):
+        return stmt.else_branch is not None and leaves_block(stmt.then_branch) and leaves_block(stmt.else_branch)
+    return False
+
+
+def _replace(node, **fields):
+    node = copy.copy(node)
+    for field, value in fields.items():
+        setattr(node, field, value)
+    return node
+
+
+class DeadCodeEliminator:
+    def __init__(self, warnings=None):
+        self.warnings = warnings
+        self.unreachable = 0        # runs of statements after one that leaves the block
+        self.constant_branches = 0  # if branches and while loops ruled out by their condition
+        self.unused_variables = 0
+        self.uncalled_functions = 0
+
+    def warn(self, message):
+        if self.warnings is not None:
+            self.warnings.append(message)
+
+    def run(self, tree):
+        statements = tree.statements if isinstance(tree, Program) else tree
+        if isinstance(statements, list):
+            statements = self.remove_uncalled(statements)
+            tree = _replace(tree, statements=statements) if isinstance(tree, Program) else statements
+        tree = self.visit(tree)
+        return self.remove_unused(tree)
+
+    def remove_uncalled(self, statements):
+        functions = {}
+        for stmt in statements:
+            if isinstance(stmt, FunctionDeclaration):
+                functions.setdefault(stmt.name, []).append(stmt)
+        if 'main' not in functions:
+            return statements
+
+        def reach(tree):
+            for node in walk(tree):
+                name = node.name if isinstance(node, (FunctionCallNode, VariableNode)) else None
+                if name in functions and name not in reached:
+                    reached.add(name)
+                    pending.append(name)
+
+        reached = {'main'}
+        pending = ['main']
+        # Global initializers run before main, so the functions they call are live too
+        reach([stmt for stmt in statements if not isinstance(stmt, FunctionDeclaration)])
+        while pending:
+            for function in functions[pending.pop()]:
+                reach(function.body)
+
+        kept = []
+        for stmt in statements:
+            if isinstance(stmt, FunctionDeclaration) and stmt.name not in reached:
+                self.uncalled_functions += 1
+                self.warn(f"Function '{stmt.name}' at line {stmt.line} is never called from main.")
+            else:
+                kept.append(stmt)
+        return kept if len(kept) < len(statements) else statements
+
+    def visit_statements(self, statements):
+        # Visits a statement list, dropping removed statements and those after one that leaves the block
+        kept = []
+        for i, stmt in enumerate(statements):
+            new = self.visit(stmt)
+            if new is not None or stmt is None:
+                kept.append(new)
+            if new is not None and leaves_block(new) and i + 1 < len(statements):
+                self.unreachable += 1
+                first = next((s for s in statements[i + 1:] if s is not None), None)
+                if first is not None:
+                    self.warn(f"Unreachable code at line {first.line}: control never gets past line {new.line}.")
+                break
+        if len(kept) == len(statements) and all(new is old for old, new in zip(statements, kept)):
+            return statements
+        return kept
+
+    def visit(self, node):
+        # Returns the node with dead code removed, the same object if nothing changed, or None if removed
+        if isinstance(node, list):
+            return self.visit_statements(node)
+        if not isinstance(node, ASTNode):
+            return node
+
+        if isinstance(node, IfStatement):
+            condition = constant_value(node.condition)
+            if condition is not None:
+                self.constant_branches += 1
+                if node.else_branch is not None or not condition:
+                    self.warn(constant_branch_message(node, condition))
+                return self.visit(node.then_branch if condition else node.else_branch)
+        if isinstance(node, WhileStatement) and constant_value(node.condition) == 0:
+            self.constant_branches += 1
+            self.warn(constant_branch_message(node, 0))
+            return None
+
+        changes = {}
+        for field in node._fields:
+            old = getattr(node, field, None)
+            if not isinstance(old, (ASTNode, list)):
+                continue
+            new = self.visit(old)
+            if new is None and field != 'else_branch':
+                new = Block([])
+                new.line = old.line
+            if new is not old:
+                changes[field] = new
+        return _replace(node, **changes) if changes else node
+
+    def remove_unused(self, tree):
+        while True:
+            removed = self.unused_variables
+            tree = self.drop_declarations(tree, None)
+            if self.unused_variables == removed:
+                return tree
+
+    def drop_declarations(self, node, used):
+        # Drops unused declarations from the blocks of each function; `used` holds the names it refers to
+        if isinstance(node, list):
+            items = [self.drop_declarations(item, used) for item in node]
+            return node if all(new is old for old, new in zip(node, items)) else items
+        if not isinstance(node, ASTNode):
+            return node
+        if isinstance(node, FunctionDeclaration):
+            used = {n.name for n in walk(node.body) if isinstance(n, VariableNode)}
+
+        changes = {}
+        for field in node._fields:
+            old = getattr(node, field, None)
+            if isinstance(old, (ASTNode, list)):
+                new = self.drop_declarations(old, used)
+                if new is not old:
+                    changes[field] = new
+        if changes:
+            node = _replace(node, **changes)
+
+        if isinstance(node, Block) and used is not None:
+            kept = []
+            for stmt in node.statements:
+                if (isinstance(stmt, VariableDeclaration) and stmt.name not in used
+                        and not has_side_effects(stmt.initializer)):
+                    self.unused_variables += 1
+                    self.warn(f"Variable '{stmt.name}' declared at line {stmt.line} is never used.")
+                else:
+                    kept.append(stmt)
+            if len(kept) < len(node.statements):
+                node = _replace(node, statements=kept)
+        return node
+
+    def stats(self):
+        return {
+            "unreachable": self.unreachable,
+            "constantBranches": self.constant_branches,
+            "unusedVariables": self.unused_variables,
+            "uncalledFunctions": self.uncalled_functions,
+        }
+
+
+def eliminate(tree, warnings=None):
+    """
+    Return (tree without dead code, stats). Messages describing each removal
+    are appended to `warnings` when it is a list.
+    """
+    eliminator = DeadCodeEliminator(warnings)
+    result = eliminator.run(tree)
+    if result is None:
+        result = [] if isinstance(tree, list) else Block([])
+    stats = eliminator.stats()
+    before, after = count_nodes(tree), count_nodes(result)
+    stats.update(nodesBefore=before, nodesAfter=after, removedNodes=before - after)
+    return result, stats
@@ -0,0 +1,212 @@
+"""
+Persistent analysis cache backed by a local SQLite database.
+
+Used as the backing tier of cache.ResultCache: memory misses fall through
+to the database and every new result is written through, so the working
+set survives restarts and deploys. Rows hold the same serialized phase
+blobs as the memory tier, keyed by (source key, phase, analyzer version).
+
+Several server processes can share one database file: it runs in WAL mode,
+so readers never block each other or the writer, and each thread of each
+process gets its own connection. Access times are only refreshed once per
+TOUCH_INTERVAL to keep the read path free of writes.
+
+    python disk_cache.py stats   PATH
+    python disk_cache.py compact PATH [--max-bytes N] [--max-age SECONDS]
+    python disk_cache.py warm    --server URL [--limit N]
+
+`warm` asks a running server (POST /cache/warm) to preload its hottest
+entries into memory, e.g. as the last step of a deploy.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+import urllib.request
+
+from pipeline import ANALYZER_VERSION
+
+TOUCH_INTERVAL = 60.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key       TEXT NOT NULL,
+    phase     TEXT NOT NULL,
+    version   TEXT NOT NULL,
+    blob      BLOB NOT NULL,
+    size      INTEGER NOT NULL,
+    created   REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits      INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (key, phase, version)
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+"""
+
+
+class DiskCache:
+    def __init__(self, path, max_bytes=512 * 1024 * 1024, max_age=7 * 24 * 3600,
+                 version=ANALYZER_VERSION, compact_every=1000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.version = version
+        self.compact_every = compact_every
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.puts = 0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.connection().executescript(SCHEMA)
+
+    def connection(self):
+        # One connection per thread; reopened after fork since SQLite handles must not cross processes
+        db = getattr(self.local, 'db', None)
+        if db is None or self.local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self.local.db = db
+            self.local.pid = os.getpid()
+        return db
+
+    def _count(self, counter):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get_blob(self, key, phase):
+        now = time.time()
+        try:
+            db = self.connection()
+            row = db.execute(
+                "SELECT blob, last_used FROM entries WHERE key = ? AND phase = ? AND version = ?",
+                (key, phase, self.version)).fetchone()
+            if row is not None and row[1] < now - TOUCH_INTERVAL:
+                db.execute(
+                    "UPDATE entries SET last_used = ?, hits = hits + 1 WHERE key = ? AND phase = ? AND version = ?",
+                    (now, key, phase, self.version))
+        except sqlite3.Error:
+            self._count('errors')
+            return None
+        if row is None:
+            self._count('misses')
+            return None
+        self._count('hits')
+        return bytes(row[0])
+
+    def put_blob(self, key, phase, blob):
+        now = time.time()
+        try:
+            self.connection().execute(
+                "INSERT OR REPLACE INTO entries (key, phase, version, blob, size, created, last_used, hits) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+                (key, phase, self.version, blob, len(blob), now, now))
+        except sqlite3.Error:
+            self._count('errors')
+            return
+        with self.lock:
+            self.puts += 1
+            due = self.compact_every and self.puts % self.compact_every == 0
+        if due:
+            self.compact()
+
+    def compact(self):
+        # Drop rows from other analyzer versions and rows idle for longer than max_age,
+        # then the least recently used rows until the total size fits max_bytes.
+        now = time.time()
+        try:
+            db = self.connection()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                removed = db.execute(
+                    "DELETE FROM entries WHERE version != ? OR last_used < ?",
+                    (self.version, now - self.max_age)).rowcount
+                total = db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+                if total > self.max_bytes:
+                    excess = total - self.max_bytes
+                    cursor = db.execute("SELECT rowid, size FROM entries ORDER BY last_used")
+                    doomed = []
+                    for rowid, size in cursor:
+                        if excess <= 0:
+                            break
+                        doomed.append((rowid,))
+                        excess -= size
+                    cursor.close()
+                    db.executemany("DELETE FROM entries WHERE rowid = ?", doomed)
+                    removed += len(doomed)
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        except sqlite3.Error:
+            self._count('errors')
+            return 0
+        return removed
+
+    def hot_entries(self, limit):
+        # Most used, then most recent entries of the current version
+        return self.connection().execute(
+            "SELECT key, phase, blob FROM entries WHERE version = ? "
+            "ORDER BY hits DESC, last_used DESC LIMIT ?",
+            (self.version, limit)).fetchall()
+
+    def warm(self, memory_cache, limit=1000):
+        # Preload hot rows into the memory tier so the first requests after a restart are hits
+        loaded = 0
+        # Coldest first: each put becomes the most recently used, so the hottest rows end up the
+        # last the memory tier would evict
+        for key, phase, blob in reversed(self.hot_entries(limit)):
+            memory_cache.put_blob(key, phase, bytes(blob), write_through=False)
+            loaded += 1
+        return loaded
+
+    def stats(self):
+        entries, size = self.connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries WHERE version = ?",
+            (self.version,)).fetchone()
+        return {
+            "path": self.path,
+            "entries": entries,
+            "bytes": size,
+            "maxBytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or compact the persistent analysis cache.")
+    parser.add_argument("command", choices=["stats", "compact", "warm"])
+    parser.add_argument("path", nargs="?")
+    parser.add_argument("--max-bytes", type=int, default=512 * 1024 * 1024)
+    parser.add_argument("--max-age", type=float, default=7 * 24 * 3600)
+    parser.add_argument("--server", help="base URL of the server to warm, e.g. http://127.0.0.1:5000")
+    parser.add_argument("--limit", type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.command == "warm":
+        if not args.server:
+            parser.error("warm needs --server")
+        request = urllib.request.Request(
+            args.server.rstrip('/') + '/cache/warm',
+            data=json.dumps({"limit": args.limit}).encode('utf-8'),
+            headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request) as response:
+            print(response.read().decode('utf-8'))
+        return
+
+    if not args.path:
+        parser.error(f"{args.command} needs the database PATH")
+    cache = DiskCache(args.path, max_bytes=args.max_bytes, max_age=args.max_age)
+    if args.command == "compact":
+        print(f"removed {cache.compact()} entries")
+    print(cache.stats())
+
+
+if __name__ == "__main__":
+    main()
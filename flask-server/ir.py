@@ -0,0 +1,678 @@
+"""
+Three-address intermediate representation lowered from the parser's AST.
+
+    python ir.py dump FILE.c
+    python ir.py roundtrip [--programs N] [--seed N]
+
+lower() turns a tree (the top-level statement list from Parser.parse or a
+Program) into an IRModule: one IRFunction per function, plus ".init" for
+global initializers and any statements outside a function. Instructions
+have an opcode and up to three operands (dst, a, b):
+
+    decl     dst = variable, a = type        declares a local
+    copy     dst = a
+    add sub mul div mod lt le gt ge eq ne    dst = a OP b
+    neg not bitnot                           dst = OP a
+    label    dst = label
+    jump     a = label
+    jumpif / jumpifnot                       if a (is / is not 0) goto b
+    param    a                               pushes a call argument
+    call     dst = result or None, a = function, b = argument count
+    return   a or None
+
+Operands are temporaries, variables, constants (int, float, string, char,
+or a number the lexer accepted but C would not, kept as written), labels,
+function names and types. Locals that shadow a name already used in the
+same function are renamed x.1, x.2, ... so every variable name is unique
+per function; globals keep their names.
+
+Each IRFunction stores its code as parallel arrays: an opcode array, three
+operand arrays indexing an interned operand table, and the source line of
+each instruction. dump() writes the text form and parse() reads it back;
+`roundtrip` lowers corpus.py programs and checks that dump, parse and dump
+again reproduce the same code, and that every function passes verify().
+
+&& and || are lowered with jumps, so the right operand only runs when C
+would run it. The parser builds plain assignment as a left-associative
+BinaryOperation('='); a chain such as ((a = b) = c) is lowered as the
+a = (b = c) it came from. A switch tests its cases in order and lays out
+their bodies in order with the default last, which is where the parser
+keeps it.
+"""
+
+import argparse
+import json
+import re
+import sys
+from array import array
+
+from ast_nodes import *
+from optimizer import constant_value
+
+OPCODES = ('decl', 'copy', 'add', 'sub', 'mul', 'div', 'mod', 'lt', 'le', 'gt', 'ge', 'eq', 'ne',
+           'neg', 'not', 'bitnot', 'label', 'jump', 'jumpif', 'jumpifnot', 'param', 'call', 'return')
+OPCODE_IDS = {name: i for i, name in enumerate(OPCODES)}
+
+BINARY = {'+': 'add', '-': 'sub', '*': 'mul', '/': 'div', '%': 'mod', '<': 'lt', '<=': 'le',
+          '>': 'gt', '>=': 'ge', '==': 'eq', '!=': 'ne'}
+BINARY_SYMBOLS = {op: symbol for symbol, op in BINARY.items()}
+UNARY = {'-': 'neg', '!': 'not', '~': 'bitnot'}
+UNARY_SYMBOLS = {op: symbol for symbol, op in UNARY.items()}
+COMPOUND = {'+=': 'add', '-=': 'sub', '*=': 'mul', '/=': 'div', '%=': 'mod'}
+
+NONE = -1  # operand index for an absent operand
+INIT = '.init'
+
+
+class IRError(Exception):
+    pass
+
+
+class IRFunction:
+    def __init__(self, name, return_type=None, params=()):
+        self.name = name
+        self.return_type = return_type
+        self.params = list(params)  # [(type, name)]
+        self.ops = array('B')
+        self.dst = array('i')
+        self.a = array('i')
+        self.b = array('i')
+        self.lines = array('i')     # source line of each instruction, 0 if unknown
+        self.operands = []          # interned (kind, value) pairs
+        self.operand_ids = {}
+        self.temps = 0
+        self.labels = 0
+
+    def __len__(self):
+        return len(self.ops)
+
+    def operand(self, value):
+        if value is None:
+            return NONE
+        index = self.operand_ids.get(value)
+        if index is None:
+            index = self.operand_ids[value] = len(self.operands)
+            self.operands.append(value)
+        return index
+
+    def new_temp(self):
+        self.temps += 1
+        return ('temp', self.temps - 1)
+
+    def new_label(self):
+        self.labels += 1
+        return ('label', self.labels - 1)
+
+    def emit(self, op, dst=None, a=None, b=None, line=None):
+        self.ops.append(OPCODE_IDS[op])
+        self.dst.append(self.operand(dst))
+        self.a.append(self.operand(a))
+        self.b.append(self.operand(b))
+        self.lines.append(line or 0)
+
+    def instruction(self, i):
+        # (op, dst, a, b, line) with operands decoded to (kind, value) or None
+        operands = self.operands
+        decode = lambda index: None if index == NONE else operands[index]
+        return (OPCODES[self.ops[i]], decode(self.dst[i]), decode(self.a[i]), decode(self.b[i]), self.lines[i])
+
+    def __iter__(self):
+        return (self.instruction(i) for i in range(len(self.ops)))
+
+
+class IRModule:
+    def __init__(self):
+        self.globals = {}    # name -> type
+        self.functions = {}  # name -> IRFunction, in source order
+
+    def function(self, name):
+        return self.functions[name]
+
+
+class _Lowering:
+    def __init__(self):
+        self.module = IRModule()
+        self.function = None
+        self.scopes = []
+        self.names = set()  # IR variable names used in the current function
+        self.loops = []     # (break label, continue label or None for a switch)
+        self.init_scopes = [{}]
+        self.init_names = set()
+
+    # Functions and scopes
+
+    def lower(self, tree):
+        statements = tree.statements if isinstance(tree, Program) else tree
+        if not isinstance(statements, list):
+            statements = [statements]
+        for stmt in statements:
+            if stmt is None:
+                raise IRError("cannot lower a tree with parse errors")
+            if isinstance(stmt, FunctionDeclaration):
+                self.lower_function(stmt)
+            elif isinstance(stmt, VariableDeclaration):
+                self.module.globals[stmt.name] = stmt.var_type
+                if stmt.initializer is not None:
+                    self.in_init(lambda: self.emit('copy', ('var', stmt.name), self.expression(stmt.initializer), line=stmt.line))
+            else:
+                self.in_init(lambda: self.statement(stmt))
+        init = self.module.functions.pop(INIT, None)
+        if init is not None:
+            init.emit('return')
+            self.module.functions[INIT] = init
+        return self.module
+
+    def in_init(self, lower):
+        init = self.module.functions.get(INIT)
+        if init is None:
+            init = self.module.functions[INIT] = IRFunction(INIT, 'void')
+        self.function, self.scopes, self.names = init, self.init_scopes, self.init_names
+        lower()
+
+    def lower_function(self, node):
+        if node.name in self.module.functions:
+            raise IRError(f"function '{node.name}' at line {node.line} is defined twice")
+        self.function = self.module.functions[node.name] = IRFunction(node.name, node.return_type, node.parameters)
+        self.scopes = [{name: name for _, name in node.parameters}]
+        self.names = {name for _, name in node.parameters}
+        if node.body is None:
+            raise IRError(f"function '{node.name}' at line {node.line} has no body")
+        self.statement(node.body)
+        self.emit('return', line=node.line)
+
+    def declare(self, name):
+        ir_name = name
+        suffix = 0
+        while ir_name in self.names:
+            suffix += 1
+            ir_name = f"{name}.{suffix}"
+        self.names.add(ir_name)
+        self.scopes[-1][name] = ir_name
+        return ir_name
+
+    def resolve(self, name):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        return name  # a global, or undeclared (reported by the semantic analyzer)
+
+    def emit(self, op, dst=None, a=None, b=None, line=None):
+        self.function.emit(op, dst, a, b, line)
+
+    # Statements
+
+    def statement(self, node):
+        if node is None:
+            raise IRError("cannot lower a tree with parse errors")
+        line = node.line
+        if isinstance(node, Block):
+            self.scopes.append({})
+            for stmt in node.statements:
+                self.statement(stmt)
+            self.scopes.pop()
+        elif isinstance(node, VariableDeclaration):
+            # The initializer is evaluated before the new name is in scope, as in `int x = x + 1;` shadowing
+            value = self.expression(node.initializer) if node.initializer is not None else None
+            variable = ('var', self.declare(node.name))
+            self.emit('decl', variable, ('type', node.var_type), line=line)
+            if value is not None:
+                self.emit('copy', variable, value, line=line)
+        elif isinstance(node, ExpressionStatement):
+            self.expression(node.expression, used=False)
+        elif isinstance(node, IfStatement):
+            condition = self.expression(node.condition)
+            otherwise, end = self.function.new_label(), self.function.new_label()
+            self.emit('jumpifnot', a=condition, b=otherwise if node.else_branch is not None else end, line=line)
+            self.statement(node.then_branch)
+            if node.else_branch is not None:
+                self.emit('jump', a=end, line=line)
+                self.emit('label', otherwise, line=line)
+                self.statement(node.else_branch)
+            self.emit('label', end, line=line)
+        elif isinstance(node, WhileStatement):
+            start, end = self.function.new_label(), self.function.new_label()
+            self.emit('label', start, line=line)
+            self.loop_test(node.condition, end, line)
+            self.loops.append((end, start))
+            self.statement(node.body)
+            self.loops.pop()
+            self.emit('jump', a=start, line=line)
+            self.emit('label', end, line=line)
+        elif isinstance(node, ForStatement):
+            self.scopes.append({})
+            if node.init is not None:
+                self.statement(node.init)
+            start, step, end = self.function.new_label(), self.function.new_label(), self.function.new_label()
+            self.emit('label', start, line=line)
+            if node.condition is not None:
+                self.loop_test(node.condition, end, line)
+            self.loops.append((end, step))
+            self.statement(node.body)
+            self.loops.pop()
+            self.emit('label', step, line=line)
+            if node.increment is not None:
+                self.expression(node.increment, used=False)
+            self.emit('jump', a=start, line=line)
+            self.emit('label', end, line=line)
+            self.scopes.pop()
+        elif isinstance(node, SwitchStatement):
+            self.switch(node)
+        elif isinstance(node, BreakStatement):
+            if not self.loops:
+                raise IRError(f"break outside a loop or switch at line {line}")
+            self.emit('jump', a=self.loops[-1][0], line=line)
+        elif isinstance(node, ContinueStatement):
+            target = next((cont for _, cont in reversed(self.loops) if cont is not None), None)
+            if target is None:
+                raise IRError(f"continue outside a loop at line {line}")
+            self.emit('jump', a=target, line=line)
+        elif isinstance(node, ReturnStatement):
+            self.emit('return', a=self.expression(node.value) if node.value is not None else None, line=line)
+        elif isinstance(node, FunctionDeclaration):
+            raise IRError(f"nested function '{node.name}' at line {line}")
+        else:
+            raise IRError(f"cannot lower {type(node).__name__} at line {line}")
+
+    def loop_test(self, condition, end, line):
+        # A constant condition is not tested: while (1) has no exit edge, while (0) skips the body
+        value = constant_value(condition)
+        if value is None:
+            self.emit('jumpifnot', a=self.expression(condition), b=end, line=line)
+        elif not value:
+            self.emit('jump', a=end, line=line)
+
+    def switch(self, node):
+        line = node.line
+        value = self.expression(node.expression)
+        if value[0] != 'temp':
+            # Evaluate once; a variable could change between case tests
+            temp = self.function.new_temp()
+            self.emit('copy', temp, value, line=line)
+            value = temp
+        end = self.function.new_label()
+        targets = []
+        for case in node.cases:
+            target = self.function.new_label()
+            test = self.function.new_temp()
+            self.emit('eq', test, value, self.expression(case.value), line=case.line)
+            self.emit('jumpif', a=test, b=target, line=case.line)
+            targets.append((target, case))
+        if node.default is not None:
+            target = self.function.new_label()
+            targets.append((target, node.default))
+            self.emit('jump', a=target, line=line)
+        else:
+            self.emit('jump', a=end, line=line)
+        self.loops.append((end, None))
+        for target, case in targets:
+            self.emit('label', target, line=case.line)
+            self.statement(case.body)
+        self.loops.pop()
+        self.emit('label', end, line=line)
+
+    # Expressions
+
+    def expression(self, node, used=True):
+        # Returns the operand holding the value; `used` False lets calls and assignments skip the result
+        if node is None:
+            raise IRError("cannot lower a tree with parse errors")
+        line = node.line
+        if isinstance(node, Number):
+            value = constant_value(node)
+            if value is None:
+                return ('number', node.value)
+            return ('float', value) if isinstance(value, float) else ('int', value)
+        if isinstance(node, StringNode):
+            return ('str', node.value)
+        if isinstance(node, CharNode):
+            return ('char', node.value)
+        if isinstance(node, VariableNode):
+            return ('var', self.resolve(node.name))
+        if isinstance(node, BinaryOperation):
+            if node.operator == '=':
+                return self.assign(node.left, node.right, line)
+            if node.operator in ('&&', '||'):
+                return self.logical(node)
+            return self.arithmetic(node)
+        if isinstance(node, UnaryOperation):
+            if node.operator in ('++', '--'):
+                return self.increment(node, used)
+            return self.arithmetic(node)
+        if isinstance(node, AssignmentExpression):
+            if node.operator == '=':
+                return self.assign(node.left, node.right, line)
+            target = self.lvalue(node.left, line)
+            right = self.expression(node.right)
+            self.emit(COMPOUND[node.operator], target, target, right, line=line)
+            return target
+        if isinstance(node, FunctionCallNode):
+            args = [self.expression(arg) for arg in node.args]
+            for arg in args:
+                self.emit('param', a=arg, line=line)
+            result = self.function.new_temp() if used else None
+            self.emit('call', result, ('func', node.name), ('int', len(args)), line=line)
+            return result
+        raise IRError(f"cannot lower {type(node).__name__} at line {line}")
+
+    def arithmetic(self, root):
+        # Arithmetic, comparison and unary operators, lowered with an explicit stack so a long chain
+        # such as 1 + 1 + ... + 1 does not recurse once per operator; operands are lowered left to
+        # right and each result temp is taken after its operands', as a recursive walk would
+        values = []
+        stack = [(root, None)]
+        while stack:
+            node, op = stack.pop()
+            if op is None:
+                if isinstance(node, BinaryOperation) and node.operator not in ('=', '&&', '||'):
+                    op = BINARY.get(node.operator)
+                    if op is None:
+                        raise IRError(f"unknown operator '{node.operator}' at line {node.line}")
+                    stack.append((node, op))
+                    stack.append((node.right, None))
+                    stack.append((node.left, None))
+                elif isinstance(node, UnaryOperation) and node.operator == '+':
+                    stack.append((node.operand, None))  # the operand's value as it is
+                elif isinstance(node, UnaryOperation) and node.operator not in ('++', '--'):
+                    op = UNARY.get(node.operator)
+                    if op is None:
+                        raise IRError(f"unknown operator '{node.operator}' at line {node.line}")
+                    stack.append((node, op))
+                    stack.append((node.operand, None))
+                else:
+                    values.append(self.expression(node))
+            else:
+                operands = values[-2:] if isinstance(node, BinaryOperation) else values[-1:]
+                del values[-len(operands):]
+                result = self.function.new_temp()
+                self.emit(op, result, *operands, line=node.line)
+                values.append(result)
+        return values[0]
+
+    def lvalue(self, node, line):
+        if not isinstance(node, VariableNode):
+            raise IRError(f"left side of assignment at line {line} is not a variable")
+        return ('var', self.resolve(node.name))
+
+    def assign(self, left, right, line):
+        # ((a = b) = c) from the parser's left-associative '=' means a = (b = c)
+        if isinstance(left, BinaryOperation) and left.operator == '=':
+            inner = BinaryOperation('=', left.right, right)
+            inner.line = line
+            return self.assign(left.left, inner, line)
+        target = self.lvalue(left, line)
+        self.emit('copy', target, self.expression(right), line=line)
+        return target
+
+    def increment(self, node, used):
+        target = self.lvalue(node.operand, node.line)
+        op = 'add' if node.operator == '++' else 'sub'
+        old = None
+        if node.postfix and used:
+            old = self.function.new_temp()
+            self.emit('copy', old, target, line=node.line)
+        self.emit(op, target, target, ('int', 1), line=node.line)
+        return old if old is not None else target
+
+    def logical(self, node):
+        # result = 0 or 1; the right operand is skipped once the left decides
+        line = node.line
+        result = self.function.new_temp()
+        short, end = self.function.new_label(), self.function.new_label()
+        jump = 'jumpifnot' if node.operator == '&&' else 'jumpif'
+        self.emit(jump, a=self.expression(node.left), b=short, line=line)
+        self.emit(jump, a=self.expression(node.right), b=short, line=line)
+        self.emit('copy', result, ('int', int(node.operator == '&&')), line=line)
+        self.emit('jump', a=end, line=line)
+        self.emit('label', short, line=line)
+        self.emit('copy', result, ('int', int(node.operator == '||')), line=line)
+        self.emit('label', end, line=line)
+        return result
+
+
+def lower(tree):
+    """Lower a parsed tree to an IRModule; raises IRError for trees it cannot lower."""
+    try:
+        return _Lowering().lower(tree)
+    except RecursionError:
+        raise IRError("the program is nested too deeply to lower") from None
+
+
+# Text form
+
+def format_operand(operand):
+    kind, value = operand
+    if kind == 'temp':
+        return f"%{value}"
+    if kind == 'label':
+        return f".L{value}"
+    if kind == 'func':
+        return f"@{value}"
+    if kind == 'str':
+        return json.dumps(value)
+    if kind == 'char':
+        return f"'{value}'"
+    if kind == 'float':
+        return repr(value)
+    if kind == 'number':
+        return f"#{value}"
+    return str(value)  # var, int, type
+
+
+def format_instruction(op, dst, a, b):
+    f = format_operand
+    if op == 'decl':
+        return f"decl {f(a)} {f(dst)}"
+    if op == 'copy':
+        return f"{f(dst)} = {f(a)}"
+    if op in BINARY_SYMBOLS:
+        return f"{f(dst)} = {f(a)} {BINARY_SYMBOLS[op]} {f(b)}"
+    if op in UNARY_SYMBOLS:
+        return f"{f(dst)} = {UNARY_SYMBOLS[op]} {f(a)}"
+    if op == 'label':
+        return f"{f(dst)}:"
+    if op == 'jump':
+        return f"jump {f(a)}"
+    if op in ('jumpif', 'jumpifnot'):
+        return f"{'if' if op == 'jumpif' else 'ifnot'} {f(a)} goto {f(b)}"
+    if op == 'param':
+        return f"param {f(a)}"
+    if op == 'call':
+        call = f"call {f(a)} {f(b)}"
+        return f"{f(dst)} = {call}" if dst is not None else call
+    return f"return {f(a)}" if a is not None else "return"
+
+
+def dump(module):
+    lines = []
+    for name, type_ in module.globals.items():
+        lines.append(f"global {type_} {name}")
+    for function in module.functions.values():
+        params = ', '.join(f"{type_} {name}" for type_, name in function.params)
+        lines.append(f"function {function.return_type} @{function.name}({params})")
+        for op, dst, a, b, line in function:
+            text = format_instruction(op, dst, a, b)
+            text = text if op == 'label' else '  ' + text
+            lines.append(f"{text:<40} ; line {line}" if line else text)
+        lines.append("end")
+    return '\n'.join(lines) + '\n'
+
+
+_TOKEN = re.compile(r'"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\'|[^\s,()]+|[(),]')
+_LINE_COMMENT = re.compile(r' ; line (\d+)$')
+
+
+def parse_operand(text):
+    if text.startswith('%'):
+        return ('temp', int(text[1:]))
+    if text.startswith('.L'):
+        return ('label', int(text[2:]))
+    if text.startswith('@'):
+        return ('func', text[1:])
+    if text.startswith('"'):
+        return ('str', json.loads(text))
+    if text.startswith("'"):
+        return ('char', text[1:-1])
+    if text.startswith('#'):
+        return ('number', text[1:])
+    if re.fullmatch(r'-?\d+', text):
+        return ('int', int(text))
+    if re.fullmatch(r'-?(\d+\.\d*(e[-+]?\d+)?|\d+e[-+]?\d+|inf|nan)', text):
+        return ('float', float(text))
+    return ('var', text)
+
+
+def parse(text):
+    """Read the text written by dump() back into an IRModule."""
+    module = IRModule()
+    function = None
+    for number, raw in enumerate(text.splitlines(), 1):
+        comment = _LINE_COMMENT.search(raw)
+        code = raw[:comment.start()] if comment else raw
+        line = int(comment.group(1)) if comment else None
+        words = _TOKEN.findall(code)
+        if not words:
+            continue
+        try:
+            if function is None:
+                if words[0] == 'global':
+                    module.globals[words[2]] = words[1]
+                elif words[0] == 'function':
+                    params = [p.split() for p in code[code.index('(') + 1:code.rindex(')')].split(',') if p.strip()]
+                    function = IRFunction(words[2][1:], words[1], [(t, n) for t, n in params])
+                    module.functions[function.name] = function
+                else:
+                    raise ValueError(raw)
+                continue
+            if words == ['end']:
+                function = None
+                continue
+            function.emit(*_parse_instruction(words), line=line)
+        except (ValueError, IndexError, KeyError) as e:
+            raise IRError(f"line {number}: cannot parse {raw.strip()!r}") from e
+
+    # Temporaries and labels continue after the highest one read
+    for function in module.functions.values():
+        for kind, value in function.operands:
+            if kind == 'temp':
+                function.temps = max(function.temps, value + 1)
+            elif kind == 'label':
+                function.labels = max(function.labels, value + 1)
+    return module
+
+
+def _parse_instruction(words):
+    # (op, dst, a, b) from the words of one instruction
+    p = parse_operand
+    if len(words) == 2 and words[1] == ':' or words[0].endswith(':'):
+        return 'label', p(words[0].rstrip(':')), None, None
+    if words[0] == 'decl':
+        return 'decl', p(words[2]), ('type', words[1]), None
+    if words[0] == 'jump':
+        return 'jump', None, p(words[1]), None
+    if words[0] in ('if', 'ifnot'):
+        return 'jumpif' if words[0] == 'if' else 'jumpifnot', None, p(words[1]), p(words[3])
+    if words[0] == 'param':
+        return 'param', None, p(words[1]), None
+    if words[0] == 'call':
+        return 'call', None, p(words[1]), p(words[2])
+    if words[0] == 'return':
+        return 'return', None, p(words[1]) if len(words) > 1 else None, None
+    dst, rest = p(words[0]), words[2:]
+    if words[1] != '=':
+        raise ValueError(words)
+    if rest[0] == 'call':
+        return 'call', dst, p(rest[1]), p(rest[2])
+    if len(rest) == 1:
+        return 'copy', dst, p(rest[0]), None
+    if len(rest) == 2:
+        return UNARY[rest[0]], dst, p(rest[1]), None
+    return BINARY[rest[1]], dst, p(rest[0]), p(rest[2])
+
+
+def verify(function):
+    # Problems found in a function's code: undefined labels, temporaries read before any write, argument counts
+    problems = []
+    labels = {dst for op, dst, _, _, _ in function if op == 'label'}
+    written = set()
+    pending_params = 0
+    for i, (op, dst, a, b, _) in enumerate(function):
+        for operand in (a, b) if op not in ('jump', 'jumpif', 'jumpifnot') else (a,):
+            if operand is not None and operand[0] == 'temp' and operand not in written:
+                problems.append(f"{function.name}:{i}: {format_operand(operand)} read before it is written")
+        if op in ('jump', 'jumpif', 'jumpifnot'):
+            target = a if op == 'jump' else b
+            if target not in labels:
+                problems.append(f"{function.name}:{i}: jump to undefined label {format_operand(target)}")
+        if op == 'param':
+            pending_params += 1
+        elif op == 'call':
+            if b[1] > pending_params:
+                problems.append(f"{function.name}:{i}: call takes {b[1]} arguments but {pending_params} were pushed")
+            pending_params -= b[1]
+        if dst is not None and dst[0] == 'temp':
+            written.add(dst)
+    return problems
+
+
+def roundtrip(module):
+    # Problems found dumping, parsing and dumping a module again
+    problems = [p for function in module.functions.values() for p in verify(function)]
+    text = dump(module)
+    again = parse(text)
+    if dump(again) != text:
+        problems.append("text changes after dump, parse, dump")
+    for name, function in module.functions.items():
+        other = again.functions.get(name)
+        if other is None or list(function) != list(other) or function.params != other.params:
+            problems.append(f"function {name} differs after parsing its dump")
+    if again.globals != module.globals:
+        problems.append("globals differ after parsing the dump")
+    return problems
+
+
+def _lower_source(source):
+    import contextlib
+    import io
+    from lexical import Lexical
+    from parser import Parser
+    tokens, _ = Lexical(source).get_tokens()
+    with contextlib.redirect_stdout(io.StringIO()):
+        parser = Parser(tokens)
+        ast = parser.parse()
+    if parser.errors:
+        raise IRError(f"{len(parser.errors)} parse error(s), first: {parser.errors[0]}")
+    return lower(ast)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lower C source to three-address IR.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    dump_parser = sub.add_parser("dump")
+    dump_parser.add_argument("file")
+    check_parser = sub.add_parser("roundtrip")
+    check_parser.add_argument("--programs", type=int, default=50)
+    check_parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == "dump":
+        with open(args.file) as f:
+            print(dump(_lower_source(f.read())), end='')
+        return
+
+    from corpus import generate
+    failures = 0
+    instructions = 0
+    for seed in range(args.seed, args.seed + args.programs):
+        module = _lower_source(generate(seed, functions=4, depth=3))
+        instructions += sum(len(function) for function in module.functions.values())
+        problems = roundtrip(module)
+        if problems:
+            failures += 1
+            print(f"seed {seed}: " + '; '.join(problems[:5]))
+    print(f"{args.programs} programs, {instructions} instructions, {failures} failed")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
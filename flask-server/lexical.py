@@ -1,6 +1,14 @@
 
 import difflib
 
+# C library functions the lexer knows by name; the semantic pass treats them as declared
+LIBRARY_FUNCTIONS = frozenset({
+    'printf', 'scanf', 'puts', 'gets', 'malloc', 'calloc', 'free', 'exit',
+    'strlen', 'strcpy', 'strncpy', 'strcmp', 'strcat', 'fopen', 'fclose', 'fread',
+    'fwrite', 'fseek', 'ftell', 'rewind', 'feof', 'fgetc', 'fputc', 'fgets', 'fputs',
+    'getchar', 'putchar', 'perror', 'atoi', 'atof', 'atol', 'toupper', 'tolower'
+})
+
 class Tokens:
     def __init__(self, token_type, token_value, line):
         self.type = token_type
@@ -110,20 +118,20 @@ class Lexical:
         return Tokens('NUMBER', result, line_num)
 
     def collect_string(self):
-        result = ''
+        # The literal ends at the first quote not preceded by a backslash; it is found and
+        # sliced in one go rather than built a character at a time
         line_num = self.line
-        self.advanceNextChar()
-
-        while self.current_char is not None and self.current_char != '"':
-            if self.current_char == '\\' and self.peek() == '"':
-                result += '"'
-                self.advanceNextChar()
-            else:
-                result += self.current_char
-            self.advanceNextChar()
-
+        start = self.pos + 1
+        end = self.text.find('"', start)
+        while end != -1 and self.text[end - 1] == '\\':
+            end = self.text.find('"', end + 1)
+        if end == -1:
+            end = len(self.text)
+        result = self.text[start:end]
+        self.line += result.count('\n')
+        self.pos = end
         self.advanceNextChar()  # Skip closing quote
-        return Tokens('STRING', result, line_num)
+        return Tokens('STRING', result.replace('\\"', '"'), line_num)
 
     def collect_char(self):
         result = ''
@@ -162,9 +170,12 @@ class Lexical:
         return Tokens('PREPROCESSOR_DIRECTIVE', result.strip(), line_num)
 
     def get_tokens(self):
-        tokens = []
         errors = []
+        tokens = list(self.iter_tokens(errors))
+        return tokens, errors
 
+    def iter_tokens(self, errors):
+        # Yields tokens as they are recognised; error messages are appended to `errors`
         self.keywords = {
             'auto', 'break', 'case', 'char', 'const', 'continue', 'default', 'do',
             'double', 'else', 'enum', 'extern', 'float', 'for', 'goto', 'if', 'int',
@@ -172,12 +183,7 @@ class Lexical:
             'struct', 'switch', 'typedef', 'union', 'unsigned', 'void', 'volatile', 'while'
         }
 
-        self.identifiers = {
-            'main', 'printf', 'scanf', 'puts', 'gets', 'malloc', 'calloc', 'free', 'exit',
-            'strlen', 'strcpy', 'strncpy', 'strcmp', 'strcat', 'fopen', 'fclose', 'fread',
-            'fwrite', 'fseek', 'ftell', 'rewind', 'feof', 'fgetc', 'fputc', 'fgets', 'fputs',
-            'getchar', 'putchar', 'perror', 'atoi', 'atof', 'atol', 'toupper', 'tolower'
-        }
+        self.identifiers = {'main'} | LIBRARY_FUNCTIONS
 
         self.operators = {
             '++', '--', '+=', '-=', '*=', '/=', '%=', '==', '!=', '<=', '>=', '&&', '||',
@@ -197,7 +203,7 @@ class Lexical:
 
             if self.current_char == '#':
                 token = self.collect_preprocessor_directive()
-                tokens.append(token)
+                yield token
                 self.last_token_type = token.type
                 continue
 
@@ -205,32 +211,32 @@ class Lexical:
                 token = self.collect_identifier_or_keyword()
                 if token.type == 'ERROR':
                     errors.append(f"Error: '{token.value}' is not a valid identifier at line {token.line}.")
-                tokens.append(token)
+                yield token
                 self.last_token_type = token.type
                 continue
 
             if self.current_char.isdigit():
                 token = self.collect_number()
-                tokens.append(token)
+                yield token
                 self.last_token_type = token.type
                 continue
 
             if self.current_char == '"':
                 token = self.collect_string()
-                tokens.append(token)
+                yield token
                 self.last_token_type = token.type
                 continue
 
             if self.current_char == "'":
                 token = self.collect_char()
-                tokens.append(token)
+                yield token
                 self.last_token_type = token.type
                 continue
 
             two_char = self.current_char + self.peek()
             if two_char in self.operators:
                 token = Tokens('OPERATOR', two_char, self.line)
-                tokens.append(token)
+                yield token
                 self.advanceNextChar()
                 self.advanceNextChar()
                 self.last_token_type = token.type
@@ -238,22 +244,21 @@ class Lexical:
 
             if self.current_char in self.operators:
                 token = Tokens('OPERATOR', self.current_char, self.line)
-                tokens.append(token)
+                yield token
                 self.advanceNextChar()
                 self.last_token_type = token.type
                 continue
 
             if self.current_char in self.symbols:
                 token = Tokens('SYMBOL', self.current_char, self.line)
-                tokens.append(token)
+                yield token
                 self.advanceNextChar()
                 self.last_token_type = token.type
                 continue
 
             error_token = Tokens('ERROR', self.current_char, self.line)
-            tokens.append(error_token)
+            yield error_token
             errors.append(f"Error: Invalid token '{self.current_char}' found at line {self.line}.")
             self.advanceNextChar()
             self.last_token_type = error_token.type
 
-        return tokens, errors
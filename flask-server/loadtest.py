@@ -0,0 +1,327 @@
+"""
+HTTP load test for /analyze.
+
+    python loadtest.py run [--server flask|gunicorn|waitress | --url URL]
+                           [--concurrency N] [--rate R] [--duration S]
+                           [--mix small=6,medium=3,large=1] [--miss-ratio F]
+                           [--env NAME=VALUE ...] [--save PATH]
+    python loadtest.py compare BASELINE CURRENT [--threshold 0.1]
+
+The server is started in its own process on a free local port (the Flask
+development server, or gunicorn or waitress when installed, with --workers
+processes or threads) unless --url points at one already running. --env
+passes settings such as WORKER_POOL_SIZE to it.
+
+Arrivals are either
+    closed  --concurrency clients each send their next request as soon as
+            the previous one is answered (the default)
+    open    requests arrive at --rate per second (Poisson), whether or not
+            earlier ones have been answered, served by up to --concurrency
+            connections; latency counts from the scheduled arrival, so time
+            spent waiting for a free connection is included
+
+Request bodies are corpus.py programs drawn from the --mix of sizes. A
+--miss-ratio share of them get a unique trailing comment so they miss the
+result cache; the rest repeat a small set of programs and mostly hit it.
+Requests sent during --warmup seconds are left out of the report.
+
+The report gives throughput, error rates by status and p50/p95/p99 latency,
+overall and per size. `compare` exits with status 1 if p50, p95 or p99 grew,
+or throughput fell, by more than the threshold.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from corpus import generate_sized
+
+SIZES = {"small": 2000, "medium": 20000, "large": 100000}
+VARIANTS = 8  # distinct programs per size for cache-hitting requests
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(kind, port, workers, env):
+    here = os.path.dirname(os.path.abspath(__file__))
+    address = f"127.0.0.1:{port}"
+    if kind == "flask":
+        command = [sys.executable, "-m", "flask", "--app", "server", "run", "--port", str(port), "--no-reload", "--no-debugger"]
+    elif kind == "gunicorn":
+        command = [sys.executable, "-m", "gunicorn", "--workers", str(workers), "--bind", address, "server:app"]
+    else:
+        command = [sys.executable, "-m", "waitress", f"--listen={address}", f"--threads={workers}", "server:app"]
+    process = subprocess.Popen(command, cwd=here, env={**os.environ, **env},
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{kind} server exited: {process.stderr.read().decode(errors='replace')[-2000:]}")
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/metrics')
+            if connection.getresponse().status == 200:
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{kind} server did not answer on port {port}")
+
+
+class Workload:
+    def __init__(self, mix, miss_ratio, seed=0):
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.names = list(mix)
+        self.weights = [mix[name] for name in self.names]
+        self.miss_ratio = miss_ratio
+        self.sources = {name: [generate_sized(SIZES[name], seed=seed * 1000 + i) for i in range(VARIANTS)]
+                        for name in self.names}
+        self.counter = 0
+
+    def next(self):
+        # (size name, request body)
+        with self.lock:
+            name = self.rng.choices(self.names, self.weights)[0]
+            source = self.rng.choice(self.sources[name])
+            if self.rng.random() < self.miss_ratio:
+                self.counter += 1
+                source += f"// request {self.counter}\n"
+        return name, json.dumps({"code": source}).encode()
+
+
+class Client:
+    # One keep-alive connection; http.client reopens it if the server closed it
+    def __init__(self, url, timeout):
+        parts = urlsplit(url)
+        self.connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=timeout)
+        self.path = parts.path.rstrip('/') + '/analyze'
+
+    def post(self, body):
+        try:
+            self.connection.request('POST', self.path, body, {"Content-Type": "application/json"})
+            response = self.connection.getresponse()
+            response.read()
+            return str(response.status)
+        except (OSError, http.client.HTTPException) as e:
+            self.connection.close()
+            return type(e).__name__
+
+
+def closed_loop(url, workload, concurrency, duration, timeout):
+    results = []
+    stop = time.perf_counter() + duration
+
+    def client():
+        connection = Client(url, timeout)
+        while time.perf_counter() < stop:
+            name, body = workload.next()
+            start = time.perf_counter()
+            status = connection.post(body)
+            results.append((start, time.perf_counter() - start, name, status))
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def open_loop(url, workload, concurrency, rate, duration, timeout):
+    results = []
+    local = threading.local()
+    rng = random.Random(1)
+
+    def send(scheduled, name, body):
+        if not hasattr(local, 'client'):
+            local.client = Client(url, timeout)
+        status = local.client.post(body)
+        results.append((scheduled, time.perf_counter() - scheduled, name, status))
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        start = time.perf_counter()
+        scheduled = start
+        while scheduled < start + duration:
+            scheduled += rng.expovariate(rate)
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, scheduled, *workload.next())
+    return results
+
+
+def percentile(sorted_values, fraction):
+    # Nearest rank
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, int(fraction * len(sorted_values) + 0.5) - 1))]
+
+
+def summarize(results, elapsed):
+    latencies = sorted(latency for _, latency, _, status in results if status == '200')
+    statuses = {}
+    for _, _, _, status in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    errors = len(results) - statuses.get('200', 0)
+    return {
+        "requests": len(results),
+        "throughput": statuses.get('200', 0) / elapsed if elapsed else 0.0,
+        "errorRate": errors / len(results) if results else 0.0,
+        "statuses": statuses,
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "max": latencies[-1] if latencies else 0.0,
+    }
+
+
+def run(args):
+    mix = {}
+    for part in args.mix.split(','):
+        name, _, weight = part.partition('=')
+        if name not in SIZES:
+            raise SystemExit(f"unknown size {name!r}, expected one of {list(SIZES)}")
+        mix[name] = float(weight or 1)
+    env = dict(item.split('=', 1) for item in args.env)
+
+    workload = Workload(mix, args.miss_ratio)
+    process = None
+    url = args.url
+    if url is None:
+        port = free_port()
+        process = start_server(args.server, port, args.workers, env)
+        url = f"http://127.0.0.1:{port}"
+    try:
+        total = args.warmup + args.duration
+        began = time.perf_counter()
+        if args.rate:
+            results = open_loop(url, workload, args.concurrency, args.rate, total, args.timeout)
+        else:
+            results = closed_loop(url, workload, args.concurrency, total, args.timeout)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(10)
+
+    measured_from = began + args.warmup
+    results = [r for r in results if r[0] >= measured_from]
+    ended = max((start + latency for start, latency, _, _ in results), default=measured_from)
+    elapsed = ended - measured_from
+    return {
+        "meta": {
+            "server": "external" if args.url else args.server,
+            "workers": args.workers,
+            "env": env,
+            "arrivals": f"open {args.rate}/s" if args.rate else "closed",
+            "concurrency": args.concurrency,
+            "mix": mix,
+            "missRatio": args.miss_ratio,
+            "duration": args.duration,
+            "created": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        "overall": summarize(results, elapsed),
+        "bySize": {name: summarize([r for r in results if r[2] == name], elapsed) for name in mix},
+    }
+
+
+def report(data):
+    meta = data["meta"]
+    print(f"{meta['server']} server, {meta['arrivals']} arrivals, concurrency {meta['concurrency']}, "
+          f"miss ratio {meta['missRatio']:g}")
+    print(f"{'size':<10} {'requests':>9} {'req/s':>8} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name, summary in [("all", data["overall"])] + list(data["bySize"].items()):
+        print(f"{name:<10} {summary['requests']:>9} {summary['throughput']:>8.1f} {summary['errorRate']:>7.1%} "
+              f"{summary['p50'] * 1000:>8.1f} {summary['p95'] * 1000:>8.1f} {summary['p99'] * 1000:>8.1f} "
+              f"{summary['max'] * 1000:>8.1f}")
+    statuses = data["overall"]["statuses"]
+    if set(statuses) - {'200'}:
+        print("responses: " + ', '.join(f"{status}: {count}" for status, count in sorted(statuses.items())))
+
+
+def compare(baseline, current, threshold):
+    # Returns the list of regressions, printing every comparison
+    regressions = []
+    print(f"{'size':<10} {'measure':<11} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name in ["all"] + list(baseline["bySize"]):
+        base = baseline["overall"] if name == "all" else baseline["bySize"][name]
+        now = current["overall"] if name == "all" else current["bySize"].get(name)
+        if now is None:
+            continue
+        for key in ("p50", "p95", "p99", "throughput", "errorRate"):
+            old, new = base[key], now[key]
+            if key == "errorRate":
+                change = new - old
+                flag = change > 0.01
+            else:
+                change = new / old - 1 if old else 0.0
+                flag = change < -threshold if key == "throughput" else change > threshold
+            print(f"{name:<10} {key:<11} {old:>10.4f} {new:>10.4f} {change:>+8.1%}{'  REGRESSION' if flag else ''}")
+            if flag:
+                regressions.append(f"{name}/{key}: {change:+.1%}")
+    for key in ("server", "workers", "arrivals", "concurrency", "mix", "missRatio"):
+        if baseline["meta"].get(key) != current["meta"].get(key):
+            print(f"note: baseline {key} {baseline['meta'].get(key)!r} differs from {current['meta'].get(key)!r}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the analysis server.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_parser = sub.add_parser("run")
+    run_parser.add_argument("--server", choices=("flask", "gunicorn", "waitress"), default="flask")
+    run_parser.add_argument("--url", help="test a server that is already running instead of starting one")
+    run_parser.add_argument("--workers", type=int, default=4, help="gunicorn processes or waitress threads")
+    run_parser.add_argument("--env", nargs="*", default=[], metavar="NAME=VALUE", help="server environment settings")
+    run_parser.add_argument("--concurrency", type=int, default=8, help="clients, or connections for open arrivals")
+    run_parser.add_argument("--rate", type=float, help="open-loop arrivals per second (default: closed loop)")
+    run_parser.add_argument("--duration", type=float, default=20.0, help="measured seconds")
+    run_parser.add_argument("--warmup", type=float, default=3.0, help="seconds left out of the report")
+    run_parser.add_argument("--mix", default="small=6,medium=3,large=1", help="weights of the corpus sizes")
+    run_parser.add_argument("--miss-ratio", type=float, default=1.0, help="share of requests that miss the cache")
+    run_parser.add_argument("--timeout", type=float, default=60.0, help="seconds before a request counts as failed")
+    run_parser.add_argument("--save", help="write the results as JSON")
+    compare_parser = sub.add_parser("compare")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.10, help="allowed change, 0.10 = 10%%")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        try:
+            data = run(args)
+        except RuntimeError as e:
+            raise SystemExit(f"error: {e}")
+        report(data)
+        if args.save:
+            with open(args.save, 'w') as f:
+                json.dump(data, f, indent=2)
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    regressions = compare(baseline, current, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
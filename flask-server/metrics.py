@@ -0,0 +1,187 @@
+"""
+Counters and histograms for the analysis server, rendered in the Prometheus
+text exposition format by GET /metrics.
+
+Recording is a dict lookup, a bisect and a few additions under a lock, so
+it stays on in production. Every request records:
+
+    analysis_phase_seconds{phase}      lex, parse, semantic and serialize latency
+    analysis_input_bytes               size of the submitted source
+    analysis_tokens, analysis_ast_nodes  tokens lexed / nodes parsed per analysis
+    analysis_lex_tokens_per_second     lexer throughput per analysis
+    analysis_errors_total{kind}        lexical, parser and semantic errors reported
+    http_requests_total{endpoint,method,status}
+    http_request_duration_seconds{endpoint}
+
+Phases served from the cache are not timed or counted, only the ones that
+ran (in this process or in a worker, which sends its stats back with the
+result). Aggregate throughput is rate(analysis_tokens_sum) /
+rate(analysis_phase_seconds_sum{phase="lex"}).
+"""
+
+import bisect
+import threading
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+COUNT_BUCKETS = (10, 100, 1000, 10000, 100000, 1000000)
+THROUGHPUT_BUCKETS = (1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6)
+
+# Pipeline phase -> phase label
+PHASE_LABELS = {'tokens': 'lex', 'ast': 'parse', 'diagnostics': 'semantic'}
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, labels=()):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        for values, value in items:
+            yield self.name + _format_labels(self.labels, values), value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, buckets, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.series = {}  # label values -> [bucket counts..., sum]
+        self.lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self):
+        with self.lock:
+            items = sorted((values, list(series)) for values, series in self.series.items())
+        for values, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                yield self.name + '_bucket' + _format_labels(self.labels, values, ('le', _format_value(bound))), cumulative
+            yield self.name + '_sum' + _format_labels(self.labels, values), series[-1]
+            yield self.name + '_count' + _format_labels(self.labels, values), cumulative
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def counter(self, name, help, labels=()):
+        metric = Counter(name, help, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, buckets, labels=()):
+        metric = Histogram(name, help, buckets, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect):
+        # collect() returns [(name, help, kind, [(labels dict, value), ...]), ...], read at scrape time
+        self.collectors.append(collect)
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, value in metric.samples():
+                lines.append(f'{name} {_format_value(value)}')
+        for collect in self.collectors:
+            for name, help, kind, samples in collect():
+                lines.append(f'# HELP {name} {help}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    lines.append(name + _format_labels(tuple(labels), tuple(labels.values())) + ' ' + _format_value(value))
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+phase_seconds = REGISTRY.histogram(
+    'analysis_phase_seconds', 'Time spent in each analysis phase.', LATENCY_BUCKETS, ('phase',))
+input_bytes = REGISTRY.histogram(
+    'analysis_input_bytes', 'Size of the analyzed source in bytes.', SIZE_BUCKETS)
+tokens = REGISTRY.histogram(
+    'analysis_tokens', 'Tokens produced per lexer run.', COUNT_BUCKETS)
+ast_nodes = REGISTRY.histogram(
+    'analysis_ast_nodes', 'AST nodes built per parser run.', COUNT_BUCKETS)
+lex_throughput = REGISTRY.histogram(
+    'analysis_lex_tokens_per_second', 'Lexer throughput per run.', THROUGHPUT_BUCKETS)
+errors = REGISTRY.counter(
+    'analysis_errors_total', 'Errors reported by analyses, by kind.', ('kind',))
+requests = REGISTRY.counter(
+    'http_requests_total', 'HTTP requests handled.', ('endpoint', 'method', 'status'))
+request_seconds = REGISTRY.histogram(
+    'http_request_duration_seconds', 'Time to produce a response (headers, for streamed bodies).',
+    LATENCY_BUCKETS, ('endpoint',))
+
+
+def observe_analysis(stats, result, source_bytes):
+    # stats as filled in by pipeline.analyze_source / WorkerPool.analyze
+    input_bytes.observe(source_bytes)
+    seconds = stats.get("seconds", {})
+    for phase, duration in seconds.items():
+        phase_seconds.observe(duration, (PHASE_LABELS[phase],))
+    if "tokens" in stats:
+        tokens.observe(stats["tokens"])
+        if seconds.get('tokens'):
+            lex_throughput.observe(stats["tokens"] / seconds['tokens'])
+    if "nodes" in stats:
+        ast_nodes.observe(stats["nodes"])
+    for kind, found in (("lexical", result.lexical_errors), ("parser", result.parser_errors),
+                        ("semantic", result.semantic_errors)):
+        if found:
+            errors.inc(len(found), (kind,))
+
+
+def observe_serialization(duration):
+    phase_seconds.observe(duration, ('serialize',))
+
+
+def observe_request(endpoint, method, status, duration):
+    requests.inc(1, (endpoint, method, str(status)))
+    request_seconds.observe(duration, (endpoint,))
+
+
+def render():
+    return REGISTRY.render()
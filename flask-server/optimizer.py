@@ -0,0 +1,257 @@
+"""
+Constant folding and algebraic simplification over the parser's AST.
+
+optimize() returns a simplified copy of a tree (the top-level statement
+list from Parser.parse, a Program or any single node) together with
+counts of what changed; the tree passed in is never modified, and
+unchanged subtrees are shared with it.
+
+- Integer and floating-point constant expressions are folded with C
+  semantics: usual arithmetic conversions, division and % truncating
+  toward zero, comparisons and logical operators giving 0 or 1. Nothing
+  is folded that C leaves undefined or that would not be exact: division
+  or % by zero, % on floats, signed overflow (int range for int operands,
+  long long when an operand is already wider) and non-finite results.
+  Folded floats are written in positional notation, never with an
+  exponent, as that is the only form the lexer reads.
+- `0 && x` and `1 || x` are folded, since C never evaluates x there.
+- Identities with an integer 0 or 1 are applied: x + 0, 0 + x, x - 0,
+  x * 1, 1 * x, x / 1 and -(-x) become x. Identities that would drop x
+  (x * 0) or change a floating-point result are not.
+- if statements with a constant condition are replaced by the branch
+  taken; while loops whose condition is constantly false are removed.
+
+Character constants are left alone, as are literals the lexer passes
+through that are not valid C numbers (such as 09).
+"""
+
+import copy
+import decimal
+import math
+import operator
+
+from ast_nodes import *
+
+INT_RANGE = (-2 ** 31, 2 ** 31 - 1)
+LONG_RANGE = (-2 ** 63, 2 ** 63 - 1)
+
+COMPARISONS = {
+    '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+    '==': operator.eq, '!=': operator.ne,
+}
+ARITHMETIC = {'+': operator.add, '-': operator.sub, '*': operator.mul}
+
+
+def constant_value(node):
+    # Python int or float for a numeric literal, None for anything else
+    if not isinstance(node, Number) or not isinstance(node.value, str):
+        return None
+    text = node.value.lstrip('-')
+    try:
+        if '.' in text:
+            value = float(text)
+        elif len(text) > 1 and text[0] == '0':
+            value = int(text, 8)  # C octal
+        else:
+            value = int(text)
+    except ValueError:
+        return None
+    return -value if node.value.startswith('-') else value
+
+
+def _in_range(value, *operands):
+    low, high = INT_RANGE if all(INT_RANGE[0] <= o <= INT_RANGE[1] for o in operands) else LONG_RANGE
+    return low <= value <= high
+
+
+def fold_binary(op, a, b):
+    # The value of `a op b` for constants a and b, or None if it must not be folded
+    if op == '&&':
+        return int(bool(a) and bool(b))
+    if op == '||':
+        return int(bool(a) or bool(b))
+    if op in COMPARISONS:
+        return int(COMPARISONS[op](a, b))
+    floating = isinstance(a, float) or isinstance(b, float)
+    if op in ('/', '%'):
+        if b == 0 or (op == '%' and floating):
+            return None
+        if floating:
+            value = a / b
+        else:
+            quotient = abs(a) // abs(b)
+            if (a < 0) != (b < 0):
+                quotient = -quotient
+            value = quotient if op == '/' else a - b * quotient
+    elif op in ARITHMETIC:
+        value = ARITHMETIC[op](a, b)
+    else:
+        return None
+    if floating:
+        return value if math.isfinite(value) else None
+    return value if _in_range(value, a, b) else None
+
+
+def fold_unary(op, a):
+    if op == '-':
+        value = -a
+    elif op == '+':
+        value = a
+    elif op == '!':
+        return int(not a)
+    elif op == '~' and not isinstance(a, float):
+        value = ~a
+    else:
+        return None
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    return value if _in_range(value, a) else None
+
+
+def _float_text(value):
+    # Positional digits with a decimal point (1e+23 as 100000000000000000000000.0), the only
+    # float form the lexer and constant_value read; the shortest repr's digits round-trip
+    text = format(decimal.Decimal(repr(value)), 'f')
+    return text if '.' in text else text + '.0'
+
+
+def _number(value, like):
+    node = Number(_float_text(value) if isinstance(value, float) else str(value))
+    node.line = like.line
+    return node
+
+
+def constant_branch_message(node, condition):
+    # Warning for an if or while statement whose condition is the constant `condition`
+    if isinstance(node, WhileStatement):
+        return f"Condition at line {node.line} is always false; the loop body never runs."
+    dead = node.else_branch if condition else node.then_branch
+    return (f"Condition at line {node.line} is always {'true' if condition else 'false'}; "
+            f"the branch at line {dead.line} never runs.")
+
+
+def count_nodes(tree):
+    count = 0
+    stack = [tree]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, list):
+            stack.extend(item)
+        elif isinstance(item, ASTNode):
+            count += 1
+            stack.extend(getattr(item, field, None) for field in item._fields)
+    return count
+
+
+class Optimizer:
+    def __init__(self, warnings=None):
+        self.warnings = warnings
+        self.folded = 0      # constant expressions replaced by their value
+        self.simplified = 0  # algebraic identities applied
+        self.branches = 0    # if/while statements with a constant condition resolved
+
+    def visit(self, node):
+        # Returns the simplified node, the same object if nothing changed, or None for a removed statement
+        if isinstance(node, list):
+            items = [self.visit(item) for item in node]
+            kept = [new for old, new in zip(node, items) if new is not None or old is None]
+            if len(kept) == len(node) and all(new is old for old, new in zip(node, kept)):
+                return node
+            return kept
+        if not isinstance(node, ASTNode):
+            return node
+
+        changes = {}
+        for field in node._fields:
+            old = getattr(node, field, None)
+            new = self.visit(old)
+            if new is None and old is not None and field != 'else_branch':
+                # A statement slot that must stay filled, e.g. the body of a while
+                new = Block([])
+                new.line = old.line
+            if new is not old:
+                changes[field] = new
+        if changes:
+            node = copy.copy(node)
+            for field, value in changes.items():
+                setattr(node, field, value)
+
+        if isinstance(node, BinaryOperation):
+            return self.visit_binary(node)
+        if isinstance(node, UnaryOperation):
+            return self.visit_unary(node)
+        if isinstance(node, IfStatement):
+            condition = constant_value(node.condition)
+            if condition is not None:
+                self.branches += 1
+                if self.warnings is not None and (node.else_branch is not None or not condition):
+                    self.warnings.append(constant_branch_message(node, condition))
+                return node.then_branch if condition else node.else_branch
+        if isinstance(node, WhileStatement):
+            if constant_value(node.condition) == 0:
+                self.branches += 1
+                if self.warnings is not None:
+                    self.warnings.append(constant_branch_message(node, 0))
+                return None
+        return node
+
+    def visit_binary(self, node):
+        op = node.operator
+        left, right = constant_value(node.left), constant_value(node.right)
+        if left is not None and right is not None:
+            value = fold_binary(op, left, right)
+            if value is not None:
+                self.folded += 1
+                return _number(value, node)
+            return node
+        if left is not None and ((op == '&&' and not left) or (op == '||' and left)):
+            # The right operand is never evaluated
+            self.folded += 1
+            return _number(int(op == '||'), node)
+
+        # Identities, only with integer constants so the other operand's type is unchanged
+        # (a char operand would be promoted to int, so it is kept)
+        if type(right) is int and not isinstance(node.left, CharNode) and ((right == 0 and op in ('+', '-')) or (right == 1 and op in ('*', '/'))):
+            self.simplified += 1
+            return node.left
+        if type(left) is int and not isinstance(node.right, CharNode) and ((left == 0 and op == '+') or (left == 1 and op == '*')):
+            self.simplified += 1
+            return node.right
+        return node
+
+    def visit_unary(self, node):
+        if node.postfix:
+            return node
+        value = constant_value(node.operand)
+        if value is not None:
+            folded = fold_unary(node.operator, value)
+            if folded is not None:
+                self.folded += 1
+                return _number(folded, node)
+            return node
+        inner = node.operand
+        if (node.operator == '-' and isinstance(inner, UnaryOperation) and inner.operator == '-'
+                and not inner.postfix):
+            self.simplified += 1
+            return inner.operand
+        return node
+
+    def stats(self):
+        return {"folded": self.folded, "simplified": self.simplified, "branches": self.branches}
+
+
+def optimize(tree, warnings=None):
+    """
+    Return (optimized tree, stats). stats counts folded constants,
+    simplified identities, resolved branches and the nodes removed. A
+    message for each branch that can never run is appended to `warnings`
+    when it is a list.
+    """
+    optimizer = Optimizer(warnings)
+    result = optimizer.visit(tree)
+    if result is None:
+        result = [] if isinstance(tree, list) else Block([])
+    stats = optimizer.stats()
+    before, after = count_nodes(tree), count_nodes(result)
+    stats.update(nodesBefore=before, nodesAfter=after, removedNodes=before - after)
+    return result, stats
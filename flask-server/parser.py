@@ -9,6 +9,7 @@ class Parser:
         self.pos = 0
         self.current_token = self.tokens[self.pos] if self.tokens else None
         self.errors = []
+        self.node_count = 0  # nodes built so far, every node goes through located()
         
     # Token Navigation
     def advance(self):
@@ -56,6 +57,14 @@ class Parser:
             return
         self.advance()
     
+    def located(self, node, source):
+        # Record the source line of a node, taken from its first token or leading child node
+        self.node_count += 1
+        line = getattr(source, 'line', None)
+        if line is not None:
+            node.line = line
+        return node
+
     def report_error(self, message):
         self.errors.append(message)
         print(f"[Parser Error] {message}")
@@ -76,7 +85,10 @@ class Parser:
 
     # Parse the entire program
     def parse(self):
-        statements = []
+        return list(self.iter_parse())
+
+    # Yields top-level statements one at a time as they are parsed
+    def iter_parse(self):
         while self.current_token and self.current_token.type != 'EOF':
             try:
                 if self.current_token.type == 'KEYWORD' and self.current_token.value in ('int', 'float', 'char', 'void'):
@@ -85,11 +97,11 @@ class Parser:
                     node = self.parse_statement()
                     if node is None:
                         raise SyntaxError(f"Unexpected token {self.current_token.type}('{self.current_token.value}') on line {self.current_token.line}")
-                statements.append(node)
             except SyntaxError as e:
                 self.report_error(str(e))
                 self.synchronize()
-        return statements
+                continue
+            yield node
 
     # Parsing Declarations and Functions
     def parse_declaration_or_function(self):
@@ -136,7 +148,7 @@ class Parser:
             body = self.parse_compound_statement()
             if not body:
                 self.report_error(f"Invalid function body for '{name}'.")
-            return FunctionDeclaration(var_type, name, parameters, body)
+            return self.located(FunctionDeclaration(var_type, name, parameters, body), var_type_token)
 
         else:
             initializer = None
@@ -146,12 +158,13 @@ class Parser:
                 self.report_error(f"Expected ';' after variable declaration '{name}'.")
                 self.synchronize([';', '}'])
                 return None
-            return VariableDeclaration(var_type, name, initializer)
+            return self.located(VariableDeclaration(var_type, name, initializer), var_type_token)
 
 
 
     # Parsing Compound Statements (Blocks)
     def parse_compound_statement(self):
+        start = self.current_token
         self.expect('SYMBOL', '{')
         statements = []
         # Only peek for '}', do NOT consume it here
@@ -159,10 +172,11 @@ class Parser:
             stmt = self.parse_statement()
             statements.append(stmt)
         self.expect('SYMBOL', '}')  # Consume the closing '}'
-        return Block(statements)
+        return self.located(Block(statements), start)
 
     # Parsing Statements
     def parse_statement(self):
+        start = self.current_token
         try:
             if self.current_token.value == 'if':
                 return self.parse_if_statement()
@@ -175,11 +189,11 @@ class Parser:
             elif self.current_token.value == 'break':
                 self.eat('KEYWORD', 'break')
                 self.expect('SYMBOL', ';')
-                return BreakStatement()
+                return self.located(BreakStatement(), start)
             elif self.current_token.value == 'continue':
                 self.eat('KEYWORD', 'continue')
                 self.expect('SYMBOL', ';')
-                return ContinueStatement()
+                return self.located(ContinueStatement(), start)
             elif self.current_token.value == 'return':
                 return self.parse_return_statement()
             elif self.current_token.value in ('int', 'char', 'float', 'double', 'void'):
@@ -189,13 +203,14 @@ class Parser:
             else:
                 expr = self.parse_expression()
                 self.expect('SYMBOL', ';')
-                return ExpressionStatement(expr)
+                return self.located(ExpressionStatement(expr), start)
         except SyntaxError as e:
             self.report_error(str(e))
             self.synchronize()
             return None
 
     def parse_declaration(self):
+        start = self.current_token
         var_type = self.current_token.value
         self.eat('KEYWORD')
         var_name = self.current_token.value
@@ -208,7 +223,7 @@ class Parser:
 
         self.expect('SYMBOL',';')
         
-        return VariableDeclaration(var_type, var_name, initializer)
+        return self.located(VariableDeclaration(var_type, var_name, initializer), start)
 
     # Parsing Expressions
     def parse_expression(self):
@@ -226,15 +241,16 @@ class Parser:
             if not isinstance(left, VariableNode):
                 raise SyntaxError(f"Invalid left-hand side in assignment at line {self.current_token.line}")
 
-            return AssignmentExpression(op, left, right)
+            return self.located(AssignmentExpression(op, left, right), left)
         return left
     
     def parse_unary(self):
         if self.current_token.type == 'OPERATOR' and self.current_token.value in ('+', '-', '!', '~', '++', '--'):
-            op = self.current_token.value
+            op_token = self.current_token
+            op = op_token.value
             self.eat('OPERATOR')
             operand = self.parse_unary()
-            return UnaryOperation(op, operand)
+            return self.located(UnaryOperation(op, operand), op_token)
         return self.parse_postfix()
 
     def parse_binary_op(self, min_prec=0):
@@ -249,7 +265,7 @@ class Parser:
             self.eat('OPERATOR')
 
             right = self.parse_binary_op(prec + 1)
-            left = BinaryOperation(op, left, right)
+            left = self.located(BinaryOperation(op, left, right), left)
 
         return left
 
@@ -263,13 +279,13 @@ class Parser:
         try:
             if token.type == 'NUMBER':
                 self.eat('NUMBER')
-                return Number(token.value)
+                return self.located(Number(token.value), token)
             elif token.type == 'STRING':
                 self.eat('STRING')
-                return StringNode(token.value)
+                return self.located(StringNode(token.value), token)
             elif token.type == 'CHAR_LITERAL':
                 self.eat('CHAR_LITERAL')
-                return CharNode(token.value)
+                return self.located(CharNode(token.value), token)
             elif token.type == 'IDENTIFIER':
                 name = token.value
                 self.eat('IDENTIFIER')
@@ -284,9 +300,9 @@ class Parser:
                             else:
                                 break
                     self.expect('SYMBOL', ')')
-                    return FunctionCallNode(name, args)
+                    return self.located(FunctionCallNode(name, args), token)
                 else:
-                    return VariableNode(name)
+                    return self.located(VariableNode(name), token)
             elif token.value == '(':
                 self.eat('SYMBOL', '(')
                 expr = self.parse_expression()
@@ -307,7 +323,7 @@ class Parser:
         while self.current_token and self.current_token.type == 'OPERATOR' and self.current_token.value in ('++', '--'):
             op = self.current_token.value
             self.eat('OPERATOR')
-            expr = UnaryOperation(op, expr, postfix=True)  # Define postfix=True for your AST node
+            expr = self.located(UnaryOperation(op, expr, postfix=True), expr)  # Define postfix=True for your AST node
         return expr
 
     def get_precedence(self, op):
@@ -326,6 +342,7 @@ class Parser:
     # Control structures
 
     def parse_if_statement(self):
+        start = self.current_token
         try:
             self.eat('KEYWORD', 'if')
             self.expect('SYMBOL', '(')
@@ -336,21 +353,23 @@ class Parser:
             if self.current_token and self.current_token.value == 'else':
                 self.eat('KEYWORD', 'else')
                 else_branch = self.parse_statement()
-            return IfStatement(condition, then_branch, else_branch)
+            return self.located(IfStatement(condition, then_branch, else_branch), start)
         except SyntaxError as e:
             self.report_error(str(e))
             self.synchronize()
             return None
 
     def parse_while_statement(self):
+        start = self.current_token
         self.expect('KEYWORD', 'while')
         self.expect('SYMBOL', '(')
         condition = self.parse_expression()
         self.expect('SYMBOL', ')')
         body = self.parse_statement()
-        return WhileStatement(condition, body)
+        return self.located(WhileStatement(condition, body), start)
 
     def parse_for_statement(self):
+        start = self.current_token
         self.expect('KEYWORD', 'for')
         self.expect('SYMBOL', '(')
 
@@ -360,7 +379,7 @@ class Parser:
         elif self.current_token.value != ';':
             init_expr = self.parse_expression()
             self.expect('SYMBOL', ';')
-            init = ExpressionStatement(init_expr)
+            init = self.located(ExpressionStatement(init_expr), init_expr)
         else:
             init = None
             self.expect('SYMBOL', ';')
@@ -383,10 +402,11 @@ class Parser:
 
         body = self.parse_statement()
 
-        return ForStatement(init, condition, increment, body)
+        return self.located(ForStatement(init, condition, increment, body), start)
 
 
     def parse_return_statement(self):
+        start = self.current_token
         try:
             self.eat('KEYWORD', 'return')
             if self.current_token.value != ';':
@@ -394,13 +414,14 @@ class Parser:
             else:
                 expr = None
             self.expect('SYMBOL', ';')
-            return ReturnStatement(expr)
+            return self.located(ReturnStatement(expr), start)
         except SyntaxError as e:
             self.report_error(str(e))
             self.synchronize()
             return None
 
     def parse_switch_statement(self):
+        start = self.current_token
         try:
             self.expect('KEYWORD', 'switch')
             self.expect('SYMBOL', '(')
@@ -417,6 +438,7 @@ class Parser:
 
         while self.current_token and self.current_token.value != '}':
             try:
+                label = self.current_token
                 if self.match('KEYWORD', 'case'):
                     value = self.parse_expression()
                     self.expect('SYMBOL', ':')
@@ -431,8 +453,8 @@ class Parser:
                             self.errors.append(str(e))
                             self.synchronize(['case', 'default', '}'])
 
-                    case_block = Block(case_statements)
-                    cases.append(SwitchCase(value, case_block))
+                    case_block = self.located(Block(case_statements), label)
+                    cases.append(self.located(SwitchCase(value, case_block), label))
 
                 elif self.match('KEYWORD', 'default'):
                     self.expect('SYMBOL', ':')
@@ -447,7 +469,7 @@ class Parser:
                             self.errors.append(str(e))
                             self.synchronize(['case', 'default', '}'])
 
-                    default_case = SwitchCase(None, Block(default_statements))
+                    default_case = self.located(SwitchCase(None, self.located(Block(default_statements), label)), label)
 
                 else:
                     raise SyntaxError(f"Unexpected token {self.current_token.value} in switch block")
@@ -462,6 +484,6 @@ class Parser:
             self.errors.append(str(e))
             self.synchronize([';'])  # Assume switch is terminated and continue
 
-        return SwitchStatement(expr, cases, default_case)
+        return self.located(SwitchStatement(expr, cases, default_case), start)
 
 ## Example usage
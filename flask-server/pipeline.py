@@ -0,0 +1,175 @@
+"""
+The analysis pipeline behind /analyze: Lexical -> Parser -> SemanticAnalyzer.
+
+Each phase can be served from a result cache (see cache.py), and callers
+can wrap the phases that actually run with `around_phase`, a callable that
+takes the phase name ('tokens', 'ast' or 'diagnostics') and returns a
+context manager (used for time budgets, metrics and profiling). Results are
+keyed by source_key(), a hash of the source text and ANALYZER_VERSION, so
+bump the version whenever a change to the lexer, parser or semantic
+analyzer changes what they produce.
+
+`stats`, when given, is a dict filled with what the phases that ran cost
+and produced: {"seconds": {phase: duration}, "tokens": n, "nodes": n}. It
+is cheap enough to collect on every request (see metrics.py).
+"""
+
+import hashlib
+import time
+
+from ast_utils import expression_to_str
+from lexical import Lexical
+from parser import Parser
+from semantic import SemanticAnalyzer
+
+ANALYZER_VERSION = "5"
+
+PHASES = ('tokens', 'ast', 'diagnostics')
+
+# Response sections and the phase that produces each of them
+SECTION_PHASES = {
+    "tokens": 'tokens',
+    "lexicalErrors": 'tokens',
+    "parserErrors": 'ast',
+    "astString": 'ast',
+    "semanticOutput": 'diagnostics',
+}
+SECTIONS = tuple(SECTION_PHASES)
+
+
+def source_key(source):
+    digest = hashlib.sha256()
+    digest.update(ANALYZER_VERSION.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(source.encode('utf-8', 'surrogatepass'))
+    return digest.hexdigest()
+
+
+class AnalysisResult:
+    def __init__(self, tokens, lexical_errors, ast, parser_errors, semantic_errors):
+        self.tokens = tokens
+        self.lexical_errors = lexical_errors
+        self.ast = ast
+        self.parser_errors = parser_errors
+        self.semantic_errors = semantic_errors
+
+    def tokens_list(self):
+        # Convert token objects to dicts for JSON serialization
+        return [{
+            "type": token.type,
+            "value": token.value,
+            "line": token.line
+        } for token in self.tokens]
+
+    def tokens_columnar(self):
+        # Parallel arrays plus a dictionary of token types; much smaller than one dict per token
+        type_names = []
+        type_ids = {}
+        types = []
+        for token in self.tokens:
+            type_id = type_ids.get(token.type)
+            if type_id is None:
+                type_id = type_ids[token.type] = len(type_names)
+                type_names.append(token.type)
+            types.append(type_id)
+        return {
+            "typeNames": type_names,
+            "types": types,
+            "values": [token.value for token in self.tokens],
+            "lines": [token.line for token in self.tokens],
+        }
+
+    def to_dict(self, sections=SECTIONS, token_encoding="rows"):
+        # The /analyze response body, limited to the requested sections
+        result = {}
+        if "tokens" in sections:
+            result["tokens"] = self.tokens_columnar() if token_encoding == "columnar" else self.tokens_list()
+        if "lexicalErrors" in sections:
+            result["lexicalErrors"] = self.lexical_errors
+        if "parserErrors" in sections:
+            result["parserErrors"] = self.parser_errors
+        if "astString" in sections:
+            result["astString"] = expression_to_str(self.ast) if self.ast else ""
+        if "semanticOutput" in sections:
+            result["semanticOutput"] = self.semantic_errors
+        return result
+
+
+def lex(source):
+    lexer = Lexical(source)
+    return lexer.get_tokens()
+
+
+def parse(tokens):
+    parser = Parser(tokens)
+    ast = parser.parse()
+    return ast, parser.errors
+
+
+def check(ast):
+    if not ast:
+        return []
+    analyzer = SemanticAnalyzer()
+    analyzer.analyze(ast)
+    return analyzer.errors
+
+
+def phases_for(sections):
+    return tuple(phase for phase in PHASES if any(SECTION_PHASES[s] == phase for s in sections))
+
+
+def _compute(phase, source, values, stats):
+    if phase == 'tokens':
+        value = lex(source)
+        if stats is not None:
+            stats["tokens"] = len(value[0])
+        return value
+    if phase == 'ast':
+        parser = Parser(values['tokens'][0])
+        ast = parser.parse()
+        if stats is not None:
+            stats["nodes"] = parser.node_count
+        return ast, parser.errors
+    return check(values['ast'][0])
+
+
+def analyze_source(source, cache=None, around_phase=None, phases=PHASES, stats=None):
+    """
+    Run the phases listed in `phases`, plus whatever earlier phases they need
+    that are not cached. Results of phases that did not run are None.
+    """
+    key = source_key(source) if cache is not None else None
+    values = {}
+    if stats is not None:
+        stats.setdefault("seconds", {})
+
+    def ensure(index):
+        phase = PHASES[index]
+        if phase in values:
+            return
+        if cache is not None:
+            value = cache.get(key, phase)
+            if value is not None:
+                values[phase] = value
+                return
+        # Inputs are resolved first so phases never nest inside each other's around_phase
+        if index:
+            ensure(index - 1)
+        start = time.perf_counter()
+        if around_phase is None:
+            value = _compute(phase, source, values, stats)
+        else:
+            with around_phase(phase):
+                value = _compute(phase, source, values, stats)
+        if stats is not None:
+            stats["seconds"][phase] = time.perf_counter() - start
+        if cache is not None:
+            cache.put(key, phase, value)
+        values[phase] = value
+
+    for phase in phases:
+        ensure(PHASES.index(phase))
+
+    tokens, lexical_errors = values.get('tokens', (None, None))
+    ast, parser_errors = values.get('ast', (None, None))
+    return AnalysisResult(tokens, lexical_errors, ast, parser_errors, values.get('diagnostics'))
@@ -0,0 +1,138 @@
+"""
+Profiling of single analyses, for submissions that are slow in production.
+
+profile_analysis() runs the pipeline on the calling thread, bypassing the
+result cache so that every phase actually runs, with one cProfile profiler
+per phase. It returns the analysis result and a summary:
+
+    {"key": source key, "totalSeconds": ...,
+     "timeline": [{"phase": "Lexer", "start": s, "seconds": s}, ...],
+     "functions": {"Lexer": [{"function", "calls", "primitiveCalls",
+                              "totalSeconds", "cumulativeSeconds"}, ...], ...},
+     "saved": [paths]}
+
+With `directory` set, each phase profile is also dumped there in pstats
+format (open with `python -m pstats FILE` or snakeviz), next to the summary
+as JSON.
+
+The server does not call it directly when it has a worker pool:
+WorkerPool.profile runs it in a worker, under the same admission limit and
+time budgets as any other analysis (`around_phase` nests the budget around
+each profiled phase).
+"""
+
+import cProfile
+import contextlib
+import json
+import os
+import pstats
+import threading
+import time
+
+from pipeline import PHASES, analyze_source, source_key
+
+PHASE_TAGS = {'tokens': 'Lexer', 'ast': 'Parser', 'diagnostics': 'Semantic'}
+
+
+def _top_functions(profile, limit):
+    stats = pstats.Stats(profile)
+    rows = []
+    for (filename, line, name), (primitive, calls, tottime, cumtime, _) in stats.stats.items():
+        rows.append({
+            "function": f"{os.path.basename(filename)}:{line}({name})",
+            "calls": calls,
+            "primitiveCalls": primitive,
+            "totalSeconds": tottime,
+            "cumulativeSeconds": cumtime,
+        })
+    rows.sort(key=lambda row: row["cumulativeSeconds"], reverse=True)
+    return rows[:limit]
+
+
+def profile_analysis(source, phases=PHASES, directory=None, limit=30, around_phase=None, cache=None):
+    # `cache` only receives the phases computed; nothing is looked up, so every phase runs
+    profiles = {}
+    timeline = []
+    origin = time.perf_counter()
+
+    @contextlib.contextmanager
+    def profiled(phase):
+        with around_phase(phase) if around_phase is not None else contextlib.nullcontext():
+            profile = profiles[phase] = cProfile.Profile()
+            start = time.perf_counter()
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+                timeline.append({"phase": PHASE_TAGS[phase], "start": start - origin,
+                                 "seconds": time.perf_counter() - start})
+
+    result = analyze_source(source, cache, around_phase=profiled, phases=phases)
+    key = source_key(source)
+    summary = {
+        "key": key,
+        "totalSeconds": time.perf_counter() - origin,
+        "timeline": timeline,
+        "functions": {PHASE_TAGS[phase]: _top_functions(profile, limit) for phase, profile in profiles.items()},
+        "saved": [],
+    }
+    if directory is not None:
+        summary["saved"] = save_profile(directory, key, profiles, summary)
+    return result, summary
+
+
+def save_profile(directory, key, profiles, summary):
+    os.makedirs(directory, exist_ok=True)
+    stem = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{key[:12]}")
+    paths = []
+    for phase, profile in profiles.items():
+        path = f"{stem}-{PHASE_TAGS[phase].lower()}.prof"
+        profile.dump_stats(path)
+        paths.append(path)
+    paths.append(stem + ".json")
+    with open(stem + ".json", 'w') as f:
+        json.dump(dict(summary, saved=paths), f, indent=2)
+    return paths
+
+
+class SlowRequestProfiler:
+    """
+    Re-runs analyses that took longer than `threshold` seconds under the
+    profiler on a background thread and saves the result in `directory`.
+    One capture runs at a time; slow requests arriving meanwhile are skipped
+    rather than queued, so a burst of slow traffic cannot pile up profiles.
+    `profile` runs a capture (profile_analysis by default; the server passes
+    WorkerPool.profile so that the re-run is budgeted like the original).
+    """
+
+    def __init__(self, directory, threshold, limit=30, profile=profile_analysis):
+        self.directory = directory
+        self.threshold = threshold
+        self.limit = limit
+        self.profile = profile
+        self.busy = threading.Lock()
+        self.lock = threading.Lock()  # counters
+        self.captured = 0
+        self.skipped = 0
+
+    def observe(self, source, phases, seconds):
+        if seconds < self.threshold:
+            return False
+        if not self.busy.acquire(blocking=False):
+            with self.lock:
+                self.skipped += 1
+            return False
+        thread = threading.Thread(target=self._capture, args=(source, phases), daemon=True)
+        thread.start()
+        return True
+
+    def _capture(self, source, phases):
+        try:
+            self.profile(source, phases, directory=self.directory, limit=self.limit)
+            with self.lock:
+                self.captured += 1
+        except Exception as e:
+            print(f"[Profiler] capture failed: {type(e).__name__}: {e}")
+        finally:
+            self.busy.release()
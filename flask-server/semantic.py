@@ -2,32 +2,55 @@
 
 from ast_nodes import *
 from ast_utils import expression_to_str
+from cfg import build as build_cfg
+from dataflow import DECL, Variables, definite_assignment, reaching_definitions, reads
+from ir import IRError, lower
+from lexical import LIBRARY_FUNCTIONS
+
+_UNDECLARED = object()
+# Types between which C converts implicitly (char is promoted to int)
+ARITHMETIC_TYPES = ("char", "int", "short", "long", "long long", "float", "double", "long double")
+
+
+def compatible(target_type, value_type):
+    return target_type == value_type or (target_type in ARITHMETIC_TYPES and value_type in ARITHMETIC_TYPES)
+
 
 class SemanticAnalyzer:
     def __init__(self):
         self.errors = []
         self.symbol_table = {}
         self.struct_definitions = set()
+        self.scopes = [{}]  # per open scope: name -> the entry it shadows, to restore when the scope closes
 
     def analyze(self, node):
         # ... (Your existing analysis logic) ...
-        if isinstance(node, Program):
+        if isinstance(node, list):
+            # Parser.parse returns the top-level statements as a list
+            for stmt in node:
+                self.analyze(stmt)
+
+        elif isinstance(node, Program):
             for stmt in node.statements:
                 self.analyze(stmt)
 
         elif isinstance(node, Block):
+            self.open_scope()
             for stmt in node.statements:
                 self.analyze(stmt)
+            self.close_scope()
 
         elif isinstance(node, VariableDeclaration):
             var_type = node.var_type
             var_name = node.name
             initializer = node.initializer
 
-            if var_name in self.symbol_table:
+            if var_name in self.scopes[-1]:
                 self.errors.append(f"Variable '{var_name}' redeclared.")
                 # No return here, allow further analysis for other potential errors
             else:
+                # A declaration in an inner scope may shadow an outer one
+                self.scopes[-1][var_name] = self.symbol_table.get(var_name, _UNDECLARED)
                 self.symbol_table[var_name] = var_type
 
             if initializer:
@@ -56,21 +79,24 @@ class SemanticAnalyzer:
 
         elif isinstance(node, ForStatement):
             # Ensure init, condition, increment are analyzed
+            self.open_scope()
             if node.init: self.analyze(node.init)
             if node.condition: self.analyze(node.condition)
             if node.increment: self.analyze(node.increment)
             self.analyze(node.body)
+            self.close_scope()
 
         elif isinstance(node, FunctionDeclaration):
-            # Store current symbol table to restore after function scope
-            # This is a simplified approach; a proper scope management would be better
-            old_symbol_table = self.symbol_table.copy()
-            # Add function parameters to symbol table
+            # Record the function first so that calls to it, recursive ones included, resolve
+            self.symbol_table[node.name] = node.return_type
+            # Parameters get a scope of their own, closed after the body
+            self.open_scope()
             for param_type, param_name in node.parameters:
+                self.scopes[-1].setdefault(param_name, self.symbol_table.get(param_name, _UNDECLARED))
                 self.symbol_table[param_name] = param_type # Use param_type for better checking
             self.analyze(node.body)
-            # Restore symbol table after function analysis
-            self.symbol_table = old_symbol_table
+            self.close_scope()
+            self.check_flow(node)
 
         elif isinstance(node, ExpressionStatement):
             self.analyze(node.expression)
@@ -79,23 +105,8 @@ class SemanticAnalyzer:
             # Check if return value matches function's return type (requires function symbol table)
             self.analyze(node.value)
 
-        elif isinstance(node, BinaryOperation):
-            # Check for division by zero
-            if node.operator == '/' and isinstance(node.right, Number) and node.right.value == 0:
-                self.errors.append("Division by zero.")
-            self.analyze(node.left)
-            self.analyze(node.right)
-
-        elif isinstance(node, UnaryOperation):
-            self.analyze(node.operand)
-
-        elif isinstance(node, FunctionCallNode):
-            # Basic check: ensure the function is declared (e.g., in symbol table)
-            # More advanced: check argument types and count
-            if node.name not in self.symbol_table: # This assumes functions are in symbol table
-                self.errors.append(f"Function '{node.name}' called before declaration.")
-            for arg in node.args:
-                self.analyze(arg)
+        elif isinstance(node, (BinaryOperation, UnaryOperation, FunctionCallNode)):
+            self.analyze_expression(node)
 
         # Add more AST node types as needed (e.g., ArrayAccess, StructDeclaration, etc.)
         # If a node type is not handled, you might want to add a default error or log
@@ -103,28 +114,59 @@ class SemanticAnalyzer:
         #    self.errors.append(f"Unhandled AST node type in semantic analysis: {type(node).__name__}")
 
 
+    def analyze_expression(self, root):
+        # Operators and calls are walked with an explicit stack, in the same order as a recursive
+        # walk, so a long chain such as 1 + 1 + ... + 1 does not hit the recursion limit
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, BinaryOperation):
+                # Check for division by zero
+                if node.operator == '/' and isinstance(node.right, Number) and node.right.value == 0:
+                    self.errors.append("Division by zero.")
+                stack.append(node.right)
+                stack.append(node.left)
+            elif isinstance(node, UnaryOperation):
+                stack.append(node.operand)
+            elif isinstance(node, FunctionCallNode):
+                # Basic check: ensure the function is declared (e.g., in symbol table)
+                # More advanced: check argument types and count
+                # Library functions are declared by the headers, which are not analyzed
+                if node.name not in self.symbol_table and node.name not in LIBRARY_FUNCTIONS:
+                    self.errors.append(f"Function '{node.name}' called before declaration.")
+                stack.extend(reversed(node.args))
+            else:
+                self.analyze(node)
+
+
+    def open_scope(self):
+        self.scopes.append({})
+
+    def close_scope(self):
+        # Names declared in the scope go out of scope; the ones they shadowed come back
+        for name, previous in self.scopes.pop().items():
+            if previous is _UNDECLARED:
+                self.symbol_table.pop(name, None)
+            else:
+                self.symbol_table[name] = previous
+
+
     def check_initialization(self, var_type, var_name, initializer):
-        # This needs to recursively check the type of the initializer expression
-        # For simplicity, I'll keep your existing checks.
-        # A full type system would involve inferring the type of initializer.
-        if isinstance(initializer, Number):
-            if var_type not in ["int", "short", "long", "long long", "float", "double", "long double"]:
-                self.errors.append(f"Type mismatch in initialization of '{var_name}' with number.")
-        elif isinstance(initializer, CharNode):
-            if var_type != "char":
-                self.errors.append(f"Type mismatch in initialization of '{var_name}' with char.")
+        # Literals and variables are checked against the declared type; any other expression
+        # (operators, calls, assignments) is analyzed for errors inside it
+        if isinstance(initializer, (Number, CharNode)):
+            if var_type not in ARITHMETIC_TYPES:
+                kind = "number" if isinstance(initializer, Number) else "char"
+                self.errors.append(f"Type mismatch in initialization of '{var_name}' with {kind}.")
         elif isinstance(initializer, StringNode):
             if var_type != "char[]": # This might need to be 'char*' or more complex for C strings
                 self.errors.append(f"Type mismatch in initialization of '{var_name}' with string.")
-        elif isinstance(initializer, BinaryOperation) or isinstance(initializer, UnaryOperation):
-            self.analyze(initializer) # Analyze the expression to catch errors within it
         elif isinstance(initializer, VariableNode): # Check if initializing with another variable
             if initializer.name not in self.symbol_table:
                 self.errors.append(f"Variable '{initializer.name}' used before declaration in initializer.")
             else:
-                # Basic type compatibility check (can be expanded)
                 init_var_type = self.symbol_table[initializer.name]
-                if init_var_type != var_type: # Very simplistic type check
+                if not compatible(var_type, init_var_type):
                     self.errors.append(f"Type mismatch: '{var_name}' ({var_type}) initialized with '{initializer.name}' ({init_var_type}).")
         elif isinstance(initializer, list): # For array initializers
             if isinstance(initializer[0], list): # 2D array
@@ -143,33 +185,75 @@ class SemanticAnalyzer:
                 for element in initializer:
                     self.analyze(element) # Analyze each element
         else:
-            self.errors.append(f"Unhandled initializer type for '{var_name}': {type(initializer).__name__}")
+            self.analyze(initializer)
 
 
     def check_assignment(self, expected_type, right_expr):
-        # This also needs to recursively check the type of the right_expr
-        # A full type system would involve inferring the type of right_expr.
-        if isinstance(right_expr, Number):
-            if expected_type not in ["int", "short", "long", "long long", "float", "double", "long double"]:
-                self.errors.append(f"Type mismatch in assignment to '{expected_type}' with number.")
-        elif isinstance(right_expr, CharNode):
-            if expected_type != "char":
-                self.errors.append(f"Type mismatch in assignment to 'char' with char.")
+        # Same checks as check_initialization, for the right-hand side of an assignment
+        if isinstance(right_expr, (Number, CharNode)):
+            if expected_type not in ARITHMETIC_TYPES:
+                kind = "number" if isinstance(right_expr, Number) else "char"
+                self.errors.append(f"Type mismatch in assignment to '{expected_type}' with {kind}.")
         elif isinstance(right_expr, StringNode):
             if expected_type != "char[]":
-                self.errors.append(f"Type mismatch in assignment to 'char[]' with string.")
-        elif isinstance(right_expr, BinaryOperation) or isinstance(right_expr, UnaryOperation):
-            self.analyze(right_expr) # Analyze the expression to catch errors within it
+                self.errors.append(f"Type mismatch in assignment to '{expected_type}' with string.")
         elif isinstance(right_expr, VariableNode):
             if right_expr.name not in self.symbol_table:
                 self.errors.append(f"Variable '{right_expr.name}' used before declaration in assignment.")
             else:
-                # Basic type compatibility check (can be expanded)
                 right_var_type = self.symbol_table[right_expr.name]
-                if right_var_type != expected_type: # Very simplistic type check
+                if not compatible(expected_type, right_var_type):
                     self.errors.append(f"Type mismatch: assigning '{right_var_type}' to '{expected_type}'.")
-        elif isinstance(right_expr, FunctionCallNode):
-            self.analyze(right_expr) # Analyze the function call
-            # More advanced: check return type of function call against expected_type
         else:
-            self.errors.append(f"Unhandled assignment expression type: {type(right_expr).__name__}")
\ No newline at end of file
+            self.analyze(right_expr)
+
+
+    def check_flow(self, node):
+        # Uses of uninitialized locals and unused locals, from data-flow analysis of the function's
+        # control-flow graph (see dataflow.py); each analysis is linear in the size of the function
+        try:
+            function = lower([node]).functions[node.name]
+        except IRError:
+            return  # constructs the IR does not cover yet; the checks above still apply
+        cfg = build_cfg(function)
+        variables = Variables(function)
+        bits = variables.bits
+        source_name = lambda bit: variables.names[bit].split('.')[0]  # x.1 is a shadowing x
+
+        uninitialized = []  # (instruction, variable bit) reading a variable not assigned on every path
+        assigned = definite_assignment(cfg, variables)
+        for block in cfg.rpo:
+            for i, state in assigned.walk(block):
+                for index in reads(function, i):
+                    bit = bits.get(index)
+                    if bit is not None and not state >> bit & 1:
+                        uninitialized.append((i, bit))
+        if uninitialized:
+            uninitialized.sort()
+            definitions = reaching_definitions(cfg, variables)
+            reaching = {}
+            for block in {cfg.block_of(i) for i, _ in uninitialized}:
+                for i, state in definitions.walk(block):
+                    reaching[i] = state
+            reported = set()
+            for i, bit in uninitialized:
+                line = function.lines[i]
+                if (bit, line) in reported:
+                    continue
+                reported.add((bit, line))
+                # Only declarations reaching: no path assigns it; otherwise some path does not
+                assigning = reaching[i] & definitions.by_variable[bit]
+                always = all(function.ops[definitions.instruction(d)] == DECL
+                             for d in range(len(definitions.definitions)) if assigning >> d & 1)
+                how = "is" if always else "may be"
+                self.errors.append(f"Variable '{source_name(bit)}' {how} used before initialization at line {line}.")
+
+        read = bytearray(len(variables))  # variables read anywhere in the function
+        for i in range(len(function)):
+            for index in reads(function, i):
+                if index in bits:
+                    read[bits[index]] = 1
+        for i in range(len(function)):
+            if function.ops[i] == DECL and not read[bits[function.dst[i]]]:
+                self.errors.append(f"Variable '{source_name(bits[function.dst[i]])}' declared at line "
+                                   f"{function.lines[i]} is never used.")
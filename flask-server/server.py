@@ -1,56 +1,593 @@
 # server.py (No changes needed, already correct)
-from flask import Flask, request, jsonify
-from lexical import Lexical
-from parser import Parser
-from semantic import SemanticAnalyzer
-from ast_utils import expression_to_str
+import gzip
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Flask, Response, g, request, jsonify
+import metrics
+from ast_utils import render_tree
+from ast_json import iter_json
+from ir import IRError, dump as dump_ir, lower as lower_ir
+from batch import BatchAnalyzer
+from cache import ResultCache
+from disk_cache import DiskCache
+from deadcode import eliminate
+from optimizer import optimize
+from pipeline import PHASES, SECTIONS, AnalysisResult, analyze_source, phases_for, source_key
+from profiling import SlowRequestProfiler, profile_analysis
+from sessions import Cancelled, DocumentTooLarge, SessionStore, VersionConflict
+from singleflight import CoalescedTimeout, SingleFlight
+from streaming import iter_ndjson, iter_result
+import closures
+import transpile
+from vm import CompileError, compile_program, run as run_bytecode
+from workers import BudgetExceeded, Overloaded, WorkerPool
 
 app = Flask(__name__)
+app.config.setdefault("ANALYSIS_CACHE_BYTES", 64 * 1024 * 1024)
+# Persistent second cache tier: path of a SQLite file shared by all server processes, None to disable
+app.config.setdefault("ANALYSIS_DISK_CACHE", os.environ.get("ANALYSIS_DISK_CACHE"))
+app.config.setdefault("ANALYSIS_DISK_CACHE_BYTES", 512 * 1024 * 1024)
+app.config.setdefault("ANALYSIS_DISK_CACHE_MAX_AGE", 7 * 24 * 3600)
+# Number of hot disk entries preloaded into memory at startup
+app.config.setdefault("ANALYSIS_CACHE_WARM_ENTRIES", int(os.environ.get("ANALYSIS_CACHE_WARM_ENTRIES", "0")))
+
+disk_cache = None
+if app.config["ANALYSIS_DISK_CACHE"]:
+    disk_cache = DiskCache(app.config["ANALYSIS_DISK_CACHE"],
+                           max_bytes=app.config["ANALYSIS_DISK_CACHE_BYTES"],
+                           max_age=app.config["ANALYSIS_DISK_CACHE_MAX_AGE"])
+
+# Results of recent analyses, shared by all requests handled by this process
+result_cache = ResultCache(app.config["ANALYSIS_CACHE_BYTES"], backing=disk_cache)
+if disk_cache is not None and app.config["ANALYSIS_CACHE_WARM_ENTRIES"]:
+    disk_cache.warm(result_cache, app.config["ANALYSIS_CACHE_WARM_ENTRIES"])
+
+# /analyze/batch: worker processes (None = one per CPU), jobs queued on the pool at once, files per request.
+# With a worker pool (below) batches go through it instead, BATCH_MAX_WORKERS files at a time.
+app.config.setdefault("BATCH_MAX_WORKERS", None)
+app.config.setdefault("BATCH_MAX_IN_FLIGHT", None)
+app.config.setdefault("BATCH_MAX_FILES", 1000)
+
+# Process pool is started on the first batch request, not at import
+batch_analyzer = BatchAnalyzer(app.config["BATCH_MAX_WORKERS"], app.config["BATCH_MAX_IN_FLIGHT"])
+
+# /analyze worker processes (0 runs analyses inline on the request thread)
+app.config.setdefault("WORKER_POOL_SIZE", int(os.environ.get("WORKER_POOL_SIZE", os.cpu_count() or 1)))
+app.config.setdefault("WORKER_MAX_QUEUE", None)         # jobs waiting for a worker before 429s (default 4 per worker)
+app.config.setdefault("WORKER_QUEUE_TIMEOUT", 5.0)      # seconds a queued job waits before a 503
+app.config.setdefault("ANALYSIS_TIME_BUDGET", 10.0)     # seconds per job, the worker is killed past this
+app.config.setdefault("ANALYSIS_PHASE_BUDGETS", {"tokens": 4.0, "ast": 4.0, "diagnostics": 4.0})
+app.config.setdefault("WORKER_MAX_JOBS", 500)           # recycle a worker after this many jobs
+app.config.setdefault("WORKER_MAX_RSS", 512 * 1024 * 1024)  # or once its resident memory passes this
+
+worker_pool = None
+if app.config["WORKER_POOL_SIZE"]:
+    # Workers are spawned on the first request
+    worker_pool = WorkerPool(app.config["WORKER_POOL_SIZE"],
+                             max_queue=app.config["WORKER_MAX_QUEUE"],
+                             queue_timeout=app.config["WORKER_QUEUE_TIMEOUT"],
+                             total_budget=app.config["ANALYSIS_TIME_BUDGET"],
+                             phase_budgets=app.config["ANALYSIS_PHASE_BUDGETS"],
+                             max_jobs=app.config["WORKER_MAX_JOBS"],
+                             max_rss=app.config["WORKER_MAX_RSS"])
+
+# Files of all batches share these threads, each waiting on one pool job, so batches get the pool's
+# budgets, the result cache and metrics and leave the rest of the pool's queue to /analyze
+batch_threads = None
+if worker_pool is not None:
+    batch_threads = ThreadPoolExecutor(app.config["BATCH_MAX_WORKERS"] or worker_pool.size, thread_name_prefix="batch")
+
+
+# Responses at least this large are gzipped for clients that send Accept-Encoding: gzip (None disables)
+app.config.setdefault("RESPONSE_GZIP_MIN_BYTES", 1024)
+
+
+# Editor sessions: open documents kept with their last analysis, evicted when idle or over budget
+app.config.setdefault("SESSION_MAX", 1000)
+app.config.setdefault("SESSION_MAX_BYTES", 256 * 1024 * 1024)
+app.config.setdefault("SESSION_IDLE_TIMEOUT", 1800.0)
+app.config.setdefault("SESSION_MAX_CHARS", 1024 * 1024)  # longest document a session accepts
+# Session analyses run on the request thread: past this many at once a request gets a 429, and
+# lexing and parsing stop with a 504 past the time budget
+app.config.setdefault("SESSION_MAX_CONCURRENT", int(os.environ.get("SESSION_MAX_CONCURRENT", os.cpu_count() or 1)))
+app.config.setdefault("SESSION_TIME_BUDGET", app.config["ANALYSIS_TIME_BUDGET"])
+
+session_store = SessionStore(app.config["SESSION_MAX"], app.config["SESSION_MAX_BYTES"],
+                             app.config["SESSION_IDLE_TIMEOUT"], app.config["SESSION_MAX_CHARS"])
+session_slots = threading.BoundedSemaphore(app.config["SESSION_MAX_CONCURRENT"])
+
+# Per-request profiling: {"profile": true} or the PROFILE_HEADER header, only honoured when enabled
+app.config.setdefault("PROFILING_ENABLED", os.environ.get("PROFILING_ENABLED", "") == "1")
+app.config.setdefault("PROFILE_HEADER", "X-Profile")
+app.config.setdefault("PROFILE_DIR", os.environ.get("PROFILE_DIR"))  # also save profiles here
+app.config.setdefault("PROFILE_TOP_FUNCTIONS", 30)
+# Analyses slower than this many seconds are re-run under the profiler and saved to PROFILE_DIR (None disables)
+app.config.setdefault("PROFILE_SLOW_THRESHOLD", None)
+
+slow_profiler = None
+if app.config["PROFILE_SLOW_THRESHOLD"] is not None and app.config["PROFILE_DIR"]:
+    # Re-runs go through the worker pool, when there is one, under the same admission and budgets
+    slow_profiler = SlowRequestProfiler(app.config["PROFILE_DIR"], app.config["PROFILE_SLOW_THRESHOLD"],
+                                        app.config["PROFILE_TOP_FUNCTIONS"],
+                                        profile_analysis if worker_pool is None else worker_pool.profile)
+
+
+# /run: limits on a program's execution; a request may lower them, never raise them
+app.config.setdefault("RUN_MAX_INSTRUCTIONS", 10_000_000)
+app.config.setdefault("RUN_MAX_SECONDS", 2.0)
+app.config.setdefault("RUN_MAX_OUTPUT", 64 * 1024)    # characters printed
+app.config.setdefault("RUN_MAX_DEPTH", 1000)          # nested calls
+# Engine used when a request names none: "vm" (bytecode), "closures" (compiled closures, cached per function)
+# or "python" (transpiled to Python, code cached per program)
+app.config.setdefault("RUN_ENGINE", "vm")
+# Programs run on the request thread; past this many at once /run answers 429 instead of queueing
+app.config.setdefault("RUN_MAX_CONCURRENT", int(os.environ.get("RUN_MAX_CONCURRENT", os.cpu_count() or 1)))
+
+run_slots = threading.BoundedSemaphore(app.config["RUN_MAX_CONCURRENT"])
+
+
+# Identical analyses requested at the same time run once; the others wait up to this long for it
+app.config.setdefault("COALESCE_TIMEOUT", app.config["ANALYSIS_TIME_BUDGET"] + app.config["WORKER_QUEUE_TIMEOUT"])
+in_flight = SingleFlight(app.config["COALESCE_TIMEOUT"])
+
+
+def run_analysis(source_code, phases=PHASES):
+    stats = {}
+    if worker_pool is None:
+        result = analyze_source(source_code, result_cache, phases=phases, stats=stats)
+    else:
+        result = worker_pool.analyze(source_code, result_cache, phases=phases, stats=stats)
+    metrics.observe_analysis(stats, result, len(source_code))
+    return result
+
+
+def run_coalesced(source_code, phases):
+    # Keyed by what the computation depends on; response formatting options are applied per request
+    return in_flight.do((source_key(source_code), phases), lambda: run_analysis(source_code, phases))
+
+
+def runtime_metrics():
+    stats = result_cache.stats()
+    collected = [
+        ("analysis_cache_hits_total", "Result cache hits by phase.", "counter",
+         [({"phase": phase}, count) for phase, count in sorted(stats["hits"].items())]),
+        ("analysis_cache_misses_total", "Result cache misses by phase.", "counter",
+         [({"phase": phase}, count) for phase, count in sorted(stats["misses"].items())]),
+        ("analysis_cache_evictions_total", "Entries evicted from the memory cache.", "counter", [({}, stats["evictions"])]),
+        ("analysis_cache_bytes", "Bytes held by the memory cache.", "gauge", [({}, stats["bytes"])]),
+    ]
+    flights = in_flight.stats()
+    collected += [
+        ("analysis_coalesced_total", "Requests that shared an identical analysis already in progress.", "counter",
+         [({}, flights["coalesced"])]),
+        ("analysis_coalesced_timeouts_total", "Coalesced requests that gave up waiting.", "counter", [({}, flights["timeouts"])]),
+        ("analysis_coalesced_shared_errors_total", "Failed analyses whose error was shared with waiting requests.", "counter",
+         [({}, flights["sharedErrors"])]),
+        ("analysis_in_flight", "Distinct analyses in progress.", "gauge", [({}, flights["inFlight"])]),
+    ]
+    functions = closures.function_cache.stats()
+    collected += [
+        ("run_function_cache_hits_total", "Functions /run found already compiled to closures.", "counter",
+         [({}, functions["hits"])]),
+        ("run_function_cache_misses_total", "Functions /run compiled to closures.", "counter", [({}, functions["misses"])]),
+    ]
+    programs = transpile.code_cache.stats()
+    collected += [
+        ("run_code_cache_hits_total", "Programs /run found already transpiled.", "counter", [({}, programs["hits"])]),
+        ("run_code_cache_misses_total", "Programs /run looked up before transpiling.", "counter",
+         [({}, programs["misses"])]),
+    ]
+    if worker_pool is not None:
+        workers = worker_pool.stats()
+        collected += [
+            ("analysis_workers_idle", "Idle analysis workers.", "gauge", [({}, workers["idle"])]),
+            ("analysis_workers_rejected_total", "Jobs refused or timed out waiting for a worker.", "counter", [({}, workers["rejected"])]),
+            ("analysis_workers_killed_total", "Workers killed for exceeding the time budget.", "counter", [({}, workers["killed"])]),
+        ]
+    return collected
+
+
+metrics.REGISTRY.add_collector(runtime_metrics)
+
 
 @app.route('/analyze', methods=['POST'])
 def analyze():
     data = request.get_json()
     source_code = data.get("code", "")
+    ast_format = data.get("astFormat", "string")  # "string", "tree" or "json"
+    # Sections to compute and return; phases that feed none of them are skipped
+    sections = data.get("sections", SECTIONS)
+    token_encoding = data.get("tokenEncoding", "rows")  # "rows" (one dict per token) or "columnar"
 
-    try:
-        # Lexical analysis
-        lexer = Lexical(source_code)
-        tokens, lexical_errors = lexer.get_tokens()
+    if not isinstance(sections, (list, tuple)) or any(s not in SECTIONS for s in sections):
+        return jsonify({"error": f"'sections' must be a list drawn from {list(SECTIONS)}"}), 400
+    if token_encoding not in ("rows", "columnar"):
+        return jsonify({"error": "'tokenEncoding' must be 'rows' or 'columnar'"}), 400
+    for key in ("astMaxDepth", "astMaxNodes"):
+        value = data.get(key)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, int) or value < 0):
+            return jsonify({"error": f"'{key}' must be a non-negative integer"}), 400
 
-        # Convert token objects to dicts for JSON serialization
-        tokens_list = [{
-            "type": token.type,
-            "value": token.value,
-            "line": token.line
-        } for token in tokens]
+    # NDJSON records emitted as each phase produces them. Without a worker pool this runs on the
+    # request thread; with one the analysis runs in a worker under its budgets and is sent once done.
+    if data.get("stream"):
+        if worker_pool is None:
+            return Response(stream_ndjson(source_code, sections), mimetype="application/x-ndjson")
+        try:
+            analysis, _ = run_coalesced(source_code, phases_for(sections))
+        except Overloaded as e:
+            return jsonify({"error": str(e)}), e.status, {"Retry-After": "1"}
+        except BudgetExceeded as e:
+            return jsonify({"error": str(e), "phase": e.phase}), 504
+        except CoalescedTimeout as e:
+            return jsonify({"error": str(e)}), 504
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+        return Response(iter_result(analysis, sections=sections), mimetype="application/x-ndjson")
 
-        # Parsing step
-        parser = Parser(tokens)
-        ast = parser.parse() # This might need error handling for parser errors
+    # Constant folding and dead-code elimination on the returned AST; diagnostics are still
+    # computed on the tree as written, the removals are reported as warnings
+    optimize_ast = bool(data.get("optimize"))
+    # Three-address IR text lowered from the returned AST
+    include_ir = bool(data.get("ir"))
 
-        semantic_output = []
-        ast_str = ""
-        parser_errors = parser.errors # Assuming your Parser class has an 'errors' attribute
+    phases = phases_for(sections)
+    if (ast_format in ("tree", "json") or optimize_ast or include_ir) and 'ast' not in phases:
+        phases = tuple(phase for phase in PHASES if phase in phases or phase == 'ast')
 
-        if ast:
-            analyzer = SemanticAnalyzer()
-            analyzer.analyze(ast)
-            semantic_output = analyzer.errors
-            ast_str = expression_to_str(ast)
+    profile = data.get("profile") or request.headers.get(app.config["PROFILE_HEADER"]) == "1"
+    if profile and not app.config["PROFILING_ENABLED"]:
+        return jsonify({"error": "Profiling is not enabled on this server"}), 403
+
+    try:
+        if profile:
+            # Runs every phase, uncached, under cProfile: in a worker when there is a pool
+            run_profiled = profile_analysis if worker_pool is None else worker_pool.profile
+            analysis, summary = run_profiled(source_code, phases, directory=app.config["PROFILE_DIR"],
+                                             limit=app.config["PROFILE_TOP_FUNCTIONS"])
+        else:
+            # Lexical, syntax and semantic analysis; each phase may come from the cache
+            started = time.perf_counter()
+            analysis, shared = run_coalesced(source_code, phases)
+            if slow_profiler is not None and not shared:
+                slow_profiler.observe(source_code, phases, time.perf_counter() - started)
+        ast = analysis.ast
+        optimization = None
+        if optimize_ast and ast is not None:
+            warnings = []
+            try:
+                folded, folding = optimize(ast, warnings)
+                optimized, dead_code = eliminate(folded, warnings)
+            except RecursionError:
+                # Both passes recurse per nesting level; the tree is returned as written
+                optimization = {"error": "The program is nested too deeply to optimize."}
+            else:
+                ast = optimized
+                optimization = {"folding": folding, "deadCode": dead_code, "warnings": warnings,
+                                "removedNodes": folding["nodesBefore"] - dead_code["nodesAfter"]}
+                analysis = AnalysisResult(analysis.tokens, analysis.lexical_errors, ast,
+                                          analysis.parser_errors, analysis.semantic_errors)
+        started = time.perf_counter()
+        result = analysis.to_dict(sections, token_encoding)
+        if profile:
+            result["profile"] = summary
+        if optimization is not None:
+            result["optimization"] = optimization
+        if include_ir:
+            try:
+                result["ir"] = dump_ir(lower_ir(ast)) if ast is not None else ""
+            except IRError as e:
+                result["irError"] = str(e)
+
+        # Indented tree dump, same layout as pretty_print; depth/node limits keep huge trees manageable
+        if ast_format == "tree":
+            result["astTree"] = render_tree(ast, max_depth=data.get("astMaxDepth"), max_nodes=data.get("astMaxNodes")) if ast else ""
+
+        # Structured AST: streamed node by node after the other sections instead of built as one dict
+        if ast_format == "json":
+            metrics.observe_serialization(time.perf_counter() - started)
+            return Response(stream_with_ast(result, ast), mimetype="application/json")
 
         # Return all analysis results as JSON
-        return jsonify({
-            "tokens": tokens_list,
-            "lexicalErrors": lexical_errors,
-            "parserErrors": parser_errors, # Added parser errors
-            "astString": ast_str,
-            "semanticOutput": semantic_output
-        })
+        response = jsonify(result)
+        metrics.observe_serialization(time.perf_counter() - started)
+        return response
+
+    except Overloaded as e:
+        # Saturated: tell the client to back off instead of queueing without bound
+        return jsonify({"error": str(e)}), e.status, {"Retry-After": "1"}
+
+    except BudgetExceeded as e:
+        return jsonify({"error": str(e), "phase": e.phase}), 504
+
+    except CoalescedTimeout as e:
+        return jsonify({"error": str(e)}), 504
 
     except Exception as e:
         # Return error info on failure
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/run', methods=['POST'])
+def run_program():
+    # {"code": "...", "maxInstructions": n, "maxSeconds": s, "engine": "vm" | "closures" | "python"}: compiles
+    # and runs main. With the closures and python engines, maxInstructions bounds steps (see closures.py) and
+    # "instructions" counts them.
+    data = request.get_json()
+    source_code = data.get("code", "")
+    engine = data.get("engine", app.config["RUN_ENGINE"])
+    if engine not in ("vm", "closures", "python"):
+        return jsonify({"error": "'engine' must be \"vm\", \"closures\" or \"python\""}), 400
+    limits = {}
+    for key, config in (("maxInstructions", "RUN_MAX_INSTRUCTIONS"), ("maxSeconds", "RUN_MAX_SECONDS")):
+        value = data.get(key, app.config[config])
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+            return jsonify({"error": f"'{key}' must be a positive number"}), 400
+        limits[key] = min(value, app.config[config])
+
+    if not run_slots.acquire(blocking=False):
+        return jsonify({"error": "Too many programs running"}), 429, {"Retry-After": "1"}
+    try:
+        # A program transpiled before runs without being lexed, parsed or compiled again
+        program = transpile.cached(source_code) if engine == "python" else None
+        if program is None:
+            # Lexing and parsing share the analysis cache with /analyze
+            analysis, _ = run_coalesced(source_code, ('tokens', 'ast'))
+            if analysis.lexical_errors or analysis.parser_errors:
+                return jsonify({"error": "The program has lexical or syntax errors",
+                                "lexicalErrors": analysis.lexical_errors,
+                                "parserErrors": analysis.parser_errors}), 400
+            try:
+                if engine == "python":
+                    program = transpile.compile_program(analysis.ast, source_code)
+                elif engine == "closures":
+                    program = closures.compile_program(analysis.ast)
+                else:
+                    program = compile_program(analysis.ast)
+            except CompileError as e:
+                return jsonify({"error": str(e)}), 400
+        # Runtime errors and exceeded limits are part of the result, with the output so far
+        bounds = {"max_seconds": limits["maxSeconds"], "max_output": app.config["RUN_MAX_OUTPUT"],
+                  "max_depth": app.config["RUN_MAX_DEPTH"]}
+        if engine == "python":
+            result = transpile.run(program, max_steps=int(limits["maxInstructions"]), **bounds)
+        elif engine == "closures":
+            result = closures.run(program, max_steps=int(limits["maxInstructions"]), **bounds)
+        else:
+            result = run_bytecode(program, max_instructions=int(limits["maxInstructions"]), **bounds)
+        return jsonify(result.to_dict())
+
+    except Overloaded as e:
+        return jsonify({"error": str(e)}), e.status, {"Retry-After": "1"}
+
+    except BudgetExceeded as e:
+        return jsonify({"error": str(e), "phase": e.phase}), 504
+
+    except CoalescedTimeout as e:
+        return jsonify({"error": str(e)}), 504
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    finally:
+        run_slots.release()
+
+
+def analyze_batch_item(source_code):
+    # One file of a batch; failures, an exceeded budget included, are reported in its entry
+    try:
+        analysis, _ = run_coalesced(source_code, PHASES)
+        return analysis.to_dict()
+    except BudgetExceeded as e:
+        return {"error": str(e), "phase": e.phase}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+@app.route('/analyze/batch', methods=['POST'])
+def analyze_batch():
+    # {"sources": ["int main() {...}", {"name": "a.c", "code": "..."}, ...]}
+    data = request.get_json()
+    sources = data.get("sources", [])
+    if not isinstance(sources, list):
+        return jsonify({"error": "'sources' must be a list"}), 400
+    if len(sources) > app.config["BATCH_MAX_FILES"]:
+        return jsonify({"error": f"Too many sources (limit {app.config['BATCH_MAX_FILES']})"}), 413
+
+    names = []
+    codes = []
+    for item in sources:
+        if isinstance(item, dict):
+            names.append(item.get("name"))
+            codes.append(item.get("code", ""))
+        else:
+            names.append(None)
+            codes.append(item)
+
+    try:
+        if batch_threads is not None:
+            results = list(batch_threads.map(analyze_batch_item, codes))
+        else:
+            results = batch_analyzer.analyze(codes)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    for name, result in zip(names, results):
+        if name is not None:
+            result["name"] = name
+    return jsonify({"results": results})
+
+
+def analyze_session(session, version, text):
+    # Bounded like /run: refused when too many analyses are running, stopped past the budget
+    if not session_slots.acquire(blocking=False):
+        raise Overloaded("Too many session analyses running", 429)
+    try:
+        return session.analyze(version, text, budget=app.config["SESSION_TIME_BUDGET"])
+    finally:
+        session_slots.release()
+
+
+@app.route('/sessions', methods=['POST'])
+def open_session():
+    data = request.get_json()
+    try:
+        session = session_store.open(data.get("code", ""))
+    except DocumentTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    try:
+        analyze_session(session, 0, session.text)
+    except Overloaded as e:
+        session_store.close(session.id)
+        return jsonify({"error": str(e)}), e.status, {"Retry-After": "1"}
+    except BudgetExceeded as e:
+        session_store.close(session.id)
+        return jsonify({"error": str(e), "phase": e.phase}), 504
+    except Exception as e:
+        session_store.close(session.id)
+        return jsonify({"error": str(e)}), 500
+    session_store.evict(keep=session)
+    return jsonify({"sessionId": session.id, "version": 0, "diagnostics": session.diagnostics}), 201
+
+
+@app.route('/sessions/<session_id>/edits', methods=['POST'])
+def edit_session(session_id):
+    # {"version": N, "edits": [{"start", "end", "text"}, ...]} or {"text": full buffer}
+    try:
+        session = session_store.get(session_id)
+    except KeyError:
+        return jsonify({"error": "Unknown or expired session"}), 404
+    data = request.get_json()
+    try:
+        if "text" in data:
+            version, text = session.apply(None, text=data["text"])
+        else:
+            edits = data.get("edits")
+            if not isinstance(edits, list):
+                return jsonify({"error": "'edits' must be a list"}), 400
+            version, text = session.apply(data.get("version"), edits)
+    except VersionConflict as e:
+        return jsonify({"error": str(e), "version": e.version}), 409
+    except DocumentTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    except (ValueError, KeyError, TypeError) as e:
+        return jsonify({"error": f"Invalid edit: {e}"}), 400
+
+    try:
+        base, added, removed = analyze_session(session, version, text)
+    except Cancelled:
+        # A newer version arrived; its reply carries the diagnostics change instead
+        return jsonify({"version": version, "cancelled": True, "latestVersion": session.version})
+    except Overloaded as e:
+        return jsonify({"error": str(e)}), e.status, {"Retry-After": "1"}
+    except BudgetExceeded as e:
+        return jsonify({"error": str(e), "phase": e.phase}), 504
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    session_store.evict(keep=session)
+    return jsonify({"version": version, "baseVersion": base, "added": added, "removed": removed})
+
+
+@app.route('/sessions/<session_id>', methods=['GET'])
+def get_session(session_id):
+    try:
+        session = session_store.get(session_id)
+    except KeyError:
+        return jsonify({"error": "Unknown or expired session"}), 404
+    return jsonify({"version": session.version, "analyzedVersion": session.analyzed_version,
+                    "diagnostics": session.diagnostics})
+
+
+@app.route('/sessions/<session_id>', methods=['DELETE'])
+def close_session(session_id):
+    if not session_store.close(session_id):
+        return jsonify({"error": "Unknown or expired session"}), 404
+    return "", 204
+
+
+@app.route('/sessions/stats', methods=['GET'])
+def sessions_stats():
+    return jsonify(session_store.stats())
+
+
+@app.route('/workers/stats', methods=['GET'])
+def workers_stats():
+    if worker_pool is None:
+        return jsonify({"workers": 0})
+    return jsonify(worker_pool.stats())
+
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(result_cache.stats())
+
+
+@app.route('/cache/warm', methods=['POST'])
+def cache_warm():
+    # Preload the hottest persistent entries into memory, e.g. right after a deploy
+    if disk_cache is None:
+        return jsonify({"error": "No persistent cache configured"}), 400
+    data = request.get_json(silent=True) or {}
+    limit = data.get("limit", 1000)
+    if isinstance(limit, bool) or not isinstance(limit, int) or limit < 0:
+        return jsonify({"error": "'limit' must be a non-negative integer"}), 400
+    loaded = disk_cache.warm(result_cache, limit)
+    return jsonify({"loaded": loaded})
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request(response):
+    started = g.get("request_started")
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        metrics.observe_request(endpoint, request.method, response.status_code, time.perf_counter() - started)
+    return response
+
+
+@app.after_request
+def compress_response(response):
+    min_bytes = app.config["RESPONSE_GZIP_MIN_BYTES"]
+    if (min_bytes is None or response.direct_passthrough or response.is_streamed
+            or "gzip" not in request.headers.get("Accept-Encoding", "")
+            or "Content-Encoding" in response.headers):
+        return response
+    body = response.get_data()
+    if len(body) < min_bytes:
+        return response
+    response.set_data(gzip.compress(body, compresslevel=5))
+    response.headers["Content-Encoding"] = "gzip"
+    response.headers["Vary"] = "Accept-Encoding"
+    return response
+
+
+def stream_ndjson(source_code, sections):
+    try:
+        yield from iter_ndjson(source_code, result_cache, sections=sections)
+    except Exception as e:
+        # Headers are already sent, so the failure is reported as the last record
+        yield json.dumps({"type": "error", "error": str(e)}) + '\n'
+
+
+def stream_with_ast(result, ast):
+    head = json.dumps(result)
+    yield head[:-1] + (', "ast": ' if result else '"ast": ')
+    yield from iter_json(ast)
+    yield '}'
+
+
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
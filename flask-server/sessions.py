@@ -0,0 +1,495 @@
+"""
+Editor sessions: a document held by the server, edited by version.
+
+An editor opens a session with the full buffer, then sends only its edits:
+
+    {"version": 3, "edits": [{"start": 120, "end": 125, "text": "count"}, ...]}
+
+Offsets are character offsets into the document, each edit applied to the
+result of the previous one; `version` is the version the edits were made
+against, and a stale one is refused (VersionConflict) so the editor can
+resend the whole buffer with {"text": ...}. Each accepted batch bumps the
+version and the reply carries only the change in diagnostics since the
+last analysis the editor saw.
+
+Re-analysis is incremental and gives the same tokens, AST and errors as a
+full run of the pipeline:
+
+- Lexing resumes from the last token that starts before the first changed
+  character, with the lexer state saved there (line, previous token type,
+  declared identifiers), and stops as soon as it is back in step with the
+  old token stream past the change; the rest of the old tokens is reused,
+  with line numbers shifted if lines were added or removed.
+- Parsing reuses every top-level statement that ends before the first
+  changed token, parses from there, and once it reaches a statement
+  boundary inside the reused tokens takes the old statements after it as
+  they are (lines shifted the same way).
+- The semantic pass runs over the whole tree.
+
+Only one analysis of a session runs at a time. An analysis checks now and
+then whether a newer version has arrived and gives up if so (Cancelled);
+the newer request analyzes the combined edits. The same checks enforce an
+optional time budget on lexing and parsing (workers.BudgetExceeded), and
+documents longer than `max_chars` are refused (DocumentTooLarge), which
+also bounds the semantic pass.
+
+Sessions live in the memory of one server process, so a multi-process
+deployment needs requests of a session routed to the same process.
+SessionStore evicts sessions idle past `idle_timeout`, and the least
+recently used ones once the estimated memory held passes `max_bytes`.
+"""
+
+import bisect
+import collections
+import re
+import secrets
+import threading
+import time
+
+from ast_nodes import ASTNode
+from lexical import Lexical, Tokens
+from parser import Parser
+from pipeline import check
+from workers import BudgetExceeded
+
+CANCEL_CHECK_TOKENS = 512
+# Rough footprint of one token with its checkpoint and its share of the AST, to estimate a session's memory
+TOKEN_BYTES = 600
+
+_LINE_SUFFIX = re.compile(r'line (\d+)\.?$')
+
+
+class VersionConflict(Exception):
+    def __init__(self, version):
+        super().__init__(f"Edits are based on a stale version, the document is at version {version}")
+        self.version = version
+
+
+class Cancelled(Exception):
+    pass
+
+
+class DocumentTooLarge(Exception):
+    def __init__(self, max_chars):
+        super().__init__(f"Documents are limited to {max_chars} characters")
+        self.max_chars = max_chars
+
+
+def _shift_message(message, shift):
+    # Lexer and parser errors that name a line end with "line N" or "line N."
+    match = _LINE_SUFFIX.search(message)
+    if match is None:
+        return message
+    return message[:match.start(1)] + str(int(match.group(1)) + shift) + message[match.end(1):]
+
+
+def _shift_lines(nodes, shift):
+    stack = [node for node in nodes if node is not None]
+    while stack:
+        node = stack.pop()
+        if node.line is not None:
+            node.line += shift
+        for field in type(node)._fields:
+            value = getattr(node, field, None)
+            if isinstance(value, ASTNode):
+                stack.append(value)
+            elif isinstance(value, (list, tuple)):
+                stack.extend(item for item in value if isinstance(item, ASTNode))
+
+
+def _common_prefix(a, b, step=4096):
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i:i + step] == b[i:i + step]:
+        i += step
+    i = min(i, n)
+    end = min(i + step, n)
+    while i < end and a[i] == b[i]:
+        i += 1
+    return i
+
+
+class _CheckpointLexer(Lexical):
+    # Reports where each token starts, and can start from a saved state mid-text
+    def __init__(self, text, resume=None):
+        super().__init__(text)
+        self.mark = None
+        if resume is not None:
+            self.pos, self.line, self.last_token_type, self.declared_identifiers = resume
+            self.current_char = text[self.pos] if self.pos < len(text) else None
+
+    def iter_checkpoints(self, errors):
+        # (token, start offset, number of errors reported before it)
+        self.errors_out = errors
+        for token in self.iter_tokens(errors):
+            if self.mark is None:
+                # Operators, symbols and invalid characters are yielded before the lexer moves past them
+                yield token, self.pos, len(errors)
+            else:
+                yield (token,) + self.mark
+                self.mark = None
+
+    def _mark(self):
+        self.mark = (self.pos, len(self.errors_out))
+
+    def collect_identifier_or_keyword(self):
+        self._mark()
+        return super().collect_identifier_or_keyword()
+
+    def collect_number(self):
+        self._mark()
+        return super().collect_number()
+
+    def collect_string(self):
+        self._mark()
+        return super().collect_string()
+
+    def collect_char(self):
+        self._mark()
+        return super().collect_char()
+
+    def collect_preprocessor_directive(self):
+        self._mark()
+        return super().collect_preprocessor_directive()
+
+
+class _Lexed:
+    # Tokens of one version plus, per token, its start offset, the errors reported before it
+    # and the number of declared identifiers before it (names holds them in declaration order).
+    def __init__(self, text):
+        self.text = text
+        self.tokens = []
+        self.starts = []
+        self.errors_before = []
+        self.declared_before = []
+        self.names = []
+        self.errors = []
+        self.first_changed = 0  # index of the first token that differs from the previous version
+        self.resynced = None    # (index here, index in the previous version, line shift) where old tokens resume
+
+
+class _Parsed:
+    def __init__(self):
+        self.ast = []
+        self.ends = []          # token position after each top-level statement
+        self.error_counts = []  # parser errors reported up to each top-level statement
+        self.errors = []
+
+
+def _lex(old, text, cancelled):
+    lexed = _Lexed(text)
+    if old is None:
+        prefix = changed_end = delta = 0
+        restart = 0
+    else:
+        prefix = _common_prefix(old.text, text)
+        suffix = min(_common_prefix(old.text[::-1], text[::-1]), len(old.text) - prefix, len(text) - prefix)
+        changed_end = len(text) - suffix
+        delta = len(text) - len(old.text)
+        # Last token starting before the change; the token before it only looked one character past its end
+        restart = max(bisect.bisect_left(old.starts, prefix) - 1, 0)
+
+    resume = None
+    if restart:
+        lexed.tokens = old.tokens[:restart]
+        lexed.starts = old.starts[:restart]
+        lexed.errors_before = old.errors_before[:restart]
+        lexed.declared_before = old.declared_before[:restart]
+        lexed.names = old.names[:old.declared_before[restart]]
+        lexed.errors = old.errors[:old.errors_before[restart]]
+        resume = (old.starts[restart], old.tokens[restart].line, old.tokens[restart - 1].type, set(lexed.names))
+    lexer = _CheckpointLexer(text, resume)
+    errors = lexed.errors
+    names = lexed.names
+    same_names = {}
+
+    # Old token that would start where the current one does, moved forward as lexing goes
+    k = bisect.bisect_left(old.starts, changed_end - delta) if old is not None else None
+    old_count = len(old.starts) if old is not None else 0
+    seen = 0
+    for token, start, before in lexer.iter_checkpoints(errors):
+        seen += 1
+        if seen % CANCEL_CHECK_TOKENS == 0 and cancelled():
+            raise Cancelled()
+
+        if k is not None and start >= changed_end:
+            while k < old_count and old.starts[k] < start - delta:
+                k += 1
+            if (k < old_count and old.starts[k] == start - delta
+                    and old.declared_before[k] == len(names) and _in_step(old, k, lexed, same_names)):
+                _splice(old, k, lexed, token, before, delta)
+                _mark_first_changed(old, lexed, restart)
+                return lexed
+
+        lexed.tokens.append(token)
+        lexed.starts.append(start)
+        lexed.errors_before.append(before)
+        lexed.declared_before.append(len(names))
+        if len(lexer.declared_identifiers) > len(names):
+            names.append(token.value)
+
+    if old is not None:
+        _mark_first_changed(old, lexed, restart)
+    return lexed
+
+
+def _in_step(old, k, lexed, same_names):
+    # Same input ahead and same lexer state: the rest of the old token stream still holds
+    last_type = lexed.tokens[-1].type if lexed.tokens else None
+    if last_type != (old.tokens[k - 1].type if k else None):
+        return False
+    # Both sides have declared the same number of names here; they must be the same names
+    count = len(lexed.names)
+    if count not in same_names:
+        same_names[count] = set(lexed.names) == set(old.names[:count])
+    return same_names[count]
+
+
+def _splice(old, k, lexed, token, before, delta):
+    shift = token.line - old.tokens[k].line
+    lexed.resynced = (len(lexed.tokens), k, shift)
+    if shift:
+        lexed.tokens += [Tokens(t.type, t.value, t.line + shift) for t in old.tokens[k:]]
+        suffix_errors = [_shift_message(message, shift) for message in old.errors[old.errors_before[k]:]]
+    else:
+        lexed.tokens += old.tokens[k:]
+        suffix_errors = old.errors[old.errors_before[k]:]
+    lexed.starts += [start + delta for start in old.starts[k:]]
+    offset = before - old.errors_before[k]
+    lexed.errors_before += [count + offset for count in old.errors_before[k:]]
+    lexed.declared_before += old.declared_before[k:]
+    lexed.names += old.names[old.declared_before[k]:]
+    del lexed.errors[before:]
+    lexed.errors += suffix_errors
+
+
+def _mark_first_changed(old, lexed, restart):
+    i = restart
+    limit = min(len(old.tokens), len(lexed.tokens))
+    while i < limit:
+        a, b = old.tokens[i], lexed.tokens[i]
+        if a is not b and (a.type, a.value, a.line) != (b.type, b.value, b.line):
+            break
+        i += 1
+    lexed.first_changed = i if i < limit or len(old.tokens) != len(lexed.tokens) else len(lexed.tokens) + 1
+
+
+def _parse(old, lexed, cancelled):
+    parsed = _Parsed()
+    tokens = lexed.tokens
+    parser = Parser(tokens)
+    keep = bisect.bisect_left(old.ends, lexed.first_changed) if old is not None else 0
+    if keep:
+        # Statements ending before the first changed token only ever looked at unchanged tokens
+        parsed.ast = old.ast[:keep]
+        parsed.ends = old.ends[:keep]
+        parsed.error_counts = old.error_counts[:keep]
+        parser.errors = old.errors[:old.error_counts[keep - 1]]
+        parser.pos = old.ends[keep - 1]
+        parser.current_token = tokens[parser.pos] if parser.pos < len(tokens) else None
+    resynced = lexed.resynced if old is not None else None
+    for node in parser.iter_parse():
+        parsed.ast.append(node)
+        parsed.ends.append(parser.pos)
+        parsed.error_counts.append(len(parser.errors))
+        if cancelled():
+            raise Cancelled()
+        if resynced is not None and parser.pos >= resynced[0]:
+            # At a statement boundary inside the old tokens: the old parse from here on still holds
+            offset = resynced[0] - resynced[1]
+            j = bisect.bisect_left(old.ends, parser.pos - offset)
+            if j < len(old.ends) and old.ends[j] == parser.pos - offset:
+                _splice_statements(old, j, parsed, parser.errors, offset, resynced[2])
+                return parsed
+    parsed.errors = parser.errors
+    return parsed
+
+
+def _splice_statements(old, j, parsed, errors, offset, shift):
+    # The old nodes are moved over, not copied: the previous version is dropped once this one is kept
+    suffix = old.ast[j + 1:]
+    if shift:
+        _shift_lines(suffix, shift)
+        suffix_errors = [_shift_message(message, shift) for message in old.errors[old.error_counts[j]:]]
+    else:
+        suffix_errors = old.errors[old.error_counts[j]:]
+    parsed.ast += suffix
+    parsed.ends += [end + offset for end in old.ends[j + 1:]]
+    count = len(errors) - old.error_counts[j]
+    parsed.error_counts += [c + count for c in old.error_counts[j + 1:]]
+    parsed.errors = errors + suffix_errors
+
+
+def diagnostics_of(lexical_errors, parser_errors, semantic_errors):
+    return ([{"phase": "lexical", "message": m} for m in lexical_errors]
+            + [{"phase": "parser", "message": m} for m in parser_errors]
+            + [{"phase": "semantic", "message": m} for m in semantic_errors])
+
+
+def diagnostics_delta(before, after):
+    # Multiset difference, so repeated identical messages are tracked one by one
+    old = collections.Counter((d["phase"], d["message"]) for d in before)
+    new = collections.Counter((d["phase"], d["message"]) for d in after)
+    added = [{"phase": phase, "message": message} for (phase, message), n in (new - old).items() for _ in range(n)]
+    removed = [{"phase": phase, "message": message} for (phase, message), n in (old - new).items() for _ in range(n)]
+    return added, removed
+
+
+class Session:
+    def __init__(self, session_id, text, max_chars=None):
+        if max_chars is not None and len(text) > max_chars:
+            raise DocumentTooLarge(max_chars)
+        self.id = session_id
+        self.text = text
+        self.max_chars = max_chars
+        self.version = 0
+        self.lock = threading.Lock()           # text and version
+        self.analysis_lock = threading.Lock()  # one analysis at a time
+        self.lexed = None
+        self.parsed = None
+        self.semantic_errors = []
+        self.diagnostics = []
+        self.analyzed_version = None
+        self.last_used = time.monotonic()
+
+    def apply(self, base_version, edits=None, text=None):
+        """
+        Apply edits made against `base_version` (or replace the whole text) and
+        return the new version and its text.
+        """
+        with self.lock:
+            if text is None:
+                if base_version != self.version:
+                    raise VersionConflict(self.version)
+                new_text = self.text
+                for edit in edits:
+                    start, end, insert = edit["start"], edit["end"], edit.get("text", "")
+                    if not (isinstance(start, int) and isinstance(end, int) and 0 <= start <= end <= len(new_text)):
+                        raise ValueError(f"Edit range {start}..{end} is outside the document")
+                    new_text = new_text[:start] + insert + new_text[end:]
+                text = new_text
+            if self.max_chars is not None and len(text) > self.max_chars:
+                raise DocumentTooLarge(self.max_chars)
+            self.text = text
+            self.version += 1
+            self.last_used = time.monotonic()
+            return self.version, text
+
+    def analyze(self, version, text, budget=None):
+        """
+        Bring the analysis up to `version` and return (previous analyzed version,
+        added diagnostics, removed diagnostics). Raises Cancelled if a newer
+        version arrives first, BudgetExceeded if lexing and parsing take longer
+        than `budget` seconds.
+        """
+        deadline = time.monotonic() + budget if budget else None
+        phase = 'tokens'
+
+        def cancelled():
+            if deadline is not None and time.monotonic() > deadline:
+                raise BudgetExceeded(phase, budget)
+            return self.version != version
+
+        with self.analysis_lock:
+            if cancelled():
+                raise Cancelled()
+            lexed = _lex(self.lexed, text, cancelled) if self.lexed is None or text != self.lexed.text else self.lexed
+            if lexed is self.lexed:
+                parsed = self.parsed
+            else:
+                phase = 'ast'
+                parsed = _parse(self.parsed, lexed, cancelled)
+            try:
+                semantic_errors = check(parsed.ast)
+            except Exception:
+                # Nodes reused from the previous version may have been re-lined already
+                self.lexed = self.parsed = None
+                raise
+            diagnostics = diagnostics_of(lexed.errors, parsed.errors, semantic_errors)
+            added, removed = diagnostics_delta(self.diagnostics, diagnostics)
+
+            base = self.analyzed_version
+            self.lexed, self.parsed, self.semantic_errors = lexed, parsed, semantic_errors
+            self.diagnostics = diagnostics
+            self.analyzed_version = version
+            self.last_used = time.monotonic()
+            return base, added, removed
+
+    @property
+    def tokens(self):
+        return self.lexed.tokens if self.lexed is not None else []
+
+    @property
+    def ast(self):
+        return self.parsed.ast if self.parsed is not None else []
+
+    def approx_bytes(self):
+        lexed = self.lexed
+        size = len(self.text)
+        if lexed is not None:
+            size += (len(lexed.text) if lexed.text is not self.text else 0) + len(lexed.tokens) * TOKEN_BYTES
+        return size
+
+
+class SessionStore:
+    def __init__(self, max_sessions=1000, max_bytes=256 * 1024 * 1024, idle_timeout=1800.0, max_chars=None):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.idle_timeout = idle_timeout
+        self.max_chars = max_chars
+        self.sessions = collections.OrderedDict()  # least recently used first
+        self.lock = threading.Lock()
+        self.evictions = 0
+
+    def open(self, text):
+        session = Session(secrets.token_urlsafe(16), text, self.max_chars)
+        with self.lock:
+            self.sessions[session.id] = session
+        return session
+
+    def get(self, session_id):
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                raise KeyError(session_id)
+            self.sessions.move_to_end(session_id)
+            return session
+
+    def close(self, session_id):
+        with self.lock:
+            return self.sessions.pop(session_id, None) is not None
+
+    def evict(self, keep=None):
+        # Idle sessions first, then least recently used ones while over the count or memory limit
+        now = time.monotonic()
+        with self.lock:
+            sessions = list(self.sessions.values())
+        doomed = [s for s in sessions if s is not keep and now - s.last_used > self.idle_timeout]
+        remaining = [s for s in sessions if s is keep or now - s.last_used <= self.idle_timeout]
+        count = len(remaining)
+        total = sum(s.approx_bytes() for s in remaining)
+        for session in remaining:
+            if count <= self.max_sessions and total <= self.max_bytes:
+                break
+            if session is keep:
+                continue
+            doomed.append(session)
+            count -= 1
+            total -= session.approx_bytes()
+        with self.lock:
+            for session in doomed:
+                if self.sessions.pop(session.id, None) is not None:
+                    self.evictions += 1
+        return len(doomed)
+
+    def stats(self):
+        with self.lock:
+            sessions = list(self.sessions.values())
+            evictions = self.evictions
+        return {
+            "sessions": len(sessions),
+            "approxBytes": sum(s.approx_bytes() for s in sessions),
+            "maxSessions": self.max_sessions,
+            "maxBytes": self.max_bytes,
+            "evictions": evictions,
+        }
@@ -0,0 +1,89 @@
+"""
+Single-flight coalescing of identical concurrent work.
+
+When a burst of requests submits the same source at once, none of them can
+be served from the result cache yet: each would run the whole pipeline.
+SingleFlight lets the first request for a key (the leader) do the work
+while the others for the same key (followers) wait for it and share its
+result, or its exception. The key is dropped as soon as the leader
+finishes, so later requests go through the cache as usual.
+
+Followers wait at most `timeout` seconds and then give up with
+CoalescedTimeout; the leader keeps running and still fills the cache.
+"""
+
+import threading
+
+
+class CoalescedTimeout(Exception):
+    def __init__(self, timeout):
+        super().__init__(f"Timed out after {timeout:g}s waiting for an identical analysis in progress")
+        self.timeout = timeout
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+        self.calls = {}
+        self.lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    def do(self, key, fn):
+        """
+        Return (fn(), shared) where `shared` is True if the result came from
+        another caller's run of fn for the same key.
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            if call is None:
+                call = self.calls[key] = _Call()
+                self.leaders += 1
+                leader = True
+            else:
+                call.followers += 1
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            if not call.done.wait(self.timeout):
+                with self.lock:
+                    self.timeouts += 1
+                raise CoalescedTimeout(self.timeout)
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            if call.followers:
+                with self.lock:
+                    self.errors += 1
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+        return call.result, False
+
+    def stats(self):
+        with self.lock:
+            return {
+                "inFlight": len(self.calls),
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "timeouts": self.timeouts,
+                "sharedErrors": self.errors,
+            }
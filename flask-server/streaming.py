@@ -0,0 +1,141 @@
+"""
+NDJSON streaming of an analysis, one record per line, emitted as soon as
+each phase produces it:
+
+    {"type": "tokens", "tokens": [{"type", "value", "line"}, ...]}   (batches)
+    {"type": "lexicalErrors", "errors": [...]}
+    {"type": "ast", "index": 0, "node": {...}}          (one per top-level statement, for astString)
+    {"type": "parserErrors", "errors": [...]}
+    {"type": "semanticOutput", "errors": [...]}
+    {"type": "done"}
+
+Records for sections that were not requested are left out and phases
+nobody needs do not run (see pipeline.phases_for).
+
+Token and AST records use the same shapes as /analyze (token dicts and the
+ast_json node layout). Nothing is accumulated for the response: each record
+is encoded and handed to the server on its own, so the memory held for
+output stays bounded by the largest record. The parser still needs the
+token list and the semantic pass the whole tree.
+
+iter_result streams an analysis that already finished elsewhere; the server
+uses it when analyses run in worker processes, so a streamed request goes
+through the same admission limits and time budgets as any other.
+"""
+
+import json
+
+from ast_json import iter_json
+from lexical import Lexical
+from parser import Parser
+from pipeline import SECTIONS, check, phases_for, source_key
+
+
+def _record(record):
+    return json.dumps(record) + '\n'
+
+
+def _token_batches(tokens, batch_size):
+    batch = []
+    for token in tokens:
+        batch.append({"type": token.type, "value": token.value, "line": token.line})
+        if len(batch) >= batch_size:
+            yield _record({"type": "tokens", "tokens": batch})
+            batch = []
+    if batch:
+        yield _record({"type": "tokens", "tokens": batch})
+
+
+def _ast_record(index, node):
+    return '{"type": "ast", "index": %d, "node": %s}\n' % (index, ''.join(iter_json(node)))
+
+
+def _from_cache(cache, key, phases):
+    values = {}
+    for phase in phases:
+        value = cache.get(key, phase)
+        if value is None:
+            return None
+        values[phase] = value
+    return values
+
+
+def _from_values(values, sections, batch_size):
+    if 'tokens' in values:
+        tokens, lexical_errors = values['tokens']
+        if "tokens" in sections:
+            yield from _token_batches(tokens, batch_size)
+        if "lexicalErrors" in sections:
+            yield _record({"type": "lexicalErrors", "errors": lexical_errors})
+    if 'ast' in values:
+        ast, parser_errors = values['ast']
+        if "astString" in sections:
+            for index, node in enumerate(ast):
+                yield _ast_record(index, node)
+        if "parserErrors" in sections:
+            yield _record({"type": "parserErrors", "errors": parser_errors})
+    if "semanticOutput" in sections:
+        yield _record({"type": "semanticOutput", "errors": values['diagnostics']})
+    yield _record({"type": "done"})
+
+
+def iter_result(analysis, batch_size=500, sections=SECTIONS):
+    """Records of an analysis that already ran (e.g. in a worker), laid out like a cache hit in iter_ndjson."""
+    values = {}
+    phases = phases_for(sections)
+    if 'tokens' in phases:
+        values['tokens'] = (analysis.tokens, analysis.lexical_errors)
+    if 'ast' in phases:
+        values['ast'] = (analysis.ast, analysis.parser_errors)
+    if 'diagnostics' in phases:
+        values['diagnostics'] = analysis.semantic_errors
+    yield from _from_values(values, sections, batch_size)
+
+
+def iter_ndjson(source, cache=None, batch_size=500, sections=SECTIONS):
+    # Only the phases needed for `sections` run; the parser also runs for the semantic pass alone,
+    # but AST records are sent only when "astString" is requested
+    phases = phases_for(sections)
+    key = source_key(source) if cache is not None else None
+    cached = _from_cache(cache, key, phases) if cache is not None else None
+
+    if cached is not None:
+        yield from _from_values(cached, sections, batch_size)
+        return
+
+    # Token batches go out while the lexer is still running
+    lexical_errors = []
+    tokens = []
+    batch = []
+    for token in Lexical(source).iter_tokens(lexical_errors):
+        tokens.append(token)
+        if "tokens" in sections:
+            batch.append(token)
+            if len(batch) >= batch_size:
+                yield from _token_batches(batch, batch_size)
+                batch = []
+    yield from _token_batches(batch, batch_size)
+    if "lexicalErrors" in sections:
+        yield _record({"type": "lexicalErrors", "errors": lexical_errors})
+    if cache is not None:
+        cache.put(key, 'tokens', (tokens, lexical_errors))
+
+    if 'ast' in phases or 'diagnostics' in phases:
+        # Each top-level statement is sent as soon as it is parsed
+        parser = Parser(tokens)
+        ast = []
+        for node in parser.iter_parse():
+            if "astString" in sections:
+                yield _ast_record(len(ast), node)
+            ast.append(node)
+        if "parserErrors" in sections:
+            yield _record({"type": "parserErrors", "errors": parser.errors})
+        if cache is not None:
+            cache.put(key, 'ast', (ast, parser.errors))
+
+        if 'diagnostics' in phases:
+            semantic_errors = check(ast)
+            yield _record({"type": "semanticOutput", "errors": semantic_errors})
+            if cache is not None:
+                cache.put(key, 'diagnostics', semantic_errors)
+    yield _record({"type": "done"})
@@ -0,0 +1,249 @@
+"""
+Worst-case stress suite: pathological input families at growing sizes.
+
+    python stress.py [--family NAME ...] [--sizes N ...] [--max-seconds S]
+                     [--tolerance T] [--repeat N] [--strict] [--json PATH]
+
+Each family builds an input from a size n. Every phase (lex, parse,
+semantic, serialize) is timed, and its peak traced memory measured, at
+each size. Timings are the median of --repeat runs, each starting over
+from a freshly built source, so a cold run's cost is not hidden; a family stops growing once a phase takes longer than
+`max_seconds`. The growth exponent k of time ~ n^k (and of memory) is fitted
+by least squares on a log-log scale and checked against the family's
+declared bound for that phase (1 = linear unless stated otherwise) plus
+`tolerance`. A phase that raises fails unless the family expects that
+exception.
+
+Violations that are already known are listed in the family's `known`
+notes and reported as KNOWN; they only fail the run with --strict. The
+exit status is 1 if anything else exceeds its bound.
+
+Runs use the interpreter's default recursion limit, as the server does.
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import math
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+from ast_nodes import Program
+from lexical import Lexical
+from parser import Parser
+from pipeline import AnalysisResult
+from semantic import SemanticAnalyzer
+
+PHASES = ('lex', 'parse', 'semantic', 'serialize')
+MIN_FIT_SECONDS = 0.005  # timings below this are mostly noise and left out of the fit
+
+
+class Family:
+    def __init__(self, name, build, description, bounds=None, known=None, expected_errors=()):
+        self.name = name
+        self.build = build
+        self.description = description
+        self.bounds = dict.fromkeys(PHASES, 1.0)
+        self.bounds.update(bounds or {})
+        self.known = known or {}  # phase -> why it is allowed to fail for now
+        self.expected_errors = expected_errors
+
+
+def _soup(n):
+    rng = random.Random(n)
+    words = ('}', '{', ';', ')', '(', 'case', 'switch', '+', 'int', '=', '1', ':', 'default', 'x', 'while', 'if')
+    # Ends in a complete statement: the parser reads past the end of input on a truncated
+    # expression (AttributeError on None), which is a crash rather than a scaling problem
+    return ' '.join(rng.choice(words) for _ in range(n)) + ' 1 ;'
+
+
+FAMILIES = [
+    Family("undeclared_identifiers",
+           lambda n: ' '.join(f"zq{i};" for i in range(n)),
+           "distinct undeclared names, each matched against keywords with difflib"),
+    Family("declared_then_undeclared",
+           lambda n: ''.join(f"int d{i};" for i in range(n)) + ''.join(f"zq{i};" for i in range(n)),
+           "n declarations, then n undeclared names matched against all of them",
+           known={"lex": "collect_identifier_or_keyword runs difflib over every declared identifier (O(n^2))"}),
+    Family("unterminated_comment",
+           lambda n: "int x; /*" + "ab " * (50 * n),
+           "a block comment that never ends, 150n characters long"),
+    Family("unterminated_string",
+           lambda n: 'int x = "' + "ab" * (50 * n),
+           "a string literal that never ends, 100n characters long"),
+    Family("long_expression",
+           lambda n: "int x = " + " + ".join("1" for _ in range(n)) + ";",
+           "one declaration with an n-term expression on a single line"),
+    Family("long_expression_in_function",
+           lambda n: "int main() { int x = " + " + ".join("1" for _ in range(n)) + "; return x; }",
+           "the same expression in a function body, which the flow checks lower to IR"),
+    Family("nested_parentheses",
+           lambda n: "int x = " + "(" * (n // 25) + "1" + ")" * (n // 25) + ";",
+           "an expression nested n/25 parentheses deep",
+           expected_errors=(RecursionError,),
+           known={"parse": "recursive descent uses several frames per nesting level"}),
+    Family("token_soup",
+           _soup,
+           "random keywords and punctuation that keep error recovery busy"),
+    Family("switch_recovery",
+           lambda n: "int main() { int x; switch (x) { " + " ".join(f": ; + 1 case {i} : default" for i in range(n)) + " } }",
+           "a switch whose body keeps parse_switch_statement resynchronizing"),
+]
+
+
+def _run_phase(phase, state):
+    if phase == 'lex':
+        state['tokens'], state['lexical_errors'] = Lexical(state['source']).get_tokens()
+    elif phase == 'parse':
+        # Parser errors are printed; the printing is part of the cost but not of the report
+        with contextlib.redirect_stdout(io.StringIO()):
+            parser = Parser(state['tokens'])
+            state['ast'] = parser.parse()
+        state['parser_errors'] = parser.errors
+    elif phase == 'semantic':
+        analyzer = SemanticAnalyzer()
+        analyzer.analyze(Program(state['ast']))
+        state['semantic_errors'] = analyzer.errors
+    else:
+        AnalysisResult(state['tokens'], state['lexical_errors'], state['ast'],
+                       state['parser_errors'], state['semantic_errors']).to_dict()
+
+
+def measure(build, n, repeat=3, memory=True):
+    # {phase: {"seconds", "peakBytes"} or {"error"}}; phases after a failed one are skipped.
+    # Each run goes through every phase from a freshly built source, so no run is cheaper for
+    # what an earlier one left behind. Time is the median of `repeat` runs; once a phase takes
+    # over a second no further runs are made.
+    timings = {phase: [] for phase in PHASES}
+    errors = {}
+    for _ in range(repeat):
+        state = {'source': build(n)}
+        slow = False
+        for phase in PHASES:
+            gc.collect()
+            start = time.perf_counter()
+            try:
+                _run_phase(phase, state)
+            except Exception as e:
+                errors[phase] = type(e).__name__
+                break
+            timings[phase].append(time.perf_counter() - start)
+            slow = slow or timings[phase][-1] > 1.0
+        if errors or slow:
+            break
+
+    results = {}
+    memory_state = {'source': build(n)}
+    for phase in PHASES:
+        if phase in errors:
+            results[phase] = {"error": errors[phase]}
+            break
+        results[phase] = {"seconds": statistics.median(timings[phase])}
+        if memory:
+            gc.collect()
+            tracemalloc.start()
+            try:
+                _run_phase(phase, memory_state)
+                results[phase]["peakBytes"] = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+    return results
+
+
+def fit_exponent(points):
+    # Least-squares slope of log(y) against log(n)
+    points = [(math.log(n), math.log(y)) for n, y in points if y > 0]
+    if len(points) < 3:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    var = sum((x - mean_x) ** 2 for x, _ in points)
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / var if var else None
+
+
+def run_family(family, sizes, max_seconds, tolerance, repeat=3, memory=True):
+    rows = []
+    for n in sizes:
+        source = family.build(n)
+        row = {"n": n, "chars": len(source), "phases": measure(family.build, n, repeat, memory)}
+        rows.append(row)
+        print(f"  {family.name} n={n}: " + ', '.join(
+            f"{phase} {r['seconds'] * 1000:.1f}ms" if 'seconds' in r else f"{phase} {r['error']}"
+            for phase, r in row["phases"].items()), file=sys.stderr)
+        if any(r.get('seconds', 0) > max_seconds or 'error' in r for r in row["phases"].values()):
+            break
+
+    verdicts = {}
+    for phase in PHASES:
+        errors = {row["phases"][phase]["error"] for row in rows if "error" in row["phases"].get(phase, {})}
+        timed = [(row["n"], row["phases"][phase]["seconds"]) for row in rows if "seconds" in row["phases"].get(phase, {})]
+        sized = [(row["n"], row["phases"][phase]["peakBytes"]) for row in rows if "peakBytes" in row["phases"].get(phase, {})]
+        time_k = fit_exponent([(n, t) for n, t in timed if t >= MIN_FIT_SECONDS])
+        memory_k = fit_exponent(sized)
+        bound = family.bounds[phase]
+        problems = []
+        if errors:
+            expected = {e.__name__ for e in family.expected_errors}
+            problems.append(("raised " if errors <= expected else "unexpectedly raised ") + ', '.join(sorted(errors)))
+        if time_k is not None and time_k > bound + tolerance:
+            problems.append(f"time grows as n^{time_k:.2f}, bound n^{bound:g}")
+        if memory_k is not None and memory_k > bound + tolerance:
+            problems.append(f"memory grows as n^{memory_k:.2f}, bound n^{bound:g}")
+        if not problems:
+            status = "ok"
+        elif phase in family.known:
+            status = "known"
+        else:
+            status = "fail"
+        verdicts[phase] = {"status": status, "timeExponent": time_k, "memoryExponent": memory_k,
+                           "bound": bound, "problems": problems}
+    return {"family": family.name, "description": family.description, "rows": rows, "verdicts": verdicts}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scale pathological inputs and check growth against bounds.")
+    parser.add_argument("--family", nargs="+", choices=[f.name for f in FAMILIES])
+    parser.add_argument("--sizes", nargs="+", type=int, default=[500, 1000, 2000, 4000, 8000, 16000])
+    parser.add_argument("--max-seconds", type=float, default=5.0, help="stop growing a family past this phase time")
+    parser.add_argument("--tolerance", type=float, default=0.35, help="allowed excess over the bound exponent")
+    parser.add_argument("--repeat", type=int, default=3, help="median of this many timed runs")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--strict", action="store_true", help="fail on known violations too")
+    parser.add_argument("--json", help="write the measurements and verdicts here")
+    args = parser.parse_args()
+
+    families = [f for f in FAMILIES if not args.family or f.name in args.family]
+    reports = [run_family(f, sorted(args.sizes), args.max_seconds, args.tolerance, args.repeat, not args.no_memory)
+               for f in families]
+
+    failed = 0
+    print(f"{'family':<28} {'phase':<10} {'time k':>7} {'mem k':>7} {'bound':>6}  status")
+    for report in reports:
+        family = next(f for f in families if f.name == report["family"])
+        for phase, verdict in report["verdicts"].items():
+            fmt = lambda k: f"{k:.2f}" if k is not None else "-"
+            line = (f"{report['family']:<28} {phase:<10} {fmt(verdict['timeExponent']):>7} "
+                    f"{fmt(verdict['memoryExponent']):>7} {verdict['bound']:>6g}  {verdict['status'].upper()}")
+            if verdict["problems"]:
+                line += ": " + "; ".join(verdict["problems"])
+            if verdict["status"] == "known":
+                line += f" ({family.known[phase]})"
+            print(line)
+            if verdict["status"] == "fail" or (args.strict and verdict["status"] == "known"):
+                failed += 1
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(reports, f, indent=2)
+    if failed:
+        print(f"{failed} phase(s) out of bounds")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
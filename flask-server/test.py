@@ -1,6 +1,8 @@
+import sys
+
 from lexical import Lexical  # Your lexer
 from parser import Parser  # Your parser
-from ast_utils import pretty_print  # Import the pretty_print function
+from ast_utils import render_tree  # Buffered AST renderer
 
 source_code = """
 int add(int a, int b) {
@@ -56,4 +58,4 @@ ast = parser.parse()
 
 
 print("\n=== AST ===")
-pretty_print(ast)
+render_tree(ast, sys.stdout)
@@ -0,0 +1,887 @@
+"""
+Transpiler from the C subset to Python source, run at CPython speed.
+
+    python transpile.py show FILE.c
+    python transpile.py run FILE.c [--max-steps N] [--max-seconds S]
+
+transpile(tree) emits a readable Python module: a `def` per C function
+with locals as Python locals (shadowing ones renamed x_2, x_3, ...),
+globals as module variables, `for` lowered to `while` with the increment
+repeated before each `continue`, and printf as a `%` format. int
+arithmetic wraps through _wrap(), `/` and `%` truncate toward zero through
+_div() and _mod(), and conversions go through _f2i() and _char(), with
+the semantics and errors of vm.py (a runtime error carries no source
+line). A switch whose cases all end in break, return or continue becomes
+an if/elif chain; any other switch becomes a loop over its bodies entered
+at the index a dispatch dict (or, for non-constant cases, an if chain)
+picks, so fall-through and `break` work as in C.
+
+The module only defines things; run() executes it in a fresh namespace
+holding the runtime helpers and calls _init(), which initializes globals
+and calls main. Every function and loop iteration subtracts its
+straight-line AST node count from _steps (see closures.straight_cost) and
+calls the helpers, which enforce the step, time and call depth limits,
+when it goes negative.
+
+Generated code is compiled with compile() and the code object cached by a
+hash of the C source text (code_cache), so running a program again skips
+lexing, parsing, code generation and compilation: see compile_source()
+and cached(). CPython's parser caps nesting at about 200 levels, so an
+expression nested deeper than that (a sum of hundreds of terms, say) is
+a CompileError here though vm.py runs it.
+"""
+
+import argparse
+import builtins
+import hashlib
+import keyword
+import sys
+import time
+
+from ast_nodes import *
+from closures import FunctionCache, straight_cost
+from optimizer import constant_value
+from vm import (COMPOUND, DEFAULT_MAX_DEPTH, DEFAULT_MAX_OUTPUT, DEFAULT_MAX_SECONDS, STORAGE, CompileError,
+                RunResult, VMError, divide, float_divide, float_to_int, parse_format, unescape, wrap_char, wrap_int)
+
+DEFAULT_MAX_STEPS = 10_000_000
+SLICE_STEPS = 1 << 16  # steps handed out between limit checks
+CACHE_SIZE = 256       # code objects kept by the default cache
+
+COMPARISONS = ('<', '<=', '>', '>=', '==', '!=')
+# Python names a C identifier must not become; the runtime's names all start with '_'
+_RESERVED = frozenset(keyword.kwlist) | frozenset(keyword.softkwlist) | frozenset(dir(builtins))
+
+# The only builtins generated code uses; nothing else is reachable from it
+_BUILTINS = {'float': float, 'int': int, 'chr': chr}
+
+code_cache = FunctionCache(CACHE_SIZE)
+
+
+def _wrap(value):
+    return value if -2147483648 <= value <= 2147483647 else wrap_int(value)
+
+
+def _div(a, b):
+    return divide(a, b, '/')
+
+
+def _mod(a, b):
+    return divide(a, b, '%')
+
+
+class TranspiledProgram:
+    def __init__(self, source, code):
+        self.source = source  # the generated Python
+        self.code = code      # its compiled module
+
+
+class _Runtime:
+    """Limits and output of one run; `globals` is the namespace generated code runs in, with its helpers."""
+
+    def __init__(self, max_steps, max_seconds, max_output, max_depth):
+        self.max_steps = max_steps
+        self.granted = min(SLICE_STEPS, max_steps)
+        self.deadline = time.perf_counter() + max_seconds
+        self.max_depth = max_depth
+        self.output = []
+        self.printed = 0
+        self.max_output = max_output
+        self.globals = {
+            '__builtins__': _BUILTINS, '_wrap': _wrap, '_div': _div, '_mod': _mod, '_fdiv': float_divide,
+            '_f2i': float_to_int, '_char': wrap_char, '_printf': self.printf, '_refill': self.refill,
+            '_check': self.check, '_steps': self.granted, '_depth': 0, '_MAX_DEPTH': max_depth,
+        }
+
+    def steps(self):
+        return self.granted - self.globals['_steps']
+
+    def refill(self):
+        used = self.steps()
+        if used > self.max_steps:
+            raise VMError(f"step limit of {self.max_steps} exceeded", 'instructions')
+        if time.perf_counter() > self.deadline:
+            raise VMError("time limit exceeded", 'seconds')
+        remaining = min(SLICE_STEPS, self.max_steps - used)
+        self.globals['_steps'] = remaining
+        self.granted = used + remaining
+
+    def check(self):
+        # Called on entry to a function once _steps or _depth is out of bounds
+        if self.globals['_depth'] > self.max_depth:
+            raise VMError(f"call depth limit of {self.max_depth} exceeded", 'depth')
+        if self.globals['_steps'] < 0:
+            self.refill()
+
+    def printf(self, text, *evaluated):
+        # Arguments beyond the format's conversions were evaluated for their side effects only
+        self.printed += len(text)
+        if self.printed > self.max_output:
+            self.output.append(text[:len(text) - (self.printed - self.max_output)])
+            raise VMError(f"output limit of {self.max_output} characters exceeded", 'output')
+        self.output.append(text)
+        return len(text)
+
+
+def _python_name(name, taken):
+    base = 'c' + name if name.startswith('_') else name + '_' if name in _RESERVED else name
+    candidate, n = base, 1
+    while candidate in taken:
+        n += 1
+        candidate = f"{base}_{n}"
+    return candidate
+
+
+def _literal(value):
+    # Python source for a number, and whether it can be an operand without parentheses
+    if isinstance(value, float) and value in (float('inf'), float('-inf')):
+        return ("-" if value < 0 else "") + "float('inf')", value > 0
+    return repr(value), value >= 0 and repr(value)[0] != '-'
+
+
+def _paren(text, atomic):
+    return text if atomic else f"({text})"
+
+
+def _kind(storage):
+    return 'float' if storage == 'float' else 'int'
+
+
+def _last_statement(node):
+    while isinstance(node, Block) and node.statements:
+        node = node.statements[-1]
+    return node
+
+
+class _Transpiler:
+    def __init__(self):
+        self.lines = []
+        self.indent = 0
+        self.module_names = set()
+        self.global_scope = {}  # C name -> (python name, storage), as far as declared
+        self.signatures = {}    # C name -> (python name, return storage or 'void', [param storage])
+        self.tables = []        # module-level dispatch dicts
+        self.switches = 0       # numbers the temporaries of each switch
+        self.scopes = [{}]      # local scopes of the function being emitted
+        self.return_type = 'int'
+        self.written = set()    # globals the current function assigns
+        self.budgeted = False   # whether it charges steps in a loop
+        self.jumps = []         # enclosing loops and switches, innermost last (see continue_lines())
+
+    def emit(self, text):
+        self.lines.append('    ' * self.indent + text)
+
+    def suite(self, node):
+        # The statement as an indented block, `pass` if it emitted nothing
+        self.indent += 1
+        before = len(self.lines)
+        self.statement(node)
+        if len(self.lines) == before:
+            self.emit("pass")
+        self.indent -= 1
+
+    def capture(self, emit):
+        # Lines emit() produces, without indentation, instead of emitting them
+        lines, indent = self.lines, self.indent
+        self.lines, self.indent = [], 0
+        emit()
+        captured, self.lines, self.indent = self.lines, lines, indent
+        return captured
+
+
+    def storage(self, declared, line):
+        storage = STORAGE.get(declared)
+        if storage is None:
+            raise CompileError(f"Type '{declared}' at line {line} cannot hold a value.")
+        return storage
+
+    def declare(self, name, storage):
+        active = {python for scope in self.scopes for python, _ in scope.values()}
+        python = _python_name(name, self.module_names | active)
+        self.scopes[-1][name] = (python, storage)
+        return python
+
+    def resolve(self, name, line):
+        for scope in reversed(self.scopes or []):
+            if name in scope:
+                return scope[name][0], scope[name][1], False
+        if name in self.global_scope:
+            return self.global_scope[name][0], self.global_scope[name][1], True
+        raise CompileError(f"Variable '{name}' at line {line} is not declared.")
+
+    def budget(self, cost):
+        self.budgeted = True
+        self.emit(f"_steps -= {cost}")
+        self.emit("if _steps < 0:")
+        self.emit("    _refill()")
+
+    # Program
+
+    def program(self, tree):
+        statements = tree.statements if isinstance(tree, Program) else tree
+        if not isinstance(statements, list):
+            statements = [statements]
+        if any(stmt is None for stmt in statements):
+            raise CompileError("Cannot run a program with parse errors.")
+
+        functions = []
+        for stmt in statements:
+            if isinstance(stmt, FunctionDeclaration):
+                if stmt.name in self.signatures or stmt.name == 'printf':
+                    raise CompileError(f"Function '{stmt.name}' at line {stmt.line} is defined twice.")
+                if stmt.body is None:
+                    raise CompileError(f"Function '{stmt.name}' at line {stmt.line} has no body.")
+                params = [(self.storage(t, stmt.line), name) for t, name in stmt.parameters]
+                return_type = 'void' if stmt.return_type == 'void' else self.storage(stmt.return_type, stmt.line)
+                python = 'main' if stmt.name == 'main' else _python_name(stmt.name, self.module_names | {'main'})
+                self.module_names.add(python)
+                self.signatures[stmt.name] = (python, return_type, [storage for storage, _ in params])
+                functions.append((stmt, python, params, return_type))
+        if 'main' not in self.signatures:
+            raise CompileError("The program has no main function.")
+
+        # Globals start at zero, or at a constant initializer when no code can run before it
+        defaults = []
+        all_globals = {}
+        code_before = False
+        for stmt in statements:
+            if isinstance(stmt, VariableDeclaration):
+                storage = self.storage(stmt.var_type, stmt.line)
+                python = _python_name(stmt.name, self.module_names)
+                self.module_names.add(python)
+                all_globals[stmt.name] = (python, storage)
+                value = self.constant(stmt.initializer, storage) if stmt.initializer is not None else None
+                if value is not None and not code_before:
+                    defaults.append(f"{python} = {_literal(value)[0]}")
+                else:
+                    defaults.append(f"{python} = {_literal(0.0 if storage == 'float' else 0)[0]}")
+                    code_before = code_before or stmt.initializer is not None
+            elif not isinstance(stmt, FunctionDeclaration):
+                code_before = True
+
+        self.global_scope = all_globals
+        bodies = []
+        for stmt, python, params, return_type in functions:
+            bodies.append(self.capture(lambda: self.function(stmt, python, params, return_type)))
+
+        # As in vm.py, top-level code sees only the globals declared before it
+        self.global_scope = {}
+        self.scopes = [{}]
+        self.return_type = 'int'
+        self.written = set()
+        self.budgeted = False
+        code_before = False
+        init = []
+        for stmt in statements:
+            if isinstance(stmt, VariableDeclaration):
+                storage = all_globals[stmt.name][1]
+                if stmt.initializer is not None and (code_before or self.constant(stmt.initializer, storage) is None):
+                    value = self.converted(stmt.initializer, storage, stmt.line or 0)[0]
+                    init.append(f"{all_globals[stmt.name][0]} = {value}")
+                    self.written.add(all_globals[stmt.name][0])
+                    code_before = True
+                self.global_scope[stmt.name] = all_globals[stmt.name]
+            elif not isinstance(stmt, FunctionDeclaration):
+                self.indent = 0
+                init += self.capture(lambda: self.statement(stmt))
+                code_before = True
+
+        lines = ["# Transpiled from C by transpile.py", ""]
+        lines += self.tables + defaults
+        for body in bodies:
+            lines += ["", ""] + body
+        lines += ["", "", "def _init():"]
+        written = sorted(self.written | ({'_steps'} if self.budgeted else set()))
+        if written:
+            lines.append(f"    global {', '.join(written)}")
+        lines += ['    ' + line for line in init]
+        lines.append("    return main()")
+        return '\n'.join(lines) + '\n'
+
+    def constant(self, node, storage):
+        # The value a literal initializer stores, or None
+        if isinstance(node, Number):
+            value = constant_value(node)
+        elif isinstance(node, CharNode):
+            text = unescape(node.value)
+            value = wrap_char(ord(text)) if len(text) == 1 else None
+        else:
+            value = None
+        if value is None:
+            return None
+        if storage == 'float':
+            return float(value)
+        if isinstance(value, float):
+            try:
+                value = float_to_int(value)
+            except VMError:
+                return None
+        return wrap_char(value) if storage == 'char' else wrap_int(value)
+
+    def function(self, node, python, params, return_type):
+        self.scopes = [{}]
+        self.written = set()
+        self.jumps = []
+        self.return_type = return_type
+        names = [self.declare(name, storage) for storage, name in params]
+        self.emit(f"def {python}({', '.join(names)}):")
+        self.indent = 2
+        body = self.capture(lambda: self.statement(node.body))
+        self.indent = 1
+        if self.written:
+            self.emit(f"global _steps, _depth, {', '.join(sorted(self.written))}")
+        else:
+            self.emit("global _steps, _depth")
+        self.emit(f"_steps -= {max(1, straight_cost(node.body))}")
+        self.emit("_depth += 1")
+        self.emit("if _steps < 0 or _depth > _MAX_DEPTH:")
+        self.emit("    _check()")
+        self.emit("try:")
+        self.indent = 2
+        for line in body:
+            self.emit(line)
+        if return_type != 'void' and not isinstance(_last_statement(node.body), ReturnStatement):
+            # Falling off the end returns zero (main's exit status in C99)
+            self.emit(f"return {'0.0' if return_type == 'float' else '0'}")
+        elif not body:
+            self.emit("pass")
+        self.indent = 1
+        self.emit("finally:")
+        self.emit("    _depth -= 1")
+        self.indent = 0
+
+    # Statements
+
+    def statement(self, node):
+        if node is None:
+            raise CompileError("Cannot run a program with parse errors.")
+        line = node.line or 0
+        if isinstance(node, Block):
+            self.scopes.append({})
+            for stmt in node.statements:
+                self.statement(stmt)
+            self.scopes.pop()
+        elif isinstance(node, VariableDeclaration):
+            storage = self.storage(node.var_type, line)
+            if node.initializer is not None:
+                # The initializer is evaluated before the name comes into scope
+                value = self.converted(node.initializer, storage, line)[0]
+            else:
+                value = '0.0' if storage == 'float' else '0'
+            self.emit(f"{self.declare(node.name, storage)} = {value}")
+        elif isinstance(node, ExpressionStatement):
+            if node.expression is not None:
+                self.expression_statement(node.expression)
+        elif isinstance(node, IfStatement):
+            self.emit(f"if {self.condition(node.condition, line)[0]}:")
+            self.suite(node.then_branch)
+            other = node.else_branch
+            while isinstance(other, IfStatement):
+                self.emit(f"elif {self.condition(other.condition, other.line or line)[0]}:")
+                self.suite(other.then_branch)
+                other = other.else_branch
+            if other is not None:
+                self.emit("else:")
+                self.suite(other)
+        elif isinstance(node, WhileStatement):
+            self.loop(node.condition, node.body, [], line)
+        elif isinstance(node, ForStatement):
+            self.scopes.append({})
+            if node.init is not None:
+                self.statement(node.init)
+            step = self.capture(lambda: self.expression_statement(node.increment)) if node.increment else []
+            self.loop(node.condition, node.body, step, line, node.increment)
+            self.scopes.pop()
+        elif isinstance(node, SwitchStatement):
+            self.switch(node, line)
+        elif isinstance(node, BreakStatement):
+            if not self.jumps:
+                raise CompileError(f"'break' at line {line} is not inside a loop or switch.")
+            self.emit("break")
+        elif isinstance(node, ContinueStatement):
+            lines = self.continue_lines()
+            if lines is None:
+                raise CompileError(f"'continue' at line {line} is not inside a loop.")
+            for text in lines:
+                self.emit(text)
+        elif isinstance(node, ReturnStatement):
+            return_type = self.return_type
+            if node.value is None or return_type == 'void':
+                if node.value is not None:
+                    self.expression_statement(node.value)
+                self.emit("return" if return_type == 'void' else f"return {'0.0' if return_type == 'float' else '0'}")
+            else:
+                self.emit(f"return {self.converted(node.value, return_type, line)[0]}")
+        elif isinstance(node, FunctionDeclaration):
+            raise CompileError(f"Function '{node.name}' at line {line} is defined inside another function.")
+        else:
+            raise CompileError(f"Cannot run {type(node).__name__} at line {line}.")
+
+    def loop(self, condition, body, step, line, increment=None):
+        test = self.condition(condition, line)[0] if condition is not None else "True"
+        self.emit(f"while {test}:")
+        self.indent += 1
+        self.budget(max(1, straight_cost(condition) + straight_cost(body) + straight_cost(increment)))
+        self.jumps.append(('loop', step))
+        self.statement(body)
+        self.jumps.pop()
+        if not isinstance(_last_statement(body), (BreakStatement, ContinueStatement, ReturnStatement)):
+            for text in step:
+                self.emit(text)
+        self.indent -= 1
+
+    def continue_lines(self, depth=None):
+        # What `continue` becomes inside self.jumps[:depth]: the loop's increment then `continue`,
+        # or, inside a switch lowered to a loop, setting its flag and breaking out of it
+        jumps = self.jumps if depth is None else self.jumps[:depth]
+        for index in range(len(jumps) - 1, -1, -1):
+            kind, data = jumps[index]
+            if kind == 'loop':
+                return data + ["continue"]
+            if kind == 'switch':
+                data.append(True)  # the flag is used
+                return [f"{data[0]} = True", "break"]
+        return None
+
+    def switch(self, node, line):
+        value, atomic = self.converted(node.expression, 'int', line)
+        self.switches += 1
+        number = self.switches
+        cases = list(node.cases)
+        bodies = [case.body for case in cases] + ([node.default.body] if node.default is not None else [])
+        # Cases with nothing to run fall into the next one, so they share its body
+        groups = []
+        pending = []
+        for index, body in enumerate(bodies):
+            pending.append(index)
+            if _statements(body) or index == len(bodies) - 1:
+                groups.append((pending, body))
+                pending = []
+
+        chain = all(isinstance(_last_statement(body), (BreakStatement, ReturnStatement, ContinueStatement))
+                    for _, body in groups[:-1]) and \
+            not any(_breaks(body, allow_last=True) for _, body in groups)
+        simple = isinstance(node.expression, VariableNode) and all(
+            isinstance(case.value, (Number, CharNode)) for case in cases)
+        if not simple:
+            name = f"_switch{number}"
+            self.emit(f"{name} = {value}")
+            value, atomic = name, True
+
+        if chain:
+            keyword_ = "if"
+            for indexes, body in groups:
+                tests = [f"{_paren(value, atomic)} == {self.converted(cases[i].value, 'int', line)[0]}"
+                         for i in indexes if i < len(cases)]
+                if len(tests) < len(indexes):
+                    # The group includes the default
+                    tests = []
+                    if keyword_ == "elif":
+                        self.emit("else:")
+                else:
+                    self.emit(f"{keyword_} {' or '.join(tests)}:")
+                statements = _statements(body)
+                if isinstance(_last_statement(body), BreakStatement):
+                    statements = statements[:-1]
+                # A switch with only a default runs it unconditionally
+                nested = keyword_ == "elif" or tests
+                self.jumps.append(('chain', None))
+                self.indent += 1 if nested else 0
+                self.scopes.append({})
+                before = len(self.lines)
+                for stmt in statements:
+                    self.statement(stmt)
+                if len(self.lines) == before and nested:
+                    self.emit("pass")
+                self.scopes.pop()
+                self.indent -= 1 if nested else 0
+                self.jumps.pop()
+                keyword_ = "elif"
+            return
+
+        # Fall-through: a loop over the bodies, entered at the selected one
+        index = f"_case{number}"
+        default = len(cases)
+        constants = [self.constant(case.value, 'int') for case in cases]
+        if all(c is not None for c in constants):
+            table = {}
+            for i, c in enumerate(constants):
+                table.setdefault(c, i)  # the first of duplicate cases wins
+            name = f"_SWITCH{number}"
+            self.tables.append(f"{name} = {{{', '.join(f'{k}: {v}' for k, v in table.items())}}}")
+            self.emit(f"{index} = {name}.get({value}, {default})")
+        else:
+            for i, case in enumerate(cases):
+                test = self.converted(case.value, 'int', case.line or line)[0]
+                self.emit(f"{'if' if i == 0 else 'elif'} {_paren(value, atomic)} == {test}:")
+                self.emit(f"    {index} = {i}")
+            if cases:
+                self.emit("else:")
+                self.emit(f"    {index} = {default}")
+            else:
+                self.emit(f"{index} = {default}")
+        flag = [f"_continue{number}"]
+        position = len(self.lines)
+        self.emit("while True:")
+        self.indent += 1
+        self.jumps.append(('switch', flag))
+        for i, body in enumerate(bodies):
+            self.emit(f"if {index} <= {i}:")
+            self.suite(body)
+        self.jumps.pop()
+        self.emit("break")
+        self.indent -= 1
+        if len(flag) > 1:
+            self.lines.insert(position, '    ' * self.indent + f"{flag[0]} = False")
+            self.emit(f"if {flag[0]}:")
+            self.indent += 1
+            for text in self.continue_lines():
+                self.emit(text)
+            self.indent -= 1
+
+    # Expressions
+
+    def expression_statement(self, node):
+        line = node.line or 0
+        if isinstance(node, BinaryOperation) and node.operator == '=' or \
+                isinstance(node, AssignmentExpression):
+            target, value = self.assignment(node, line)
+            self.emit(f"{target} = {value}")
+            return
+        if isinstance(node, UnaryOperation) and node.operator in ('++', '--'):
+            target, storage = self.target(node.operand, line)
+            self.emit(f"{target} = {self.stepped(target, storage, node.operator)}")
+            return
+        text, kind, _ = self.expression(node)
+        self.emit(text)
+
+    def expression(self, node):
+        # (Python source, type, atomic): type is 'int', 'float', 'str' or 'void'; atomic source
+        # needs no parentheses as an operand
+        if node is None:
+            raise CompileError("Cannot run a program with parse errors.")
+        line = node.line or 0
+        if isinstance(node, Number):
+            value = constant_value(node)
+            if value is None:
+                raise CompileError(f"'{node.value}' at line {line} is not a valid number.")
+            value = value if isinstance(value, float) else wrap_int(value)
+            return _literal(value)[0], 'float' if isinstance(value, float) else 'int', _literal(value)[1]
+        if isinstance(node, CharNode):
+            text = unescape(node.value)
+            if len(text) != 1:
+                raise CompileError(f"'{node.value}' at line {line} is not a single character.")
+            return str(wrap_char(ord(text))), 'int', wrap_char(ord(text)) >= 0
+        if isinstance(node, StringNode):
+            return repr(unescape(node.value)), 'str', True
+        if isinstance(node, VariableNode):
+            python, storage, _ = self.resolve(node.name, line)
+            return python, _kind(storage), True
+        if isinstance(node, BinaryOperation):
+            if node.operator == '=':
+                target, value = self.assignment(node, line)
+                return f"({target} := {value})", self.resolve_kind(node.left, line), True
+            if node.operator in ('&&', '||') or node.operator in COMPARISONS:
+                return f"1 if {self.condition(node, line)[0]} else 0", 'int', False
+            return self.arithmetic(node.operator, self.expression(node.left), self.expression(node.right), line)
+        if isinstance(node, AssignmentExpression):
+            target, value = self.assignment(node, line)
+            return f"({target} := {value})", self.resolve_kind(node.left, line), True
+        if isinstance(node, UnaryOperation):
+            if node.operator in ('++', '--'):
+                target, storage = self.target(node.operand, line)
+                new = self.stepped(target, storage, node.operator)
+                if node.postfix:
+                    return f"({target}, ({target} := {new}))[0]", _kind(storage), True
+                return f"({target} := {new})", _kind(storage), True
+            if node.operator == '!':
+                return f"1 if {self.condition(node, line)[0]} else 0", 'int', False
+            if node.operator == '-' and isinstance(node.operand, Number) and constant_value(node.operand) is not None:
+                value = constant_value(node.operand)
+                value = -value if isinstance(value, float) else wrap_int(-wrap_int(value))
+                return _literal(value)[0], 'float' if isinstance(value, float) else 'int', _literal(value)[1]
+            text, kind, atomic = self.expression(node.operand)
+            if kind in ('str', 'void'):
+                raise CompileError(f"Operator '{node.operator}' at line {line} needs a number.")
+            if node.operator == '-':
+                if kind == 'float':
+                    return f"-{_paren(text, atomic)}", kind, False
+                return f"_wrap(-{_paren(text, atomic)})", kind, True
+            if node.operator == '~':
+                if kind == 'float':
+                    raise CompileError(f"Operator '~' at line {line} needs an integer.")
+                return f"~{_paren(text, atomic)}", kind, False
+            if node.operator == '+':
+                return text, kind, atomic
+            raise CompileError(f"Unknown operator '{node.operator}' at line {line}.")
+        if isinstance(node, FunctionCallNode):
+            return self.call(node, line)
+        raise CompileError(f"Cannot run {type(node).__name__} at line {line}.")
+
+    def condition(self, node, line, error=None):
+        # (Python source, atomic) for the truth of node, as used by `if` and `while`; `error` is
+        # the message when node is not a number
+        if isinstance(node, BinaryOperation) and node.operator in COMPARISONS:
+            left, right = self.expression(node.left), self.expression(node.right)
+            if {left[1], right[1]} & {'str', 'void'}:
+                raise CompileError(f"Operator '{node.operator}' at line {line} needs numbers.")
+            return f"{_paren(left[0], left[2])} {node.operator} {_paren(right[0], right[2])}", False
+        if isinstance(node, BinaryOperation) and node.operator in ('&&', '||'):
+            error = f"Operator '{node.operator}' at line {line} needs numbers."
+            left, right = self.condition(node.left, line, error), self.condition(node.right, line, error)
+            joined = ' and ' if node.operator == '&&' else ' or '
+            return _paren(*left) + joined + _paren(*right), False
+        if isinstance(node, UnaryOperation) and node.operator == '!':
+            operand = self.condition(node.operand, line, f"Operator '!' at line {line} needs a number.")
+            return f"not {_paren(*operand)}", False
+        text, kind, atomic = self.expression(node)
+        if kind in ('str', 'void'):
+            raise CompileError(error or f"The condition at line {line} is not a number.")
+        return text, atomic
+
+    def arithmetic(self, op, left, right, line):
+        (a, left_kind, a_atomic), (b, right_kind, b_atomic) = left, right
+        if {left_kind, right_kind} & {'str', 'void'}:
+            raise CompileError(f"Operator '{op}' at line {line} needs numbers.")
+        a, b = _paren(a, a_atomic), _paren(b, b_atomic)
+        if left_kind == 'float' or right_kind == 'float':
+            if op in ('+', '-', '*'):
+                return f"{a} {op} {b}", 'float', False
+            if op == '/':
+                return f"_fdiv({left[0]}, {right[0]})", 'float', True
+            if op == '%':
+                raise CompileError(f"Operator '%' at line {line} needs integers.")
+            raise CompileError(f"Unknown operator '{op}' at line {line}.")
+        if op in ('+', '-', '*'):
+            return f"_wrap({a} {op} {b})", 'int', True
+        if op in ('/', '%'):
+            return f"{'_div' if op == '/' else '_mod'}({left[0]}, {right[0]})", 'int', True
+        raise CompileError(f"Unknown operator '{op}' at line {line}.")
+
+    def converted(self, node, storage, line):
+        constant = self.constant(node, storage) if isinstance(node, (Number, CharNode)) else None
+        if constant is not None:
+            return _literal(constant)
+        text, kind, atomic = self.expression(node)
+        return self.convert(text, kind, atomic, storage, line)
+
+    def convert(self, text, kind, atomic, storage, line):
+        # (Python source, atomic) of the value converted for a variable of `storage` type
+        if kind == 'str':
+            raise CompileError(f"A string at line {line} can only be passed to printf.")
+        if kind == 'void':
+            raise CompileError(f"A void value at line {line} is used.")
+        if storage == 'float':
+            return (text, atomic) if kind == 'float' else (f"float({text})", True)
+        if kind == 'float':
+            text, atomic = f"_f2i({text})", True
+        if storage == 'char':
+            return f"_char({text})", True
+        return text, atomic
+
+    def target(self, node, line):
+        # Python name and storage of an assigned variable, noting the globals a function writes
+        if not isinstance(node, VariableNode):
+            raise CompileError(f"The left side of the assignment at line {line} is not a variable.")
+        python, storage, is_global = self.resolve(node.name, line)
+        if is_global:
+            self.written.add(python)
+        return python, storage
+
+    def resolve_kind(self, node, line):
+        while isinstance(node, BinaryOperation) and node.operator == '=':
+            node = node.left
+        return _kind(self.resolve(node.name, line)[1])
+
+    def assignment(self, node, line):
+        # (target, value source) for '=', including ((a = b) = c), and compound assignments
+        if node.operator == '=':
+            left, right = node.left, node.right
+            # ((a = b) = c) from the parser's left-associative '=' means a = (b = c)
+            while isinstance(left, BinaryOperation) and left.operator == '=':
+                inner = BinaryOperation('=', left.right, right)
+                inner.line = line
+                left, right = left.left, inner
+            target, storage = self.target(left, line)
+            return target, self.converted(right, storage, line)[0]
+        target, storage = self.target(node.left, line)
+        value = self.arithmetic(COMPOUND[node.operator], (target, _kind(storage), True), self.expression(node.right),
+                                line)
+        return target, self.convert(*value, storage, line)[0]
+
+    def stepped(self, target, storage, operator):
+        # Source for the variable's value after ++ or --
+        sign = '+' if operator == '++' else '-'
+        if storage == 'float':
+            return f"{target} {sign} 1.0"
+        return f"{'_char' if storage == 'char' else '_wrap'}({target} {sign} 1)"
+
+    def call(self, node, line):
+        if node.name == 'printf':
+            if not node.args or not isinstance(node.args[0], StringNode):
+                raise CompileError(f"printf at line {line} needs a string literal format.")
+            pieces = parse_format(unescape(node.args[0].value), line)
+            conversions = [piece[1] for piece in pieces if not isinstance(piece, str)]
+            if len(node.args) - 1 < len(conversions):
+                raise CompileError(f"printf at line {line} has {len(conversions)} conversion(s) "
+                                   f"but {len(node.args) - 1} argument(s).")
+            args = []
+            for arg, conversion in zip(node.args[1:], conversions + [None] * len(node.args)):
+                text, kind, atomic = self.expression(arg)
+                if kind == 'void' or (conversion is not None and (kind == 'str') != (conversion == 's')):
+                    raise CompileError(f"printf argument at line {line} does not match its '%{conversion}' conversion.")
+                # The conversions of vm.format_printf
+                if conversion is None or conversion == 's' or (conversion in 'di' and kind == 'int'):
+                    args.append(text)
+                elif conversion in 'di':
+                    args.append(f"int({text})")
+                elif conversion in 'uoxX':
+                    args.append(f"{_paren(text, atomic) if kind == 'int' else f'int({text})'} & 0xFFFFFFFF")
+                elif conversion == 'c':
+                    args.append(f"chr({_paren(text, atomic) if kind == 'int' else f'int({text})'} & 0xFF)")
+                else:
+                    args.append(text if kind == 'float' else f"float({text})")
+            fmt = ''.join(piece.replace('%', '%%') if isinstance(piece, str) else piece[0] for piece in pieces)
+            if conversions:
+                values = args[:len(conversions)]
+                formatted = f"{fmt!r} % ({values[0]},)" if len(values) == 1 else f"{fmt!r} % ({', '.join(values)})"
+            else:
+                formatted = repr(''.join(pieces))
+            return f"_printf({', '.join([formatted] + args[len(conversions):])})", 'int', True
+
+        signature = self.signatures.get(node.name)
+        if signature is None:
+            raise CompileError(f"Function '{node.name}' at line {line} is not defined.")
+        python, return_type, params = signature
+        if len(node.args) != len(params):
+            raise CompileError(f"Function '{node.name}' at line {line} takes {len(params)} "
+                               f"argument(s), not {len(node.args)}.")
+        args = [self.converted(arg, storage, line)[0] for arg, storage in zip(node.args, params)]
+        kind = 'void' if return_type == 'void' else _kind(return_type)
+        return f"{python}({', '.join(args)})", kind, True
+
+
+def _statements(body):
+    return body.statements if isinstance(body, Block) else [body]
+
+
+def _breaks(node, allow_last=False):
+    # True if node has a `break` for an enclosing switch (not inside a nested loop or switch),
+    # other than its last statement when allow_last
+    statements = _statements(node)
+    if allow_last and statements and isinstance(statements[-1], BreakStatement):
+        statements = statements[:-1]
+    stack = list(statements)
+    while stack:
+        item = stack.pop()
+        if isinstance(item, BreakStatement):
+            return True
+        if isinstance(item, Block):
+            stack.extend(item.statements)
+        elif isinstance(item, IfStatement):
+            stack.extend(x for x in (item.then_branch, item.else_branch) if x is not None)
+    return False
+
+
+def transpile(tree):
+    """Python source for a parsed tree; raises CompileError for programs it cannot run."""
+    try:
+        return _Transpiler().program(tree)
+    except RecursionError:
+        raise CompileError("The program is nested too deeply to compile.") from None
+
+
+def _source_key(source):
+    return hashlib.sha256(source.encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+def compile_program(tree, source=None, cache=code_cache):
+    """Transpile and compile a parsed tree; with its C source, the result is cached under the source's hash."""
+    python = transpile(tree)
+    try:
+        code = compile(python, '<transpiled>', 'exec')
+    except (SyntaxError, RecursionError, MemoryError):
+        # CPython's parser limits how deeply expressions nest
+        raise CompileError("The program is nested too deeply to compile.") from None
+    program = TranspiledProgram(python, code)
+    if source is not None and cache is not None:
+        cache.put(_source_key(source), program)
+    return program
+
+
+def cached(source, cache=code_cache):
+    """The compiled program for this exact C source if the cache holds it, else None."""
+    return cache.get(_source_key(source)) if cache is not None else None
+
+
+def compile_source(source, cache=code_cache):
+    """Compile C source text, from the cache when possible; raises CompileError listing lexical or syntax errors."""
+    program = cached(source, cache)
+    if program is not None:
+        return program
+    import contextlib
+    import io
+    from lexical import Lexical
+    from parser import Parser
+    tokens, lexical_errors = Lexical(source).get_tokens()
+    with contextlib.redirect_stdout(io.StringIO()):
+        parser = Parser(tokens)
+        tree = parser.parse()
+    errors = list(lexical_errors) + list(parser.errors)
+    if errors:
+        raise CompileError(f"{len(errors)} error(s) before compiling, first: {errors[0]}")
+    return compile_program(tree, source, cache)
+
+
+def run(program, max_steps=DEFAULT_MAX_STEPS, max_seconds=DEFAULT_MAX_SECONDS, max_output=DEFAULT_MAX_OUTPUT,
+        max_depth=DEFAULT_MAX_DEPTH):
+    """Run a TranspiledProgram and return a RunResult (instructions counts steps); errors are reported in it."""
+    needed = max_depth + 1000
+    if sys.getrecursionlimit() < needed:
+        sys.setrecursionlimit(needed)  # only ever raised, other threads may be running generated code
+    runtime = _Runtime(max_steps, max_seconds, max_output, max_depth)
+    started = time.perf_counter()
+    try:
+        exec(program.code, runtime.globals)
+        exit_code = runtime.globals['_init']()
+        if exit_code is None:
+            exit_code = 0  # a void main
+        error = limit = None
+    except VMError as e:
+        exit_code, error, limit = None, str(e), e.limit
+    except RecursionError:
+        exit_code, error, limit = None, "expressions or calls nested too deeply", 'depth'
+    return RunResult(''.join(runtime.output), exit_code, min(runtime.steps(), max_steps),
+                     time.perf_counter() - started, error, limit)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transpile a C-subset program to Python and show or run it.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    show_parser = sub.add_parser("show")
+    show_parser.add_argument("file")
+    run_parser = sub.add_parser("run")
+    run_parser.add_argument("file")
+    run_parser.add_argument("--max-steps", type=int, default=DEFAULT_MAX_STEPS)
+    run_parser.add_argument("--max-seconds", type=float, default=DEFAULT_MAX_SECONDS)
+    args = parser.parse_args()
+
+    with open(args.file) as f:
+        source = f.read()
+    try:
+        program = compile_source(source)
+    except CompileError as e:
+        sys.exit(f"error: {e}")
+    if args.command == "show":
+        print(program.source, end='')
+        return
+    result = run(program, args.max_steps, args.max_seconds)
+    sys.stdout.write(result.output)
+    if result.error is not None:
+        sys.exit(f"error: {result.error}")
+    print(f"[exit {result.exit_code}, {result.instructions} steps, {result.seconds:.3f}s]", file=sys.stderr)
+    sys.exit(result.exit_code & 0xFF)
+
+
+if __name__ == "__main__":
+    main()
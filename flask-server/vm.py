@@ -0,0 +1,949 @@
+"""
+Bytecode compiler and stack virtual machine for running analyzed programs.
+
+    python vm.py run FILE.c [--max-instructions N] [--max-seconds S]
+    python vm.py dis FILE.c
+
+compile_program(tree) compiles the parser's tree (the top-level statement
+list from Parser.parse, or a Program) to a Bytecode object: one array('i')
+instruction stream for all functions, each opcode followed by its
+operands, a constant pool and a table of functions. run(bytecode) executes
+it in a single dispatch loop with an operand stack and one list of slots
+per call frame, and returns a RunResult with the program's output and
+exit code.
+
+The language is the subset Parser accepts: int, char, float and double
+variables (char wraps to 8 bits, int to 32 bits, float and double are both
+Python floats), functions with recursion, if/else, while, for, switch with
+fall-through, break, continue and return. printf is the only library
+function; its format must be a string literal and is checked when
+compiling (conversions d i u o x X c s f F e E g G and %%, with flags,
+width and precision). Statements outside functions run before main, in
+source order, as global initializers do.
+
+Conditions C leaves undefined are reported instead of guessed: division
+or % by zero, a float too large for an int, calls nested deeper than
+max_depth. Runs are bounded by max_instructions, max_seconds and
+max_output (characters printed); exceeding one stops the program with an
+error in the RunResult naming the limit, keeping the output so far.
+Uninitialized variables start at zero.
+"""
+
+import argparse
+import math
+import re
+import sys
+import time
+from array import array
+
+from ast_nodes import *
+from optimizer import constant_value
+
+# Opcodes, with the number of operands each takes from the following code cells
+OPCODES = (
+    ('POP', 0), ('DUP', 0), ('IADD', 0), ('ISUB', 0), ('IMUL', 0), ('IDIV', 0), ('IMOD', 0), ('INEG', 0),
+    ('FADD', 0), ('FSUB', 0), ('FMUL', 0), ('FDIV', 0), ('FNEG', 0),
+    ('LT', 0), ('LE', 0), ('GT', 0), ('GE', 0), ('EQ', 0), ('NE', 0), ('NOT', 0), ('BITNOT', 0),
+    ('I2F', 0), ('I2F2', 0), ('F2I', 0), ('TOCHAR', 0), ('RET', 0),
+    ('CONST', 1), ('LOAD', 1), ('STORE', 1), ('LOADG', 1), ('STOREG', 1),
+    ('JUMP', 1), ('JUMPIF', 1), ('JUMPIFNOT', 1), ('CALL', 1), ('PRINTF', 2), ('INCLOCAL', 2),
+    # A comparison fused with the JUMPIFNOT after it: jump unless a < b, and so on
+    ('JUMPNLT', 1), ('JUMPNLE', 1), ('JUMPNGT', 1), ('JUMPNGE', 1), ('JUMPNEQ', 1), ('JUMPNNE', 1),
+)
+OPCODE_NAMES = tuple(name for name, _ in OPCODES)
+OPERAND_COUNTS = tuple(count for _, count in OPCODES)
+(POP, DUP, IADD, ISUB, IMUL, IDIV, IMOD, INEG, FADD, FSUB, FMUL, FDIV, FNEG,
+ LT, LE, GT, GE, EQ, NE, NOT, BITNOT, I2F, I2F2, F2I, TOCHAR, RET,
+ CONST, LOAD, STORE, LOADG, STOREG, JUMP, JUMPIF, JUMPIFNOT, CALL, PRINTF, INCLOCAL,
+ JUMPNLT, JUMPNLE, JUMPNGT, JUMPNGE, JUMPNEQ, JUMPNNE) = range(len(OPCODES))
+
+INT_MIN, INT_MAX = -2 ** 31, 2 ** 31 - 1
+
+# Declared type -> storage type; values of every storage type but float are ints
+STORAGE = {'int': 'int', 'char': 'char', 'float': 'float', 'double': 'float'}
+ARITHMETIC = {'+': (IADD, FADD), '-': (ISUB, FSUB), '*': (IMUL, FMUL), '/': (IDIV, FDIV), '%': (IMOD, None)}
+COMPARISONS = {'<': LT, '<=': LE, '>': GT, '>=': GE, '==': EQ, '!=': NE}
+COMPOUND = {'+=': '+', '-=': '-', '*=': '*', '/=': '/', '%=': '%'}
+
+DEFAULT_MAX_INSTRUCTIONS = 10_000_000
+DEFAULT_MAX_SECONDS = 5.0
+DEFAULT_MAX_OUTPUT = 1024 * 1024
+DEFAULT_MAX_DEPTH = 1000
+CHECK_INTERVAL = 1 << 16  # instructions between clock checks
+
+
+class CompileError(Exception):
+    pass
+
+
+class VMError(Exception):
+    def __init__(self, message, limit=None):
+        super().__init__(message)
+        self.limit = limit  # 'instructions', 'seconds', 'output' or 'depth' when a limit was hit
+
+
+def wrap_int(value):
+    return (value - INT_MIN) % 2 ** 32 + INT_MIN
+
+
+def wrap_char(value):
+    return (value + 128) % 256 - 128
+
+
+def float_to_int(value):
+    if value != value or value in (math.inf, -math.inf) or not INT_MIN <= int(value) <= INT_MAX:
+        raise VMError(f"float value {value!r} does not fit in an int")
+    return int(value)
+
+
+def divide(a, b, op):
+    # C integer division and remainder, truncating toward zero
+    if b == 0:
+        raise VMError("division by zero" if op == '/' else "remainder by zero")
+    quotient = abs(a) // abs(b)
+    if (a < 0) != (b < 0):
+        quotient = -quotient
+    return wrap_int(quotient) if op == '/' else a - b * quotient
+
+
+def float_divide(a, b):
+    if b == 0:
+        if a == 0 or a != a:
+            return math.nan
+        return math.copysign(math.inf, a) * math.copysign(1.0, b)
+    return a / b
+
+
+_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', '0': '\0', 'a': '\a', 'b': '\b', 'f': '\f', 'v': '\v',
+            '\\': '\\', "'": "'", '"': '"', '?': '?'}
+_ESCAPE = re.compile(r'\\(.)')
+
+
+def unescape(text):
+    # The lexer keeps backslash escapes in string and char literals as written
+    return _ESCAPE.sub(lambda m: _ESCAPES.get(m.group(1), m.group(1)), text)
+
+
+_CONVERSION = re.compile(r'%([-+ #0]*)(\d*)(?:\.(\d*))?(?:hh|h|ll|l|L|z|j|t)?(.)', re.S)
+_NUMERIC = 'diuoxXcfFeEgG'
+
+
+def parse_format(fmt, line):
+    """Split a printf format into literal text and (python format, conversion) pieces."""
+    pieces = []
+    position = 0
+    for m in _CONVERSION.finditer(fmt):
+        if m.start() > position:
+            pieces.append(fmt[position:m.start()])
+        position = m.end()
+        flags, width, precision, conversion = m.groups()
+        if conversion == '%':
+            pieces.append('%')
+            continue
+        if conversion not in _NUMERIC and conversion != 's':
+            raise CompileError(f"Unsupported printf conversion '%{conversion}' at line {line}.")
+        # Padding is built before the output limit is checked, so no field may be wider than that limit
+        if int(width or 0) > DEFAULT_MAX_OUTPUT or int(precision or 0) > DEFAULT_MAX_OUTPUT:
+            raise CompileError(f"printf field width or precision too large at line {line}.")
+        spec = '%' + flags + width + ('.' + (precision or '0') if precision is not None else '')
+        pieces.append((spec + {'i': 'd', 'u': 'd'}.get(conversion, conversion), conversion))
+    if position < len(fmt):
+        if '%' in fmt[position:]:
+            raise CompileError(f"Incomplete printf conversion at line {line}.")
+        pieces.append(fmt[position:])
+    return tuple(pieces)
+
+
+def format_printf(pieces, args):
+    out = []
+    args = iter(args)
+    for piece in pieces:
+        if isinstance(piece, str):
+            out.append(piece)
+            continue
+        spec, conversion = piece
+        value = next(args)
+        if conversion in 'di':
+            value = int(value)
+        elif conversion in 'uoxX':
+            value = int(value) & 0xFFFFFFFF
+        elif conversion == 'c':
+            value = chr(int(value) & 0xFF)
+        elif conversion in 'fFeEgG':
+            value = float(value)
+        out.append(spec % value)
+    return ''.join(out)
+
+
+class FunctionInfo:
+    __slots__ = ('name', 'return_type', 'params', 'entry', 'template', 'line')
+
+    def __init__(self, name, return_type, params, line):
+        self.name = name
+        self.return_type = return_type
+        self.params = params      # [(storage type, name)]
+        self.entry = None         # code offset
+        self.template = []        # initial slot values of a frame: params first, then locals
+        self.line = line
+
+
+class Bytecode:
+    def __init__(self):
+        self.code = array('i')
+        self.lines = array('i')   # source line of every code cell
+        self.constants = []
+        self.constant_ids = {}
+        self.functions = []       # FunctionInfo by index
+        self.globals = []         # initial value of each global slot
+        self.entry = None         # index of the function that initializes globals and calls main
+
+    def constant(self, value):
+        key = (type(value), repr(value) if isinstance(value, float) else value)  # keeps -0.0 apart from 0.0
+        index = self.constant_ids.get(key)
+        if index is None:
+            index = self.constant_ids[key] = len(self.constants)
+            self.constants.append(value)
+        return index
+
+
+class _Label:
+    __slots__ = ('position', 'references')
+
+    def __init__(self):
+        self.position = None
+        self.references = []
+
+
+class _Compiler:
+    def __init__(self):
+        self.bytecode = Bytecode()
+        self.functions = {}  # name -> index
+        self.global_scope = {}
+        self.function = None
+        self.scopes = []
+        self.loops = []      # (break label, continue label or None for a switch)
+
+    def compile(self, tree):
+        statements = tree.statements if isinstance(tree, Program) else tree
+        if not isinstance(statements, list):
+            statements = [statements]
+        if any(stmt is None for stmt in statements):
+            raise CompileError("Cannot run a program with parse errors.")
+        bytecode = self.bytecode
+
+        # Signatures first, so calls may precede definitions
+        for stmt in statements:
+            if isinstance(stmt, FunctionDeclaration):
+                if stmt.name in self.functions or stmt.name == 'printf':
+                    raise CompileError(f"Function '{stmt.name}' at line {stmt.line} is defined twice.")
+                if stmt.body is None:
+                    raise CompileError(f"Function '{stmt.name}' at line {stmt.line} has no body.")
+                params = [(self.storage(t, stmt.line), name) for t, name in stmt.parameters]
+                return_type = 'void' if stmt.return_type == 'void' else self.storage(stmt.return_type, stmt.line)
+                self.functions[stmt.name] = len(bytecode.functions)
+                bytecode.functions.append(FunctionInfo(stmt.name, return_type, params, stmt.line))
+        if 'main' not in self.functions:
+            raise CompileError("The program has no main function.")
+
+        init = FunctionInfo('.init', 'int', [], 0)
+        bytecode.entry = len(bytecode.functions)
+        bytecode.functions.append(init)
+        self.begin(init)
+        for stmt in statements:
+            if isinstance(stmt, VariableDeclaration):
+                slot = len(bytecode.globals)
+                storage = self.storage(stmt.var_type, stmt.line)
+                bytecode.globals.append(0.0 if storage == 'float' else 0)
+                self.global_scope[stmt.name] = ('global', slot, storage)
+                if stmt.initializer is not None:
+                    self.convert(self.expression(stmt.initializer), storage, stmt.line)
+                    self.emit(STOREG, slot, line=stmt.line)
+            elif not isinstance(stmt, FunctionDeclaration):
+                self.statement(stmt)
+        self.emit(CALL, self.functions['main'])
+        self.emit(RET)
+
+        for stmt in statements:
+            if isinstance(stmt, FunctionDeclaration):
+                info = bytecode.functions[self.functions[stmt.name]]
+                self.begin(info)
+                for storage, name in info.params:
+                    self.declare(name, storage)
+                self.statement(stmt.body)
+                # Falling off the end returns zero (main's exit status in C99)
+                self.emit(CONST, bytecode.constant(0.0 if info.return_type == 'float' else 0), line=stmt.line)
+                self.emit(RET, line=stmt.line)
+        return bytecode
+
+    # Helpers
+
+    def storage(self, declared, line):
+        storage = STORAGE.get(declared)
+        if storage is None:
+            raise CompileError(f"Type '{declared}' at line {line} cannot hold a value.")
+        return storage
+
+    def begin(self, info):
+        self.function = info
+        info.entry = len(self.bytecode.code)
+        self.scopes = [{}]
+        self.loops = []
+
+    def declare(self, name, storage):
+        slot = len(self.function.template)
+        self.function.template.append(0.0 if storage == 'float' else 0)
+        self.scopes[-1][name] = ('local', slot, storage)
+        return slot
+
+    def resolve(self, name, line):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        if name in self.global_scope:
+            return self.global_scope[name]
+        raise CompileError(f"Variable '{name}' at line {line} is not declared.")
+
+    def emit(self, op, *operands, line=0):
+        code, lines = self.bytecode.code, self.bytecode.lines
+        code.append(op)
+        code.extend(operands)
+        lines.extend([line] * (1 + len(operands)))
+
+    def emit_jump(self, op, label, line=0):
+        self.emit(op, -1, line=line)
+        if label.position is None:
+            label.references.append(len(self.bytecode.code) - 1)
+        else:
+            self.bytecode.code[-1] = label.position
+
+    def place(self, label):
+        label.position = len(self.bytecode.code)
+        for reference in label.references:
+            self.bytecode.code[reference] = label.position
+
+    def convert(self, kind, storage, line):
+        # Convert the value on top of the stack, of type `kind`, for a slot of `storage` type
+        if kind == 'str':
+            raise CompileError(f"A string at line {line} can only be passed to printf.")
+        if kind == 'void':
+            raise CompileError(f"A void value at line {line} is used.")
+        if storage == 'float':
+            if kind != 'float':
+                self.emit(I2F, line=line)
+            return
+        if kind == 'float':
+            self.emit(F2I, line=line)
+        if storage == 'char':
+            self.emit(TOCHAR, line=line)
+
+    def load(self, variable, line):
+        scope, slot, _ = variable
+        self.emit(LOAD if scope == 'local' else LOADG, slot, line=line)
+
+    def store(self, variable, line):
+        scope, slot, _ = variable
+        self.emit(STORE if scope == 'local' else STOREG, slot, line=line)
+
+    # Statements
+
+    def statement(self, node):
+        if node is None:
+            raise CompileError("Cannot run a program with parse errors.")
+        line = node.line or 0
+        if isinstance(node, Block):
+            self.scopes.append({})
+            for stmt in node.statements:
+                self.statement(stmt)
+            self.scopes.pop()
+        elif isinstance(node, VariableDeclaration):
+            storage = self.storage(node.var_type, line)
+            if node.initializer is not None:
+                # The initializer is evaluated before the name comes into scope
+                self.convert(self.expression(node.initializer), storage, line)
+            else:
+                self.emit(CONST, self.bytecode.constant(0.0 if storage == 'float' else 0), line=line)
+            slot = self.declare(node.name, storage)
+            self.emit(STORE, slot, line=line)
+        elif isinstance(node, ExpressionStatement):
+            if node.expression is not None:
+                self.expression(node.expression, used=False)
+        elif isinstance(node, IfStatement):
+            otherwise, end = _Label(), _Label()
+            self.condition(node.condition, otherwise, line)
+            self.statement(node.then_branch)
+            if node.else_branch is not None:
+                self.emit_jump(JUMP, end, line=line)
+                self.place(otherwise)
+                self.statement(node.else_branch)
+            else:
+                self.place(otherwise)
+            self.place(end)
+        elif isinstance(node, WhileStatement):
+            top, end = _Label(), _Label()
+            self.place(top)
+            self.condition(node.condition, end, line)
+            self.loops.append((end, top))
+            self.statement(node.body)
+            self.loops.pop()
+            self.emit_jump(JUMP, top, line=line)
+            self.place(end)
+        elif isinstance(node, ForStatement):
+            self.scopes.append({})
+            if node.init is not None:
+                self.statement(node.init)
+            top, step, end = _Label(), _Label(), _Label()
+            self.place(top)
+            if node.condition is not None:
+                self.condition(node.condition, end, line)
+            self.loops.append((end, step))
+            self.statement(node.body)
+            self.loops.pop()
+            self.place(step)
+            if node.increment is not None:
+                self.expression(node.increment, used=False)
+            self.emit_jump(JUMP, top, line=line)
+            self.place(end)
+            self.scopes.pop()
+        elif isinstance(node, SwitchStatement):
+            self.switch(node)
+        elif isinstance(node, BreakStatement):
+            if not self.loops:
+                raise CompileError(f"'break' at line {line} is not inside a loop or switch.")
+            self.emit_jump(JUMP, self.loops[-1][0], line=line)
+        elif isinstance(node, ContinueStatement):
+            target = next((cont for _, cont in reversed(self.loops) if cont is not None), None)
+            if target is None:
+                raise CompileError(f"'continue' at line {line} is not inside a loop.")
+            self.emit_jump(JUMP, target, line=line)
+        elif isinstance(node, ReturnStatement):
+            return_type = self.function.return_type
+            if node.value is None or return_type == 'void':
+                if node.value is not None:
+                    self.expression(node.value, used=False)
+                self.emit(CONST, self.bytecode.constant(0.0 if return_type == 'float' else 0), line=line)
+            else:
+                self.convert(self.expression(node.value), return_type, line)
+            self.emit(RET, line=line)
+        elif isinstance(node, FunctionDeclaration):
+            raise CompileError(f"Function '{node.name}' at line {line} is defined inside another function.")
+        else:
+            raise CompileError(f"Cannot run {type(node).__name__} at line {line}.")
+
+    def condition(self, expr, otherwise, line):
+        # Jumps to `otherwise` when expr is false
+        kind = self.expression(expr)
+        if kind in ('str', 'void'):
+            raise CompileError(f"The condition at line {line} is not a number.")
+        if isinstance(expr, BinaryOperation) and expr.operator in COMPARISONS:
+            # The comparison was emitted last; fuse it with the jump
+            self.bytecode.code.pop()
+            self.bytecode.lines.pop()
+            self.emit_jump(JUMPNLT + COMPARISONS[expr.operator] - LT, otherwise, line=line)
+            return
+        self.emit_jump(JUMPIFNOT, otherwise, line=line)
+
+    def switch(self, node):
+        line = node.line or 0
+        self.convert(self.expression(node.expression), 'int', line)
+        value = self.declare('.switch', 'int')  # a name no program can refer to
+        self.emit(STORE, value, line=line)
+        end = _Label()
+        bodies = []
+        for case in node.cases:
+            label = _Label()
+            bodies.append((label, case))
+            self.emit(LOAD, value, line=case.line or line)
+            self.convert(self.expression(case.value), 'int', case.line or line)
+            self.emit(EQ, line=case.line or line)
+            self.emit_jump(JUMPIF, label, line=case.line or line)
+        default = _Label() if node.default is not None else end
+        self.emit_jump(JUMP, default, line=line)
+        self.loops.append((end, None))
+        for label, case in bodies:
+            self.place(label)
+            self.statement(case.body)
+        if node.default is not None:
+            self.place(default)
+            self.statement(node.default.body)
+        self.loops.pop()
+        self.place(end)
+
+    # Expressions
+
+    def expression(self, node, used=True):
+        # Emits code leaving the value on the stack (nothing when not `used`); returns its type:
+        # 'int', 'float', 'str' or 'void'
+        if node is None:
+            raise CompileError("Cannot run a program with parse errors.")
+        line = node.line or 0
+        kind = self.value(node, line, used)
+        if not used and kind != 'none':
+            self.emit(POP, line=line)
+        return kind
+
+    def value(self, node, line, used):
+        # Like expression(), but may return 'none' when `used` is false and nothing was pushed
+        bytecode = self.bytecode
+        if isinstance(node, Number):
+            value = constant_value(node)
+            if value is None:
+                raise CompileError(f"'{node.value}' at line {line} is not a valid number.")
+            if isinstance(value, float):
+                self.emit(CONST, bytecode.constant(value), line=line)
+                return 'float'
+            self.emit(CONST, bytecode.constant(wrap_int(value)), line=line)
+            return 'int'
+        if isinstance(node, CharNode):
+            text = unescape(node.value)
+            if len(text) != 1:
+                raise CompileError(f"'{node.value}' at line {line} is not a single character.")
+            self.emit(CONST, bytecode.constant(wrap_char(ord(text))), line=line)
+            return 'int'
+        if isinstance(node, StringNode):
+            self.emit(CONST, bytecode.constant(unescape(node.value)), line=line)
+            return 'str'
+        if isinstance(node, VariableNode):
+            variable = self.resolve(node.name, line)
+            self.load(variable, line)
+            return 'float' if variable[2] == 'float' else 'int'
+        if isinstance(node, BinaryOperation):
+            if node.operator == '=':
+                return self.assign(node.left, node.right, line, used)
+            if node.operator in ('&&', '||'):
+                return self.logical(node, line)
+            return self.binary(node.operator, self.expression(node.left), node.right, line)
+        if isinstance(node, AssignmentExpression):
+            if node.operator == '=':
+                return self.assign(node.left, node.right, line, used)
+            variable = self.variable(node.left, line)
+            self.load(variable, line)
+            kind = 'float' if variable[2] == 'float' else 'int'
+            self.convert(self.binary(COMPOUND[node.operator], kind, node.right, line), variable[2], line)
+            return self.store_result(variable, line, used)
+        if isinstance(node, UnaryOperation):
+            if node.operator in ('++', '--'):
+                return self.increment(node, line, used)
+            kind = self.expression(node.operand)
+            if kind in ('str', 'void'):
+                raise CompileError(f"Operator '{node.operator}' at line {line} needs a number.")
+            if node.operator == '-':
+                self.emit(FNEG if kind == 'float' else INEG, line=line)
+            elif node.operator == '!':
+                self.emit(NOT, line=line)
+                return 'int'
+            elif node.operator == '~':
+                if kind == 'float':
+                    raise CompileError(f"Operator '~' at line {line} needs an integer.")
+                self.emit(BITNOT, line=line)
+            elif node.operator != '+':
+                raise CompileError(f"Unknown operator '{node.operator}' at line {line}.")
+            return kind
+        if isinstance(node, FunctionCallNode):
+            return self.call(node, line)
+        raise CompileError(f"Cannot run {type(node).__name__} at line {line}.")
+
+    def binary(self, op, left, right_node, line):
+        # The left operand, of type `left`, is on the stack
+        right = self.expression(right_node)
+        if left in ('str', 'void') or right in ('str', 'void'):
+            raise CompileError(f"Operator '{op}' at line {line} needs numbers.")
+        floating = left == 'float' or right == 'float'
+        if floating and left != 'float':
+            self.emit(I2F2, line=line)
+        elif floating and right != 'float':
+            self.emit(I2F, line=line)
+        if op in COMPARISONS:
+            self.emit(COMPARISONS[op], line=line)
+            return 'int'
+        if op not in ARITHMETIC:
+            raise CompileError(f"Unknown operator '{op}' at line {line}.")
+        int_op, float_op = ARITHMETIC[op]
+        if floating and float_op is None:
+            raise CompileError(f"Operator '{op}' at line {line} needs integers.")
+        self.emit(float_op if floating else int_op, line=line)
+        return 'float' if floating else 'int'
+
+    def logical(self, node, line):
+        # 0 or 1; the right operand is skipped once the left decides
+        short, end = _Label(), _Label()
+        jump = JUMPIFNOT if node.operator == '&&' else JUMPIF
+        for operand in (node.left, node.right):
+            if self.expression(operand) in ('str', 'void'):
+                raise CompileError(f"Operator '{node.operator}' at line {line} needs numbers.")
+            self.emit_jump(jump, short, line=line)
+        self.emit(CONST, self.bytecode.constant(int(node.operator == '&&')), line=line)
+        self.emit_jump(JUMP, end, line=line)
+        self.place(short)
+        self.emit(CONST, self.bytecode.constant(int(node.operator == '||')), line=line)
+        self.place(end)
+        return 'int'
+
+    def variable(self, node, line):
+        if not isinstance(node, VariableNode):
+            raise CompileError(f"The left side of the assignment at line {line} is not a variable.")
+        return self.resolve(node.name, line)
+
+    def store_result(self, variable, line, used):
+        if used:
+            self.emit(DUP, line=line)
+        self.store(variable, line)
+        if not used:
+            return 'none'
+        return 'float' if variable[2] == 'float' else 'int'
+
+    def assign(self, left, right, line, used):
+        # ((a = b) = c) from the parser's left-associative '=' means a = (b = c)
+        if isinstance(left, BinaryOperation) and left.operator == '=':
+            inner = BinaryOperation('=', left.right, right)
+            inner.line = line
+            return self.assign(left.left, inner, line, used)
+        variable = self.variable(left, line)
+        self.convert(self.expression(right), variable[2], line)
+        return self.store_result(variable, line, used)
+
+    def increment(self, node, line, used):
+        variable = self.variable(node.operand, line)
+        scope, slot, storage = variable
+        delta = 1 if node.operator == '++' else -1
+        if not used and scope == 'local' and storage == 'int':
+            self.emit(INCLOCAL, slot, delta, line=line)
+            return 'none'
+        self.load(variable, line)
+        if node.postfix and used:
+            self.emit(DUP, line=line)  # the old value is the result
+        if storage == 'float':
+            self.emit(CONST, self.bytecode.constant(float(delta)), line=line)
+            self.emit(FADD, line=line)
+        else:
+            self.emit(CONST, self.bytecode.constant(delta), line=line)
+            self.emit(IADD, line=line)
+            if storage == 'char':
+                self.emit(TOCHAR, line=line)
+        if not node.postfix:
+            return self.store_result(variable, line, used)
+        self.store(variable, line)
+        if not used:
+            return 'none'
+        return 'float' if storage == 'float' else 'int'
+
+    def call(self, node, line):
+        if node.name == 'printf':
+            if not node.args or not isinstance(node.args[0], StringNode):
+                raise CompileError(f"printf at line {line} needs a string literal format.")
+            pieces = parse_format(unescape(node.args[0].value), line)
+            conversions = [piece[1] for piece in pieces if not isinstance(piece, str)]
+            if len(node.args) - 1 < len(conversions):
+                raise CompileError(f"printf at line {line} has {len(conversions)} conversion(s) "
+                                   f"but {len(node.args) - 1} argument(s).")
+            for arg, conversion in zip(node.args[1:], conversions + [None] * len(node.args)):
+                kind = self.expression(arg)
+                if kind == 'void' or (conversion is not None and (kind == 'str') != (conversion == 's')):
+                    raise CompileError(f"printf argument at line {line} does not match its '%{conversion}' conversion.")
+            self.emit(PRINTF, self.bytecode.constant(pieces), len(node.args) - 1, line=line)
+            return 'int'
+        index = self.functions.get(node.name)
+        if index is None:
+            raise CompileError(f"Function '{node.name}' at line {line} is not defined.")
+        info = self.bytecode.functions[index]
+        if len(node.args) != len(info.params):
+            raise CompileError(f"Function '{node.name}' at line {line} takes {len(info.params)} "
+                               f"argument(s), not {len(node.args)}.")
+        for arg, (storage, _) in zip(node.args, info.params):
+            self.convert(self.expression(arg), storage, line)
+        self.emit(CALL, index, line=line)
+        return 'void' if info.return_type == 'void' else 'float' if info.return_type == 'float' else 'int'
+
+
+def compile_program(tree):
+    """Compile a parsed tree to Bytecode; raises CompileError for programs it cannot run."""
+    try:
+        return _Compiler().compile(tree)
+    except RecursionError:
+        raise CompileError("The program is nested too deeply to compile.") from None
+
+
+class RunResult:
+    def __init__(self, output, exit_code, instructions, seconds, error=None, limit=None, line=None):
+        self.output = output
+        self.exit_code = exit_code        # main's return value, None if the program did not finish
+        self.instructions = instructions  # instructions executed
+        self.seconds = seconds
+        self.error = error                # runtime error message
+        self.limit = limit                # the limit that stopped the program, if one did
+        self.line = line                  # source line of the failing instruction
+
+    def to_dict(self):
+        result = {"output": self.output, "exitCode": self.exit_code,
+                  "instructions": self.instructions, "seconds": round(self.seconds, 6)}
+        if self.error is not None:
+            result["error"] = self.error
+            result["line"] = self.line
+            if self.limit is not None:
+                result["limit"] = self.limit
+        return result
+
+
+def run(bytecode, max_instructions=DEFAULT_MAX_INSTRUCTIONS, max_seconds=DEFAULT_MAX_SECONDS,
+        max_output=DEFAULT_MAX_OUTPUT, max_depth=DEFAULT_MAX_DEPTH):
+    """Execute compiled bytecode and return a RunResult; runtime errors are reported in it, not raised."""
+    output = []
+    state = {"pc": 0, "executed": 0}
+    started = time.perf_counter()
+    try:
+        exit_code = _execute(bytecode, output, state, max_instructions, started + max_seconds, max_output, max_depth)
+        error = limit = line = None
+    except VMError as e:
+        exit_code, error, limit = None, str(e), e.limit
+        line = bytecode.lines[state["pc"]] or None
+    return RunResult(''.join(output), exit_code, state["executed"], time.perf_counter() - started,
+                     error, limit, line)
+
+
+def _execute(bytecode, output, state, max_instructions, deadline, max_output, max_depth):
+    # The dispatch loop; the most frequent opcodes are tested first
+    code = bytecode.code.tolist()  # list indexing is cheaper than array indexing
+    constants = bytecode.constants
+    functions = bytecode.functions
+    globals_ = list(bytecode.globals)
+    entry = functions[bytecode.entry]
+    frame = list(entry.template)
+    frames = []
+    stack = []
+    push, pop = stack.append, stack.pop
+    pc = entry.entry
+    budget = max_instructions
+    next_check = budget - CHECK_INTERVAL
+    printed = 0
+    clock = time.perf_counter
+    try:
+        while True:
+            op = code[pc]
+            budget -= 1
+            if budget < next_check:
+                if budget < 0:
+                    raise VMError(f"instruction limit of {max_instructions} exceeded", 'instructions')
+                next_check = budget - CHECK_INTERVAL
+                if clock() > deadline:
+                    raise VMError("time limit exceeded", 'seconds')
+            if op == LOAD:
+                push(frame[code[pc + 1]])
+                pc += 2
+            elif op == CONST:
+                push(constants[code[pc + 1]])
+                pc += 2
+            elif op == STORE:
+                frame[code[pc + 1]] = pop()
+                pc += 2
+            elif op == JUMPIFNOT:
+                pc = code[pc + 1] if not pop() else pc + 2
+            elif op >= JUMPNLT:
+                b = pop()
+                a = pop()
+                if op == JUMPNLT:
+                    taken = not a < b
+                elif op == JUMPNLE:
+                    taken = not a <= b
+                elif op == JUMPNGT:
+                    taken = not a > b
+                elif op == JUMPNGE:
+                    taken = not a >= b
+                elif op == JUMPNEQ:
+                    taken = a != b
+                else:
+                    taken = a == b
+                pc = code[pc + 1] if taken else pc + 2
+            elif op < LT:
+                if op == IADD:
+                    b = pop()
+                    v = stack[-1] + b
+                    stack[-1] = v if INT_MIN <= v <= INT_MAX else wrap_int(v)
+                elif op == ISUB:
+                    b = pop()
+                    v = stack[-1] - b
+                    stack[-1] = v if INT_MIN <= v <= INT_MAX else wrap_int(v)
+                elif op == IMUL:
+                    b = pop()
+                    v = stack[-1] * b
+                    stack[-1] = v if INT_MIN <= v <= INT_MAX else wrap_int(v)
+                elif op == POP:
+                    pop()
+                elif op == DUP:
+                    push(stack[-1])
+                elif op == IDIV:
+                    b = pop()
+                    stack[-1] = divide(stack[-1], b, '/')
+                elif op == IMOD:
+                    b = pop()
+                    stack[-1] = divide(stack[-1], b, '%')
+                elif op == INEG:
+                    stack[-1] = wrap_int(-stack[-1])
+                elif op == FADD:
+                    b = pop()
+                    stack[-1] += b
+                elif op == FSUB:
+                    b = pop()
+                    stack[-1] -= b
+                elif op == FMUL:
+                    b = pop()
+                    stack[-1] *= b
+                elif op == FDIV:
+                    b = pop()
+                    stack[-1] = float_divide(stack[-1], b)
+                else:  # FNEG
+                    stack[-1] = -stack[-1]
+                pc += 1
+            elif op <= NE:
+                b = pop()
+                a = stack[-1]
+                if op == LT:
+                    stack[-1] = 1 if a < b else 0
+                elif op == LE:
+                    stack[-1] = 1 if a <= b else 0
+                elif op == GT:
+                    stack[-1] = 1 if a > b else 0
+                elif op == GE:
+                    stack[-1] = 1 if a >= b else 0
+                elif op == EQ:
+                    stack[-1] = 1 if a == b else 0
+                else:
+                    stack[-1] = 1 if a != b else 0
+                pc += 1
+            elif op == JUMP:
+                pc = code[pc + 1]
+            elif op == INCLOCAL:
+                slot = code[pc + 1]
+                v = frame[slot] + code[pc + 2]
+                frame[slot] = v if INT_MIN <= v <= INT_MAX else wrap_int(v)
+                pc += 3
+            elif op == JUMPIF:
+                pc = code[pc + 1] if pop() else pc + 2
+            elif op == LOADG:
+                push(globals_[code[pc + 1]])
+                pc += 2
+            elif op == STOREG:
+                globals_[code[pc + 1]] = pop()
+                pc += 2
+            elif op == CALL:
+                info = functions[code[pc + 1]]
+                if len(frames) >= max_depth:
+                    raise VMError(f"call depth limit of {max_depth} exceeded", 'depth')
+                frames.append((pc + 2, frame))
+                frame = list(info.template)
+                count = len(info.params)
+                if count:
+                    frame[:count] = stack[-count:]
+                    del stack[-count:]
+                pc = info.entry
+            elif op == RET:
+                if not frames:
+                    return pop()
+                pc, frame = frames.pop()
+            elif op == PRINTF:
+                count = code[pc + 2]
+                args = stack[len(stack) - count:]
+                del stack[len(stack) - count:]
+                text = format_printf(constants[code[pc + 1]], args)
+                printed += len(text)
+                if printed > max_output:
+                    output.append(text[:len(text) - (printed - max_output)])
+                    raise VMError(f"output limit of {max_output} characters exceeded", 'output')
+                output.append(text)
+                push(len(text))
+                pc += 3
+            elif op == NOT:
+                stack[-1] = 0 if stack[-1] else 1
+                pc += 1
+            elif op == BITNOT:
+                stack[-1] = ~stack[-1]
+                pc += 1
+            elif op == I2F:
+                stack[-1] = float(stack[-1])
+                pc += 1
+            elif op == I2F2:
+                stack[-2] = float(stack[-2])
+                pc += 1
+            elif op == F2I:
+                stack[-1] = float_to_int(stack[-1])
+                pc += 1
+            elif op == TOCHAR:
+                stack[-1] = wrap_char(stack[-1])
+                pc += 1
+            else:
+                raise VMError(f"bad opcode {op} at {pc}")
+    finally:
+        state["pc"] = pc
+        state["executed"] = max_instructions - max(budget, 0)
+
+
+def disassemble(bytecode):
+    starts = {info.entry: info for info in bytecode.functions}
+    lines = []
+    pc = 0
+    code = bytecode.code
+    while pc < len(code):
+        if pc in starts:
+            info = starts[pc]
+            params = ', '.join(f"{t} {name}" for t, name in info.params)
+            lines.append(f"{info.name}({params}) -> {info.return_type}, {len(info.template)} slot(s):")
+        op = code[pc]
+        operands = list(code[pc + 1:pc + 1 + OPERAND_COUNTS[op]])
+        text = f"  {pc:5d}  {OPCODE_NAMES[op]:<10}"
+        if op == CONST:
+            text += f" {bytecode.constants[operands[0]]!r}"
+        elif op == CALL:
+            text += f" {bytecode.functions[operands[0]].name}"
+        elif op == PRINTF:
+            text += f" {''.join(p if isinstance(p, str) else p[0] for p in bytecode.constants[operands[0]])!r} {operands[1]}"
+        elif operands:
+            text += ' ' + ' '.join(map(str, operands))
+        lines.append(f"{text:<44} ; line {bytecode.lines[pc]}" if bytecode.lines[pc] else text)
+        pc += 1 + OPERAND_COUNTS[op]
+    return '\n'.join(lines) + '\n'
+
+
+def compile_source(source):
+    """Lex, parse and compile source text; raises CompileError listing lexical or syntax errors."""
+    import contextlib
+    import io
+    from lexical import Lexical
+    from parser import Parser
+    tokens, lexical_errors = Lexical(source).get_tokens()
+    with contextlib.redirect_stdout(io.StringIO()):
+        parser = Parser(tokens)
+        tree = parser.parse()
+    errors = list(lexical_errors) + list(parser.errors)
+    if errors:
+        raise CompileError(f"{len(errors)} error(s) before compiling, first: {errors[0]}")
+    return compile_program(tree)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile a C-subset program to bytecode and run it.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_parser = sub.add_parser("run")
+    run_parser.add_argument("file")
+    run_parser.add_argument("--max-instructions", type=int, default=DEFAULT_MAX_INSTRUCTIONS)
+    run_parser.add_argument("--max-seconds", type=float, default=DEFAULT_MAX_SECONDS)
+    dis_parser = sub.add_parser("dis")
+    dis_parser.add_argument("file")
+    args = parser.parse_args()
+
+    with open(args.file) as f:
+        source = f.read()
+    try:
+        bytecode = compile_source(source)
+    except CompileError as e:
+        sys.exit(f"error: {e}")
+    if args.command == "dis":
+        print(disassemble(bytecode), end='')
+        return
+    result = run(bytecode, args.max_instructions, args.max_seconds)
+    sys.stdout.write(result.output)
+    if result.error is not None:
+        sys.exit(f"error: {result.error}" + (f" (line {result.line})" if result.line else ""))
+    print(f"[exit {result.exit_code}, {result.instructions} instructions, {result.seconds:.3f}s]", file=sys.stderr)
+    sys.exit(result.exit_code & 0xFF)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+Bounded pool of analysis worker processes with time budgets.
+
+/analyze hands each job to one of a fixed number of worker processes
+instead of running the pipeline on the request thread:
+
+- Admission is bounded: at most `size` jobs run and `max_queue` more wait
+  for a worker. A request beyond that is refused at once (Overloaded, 429),
+  and one that waits longer than `queue_timeout` gives up (Overloaded, 503).
+- Every phase runs under its own budget inside the worker (SIGALRM
+  interrupts the phase), and the whole job under a total budget enforced by
+  the parent, which kills a worker that does not answer in time.
+- Workers are replaced after `max_jobs` jobs or once their resident memory
+  passes `max_rss` bytes, so slow leaks and fragmentation do not pile up.
+
+Jobs and replies carry serialized phase blobs (see cache.PHASE_CODECS): the
+parent sends whatever phases its result cache already holds and gets back
+the ones the worker computed, ready to be cached, along with the phase
+stats of the job (see pipeline.analyze_source). Profiled analyses (see
+profiling.py) run in a worker too, under the same admission and budgets.
+"""
+
+import contextlib
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+
+from cache import PHASE_CODECS
+from pipeline import PHASES, AnalysisResult, analyze_source, source_key
+from profiling import profile_analysis
+
+
+class Overloaded(Exception):
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+class BudgetExceeded(Exception):
+    def __init__(self, phase, budget):
+        where = "in total" if phase == 'total' else f"in phase '{phase}'"
+        super().__init__(f"Analysis exceeded its {budget:g}s time budget {where}")
+        self.phase = phase
+        self.budget = budget
+
+
+class WorkerCrashed(Exception):
+    pass
+
+
+# === Worker process side ===
+
+class _PhaseTimeout(Exception):
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise _PhaseTimeout()
+
+
+class _JobCache:
+    # Cache interface over the blobs of a single job: serves the phases the parent
+    # already had and records the ones computed here.
+    def __init__(self, known):
+        self.known = known
+        self.produced = {}
+
+    def get(self, key, phase):
+        blob = self.known.get(phase)
+        return PHASE_CODECS[phase][1](blob) if blob is not None else None
+
+    def put(self, key, phase, value):
+        self.produced[phase] = PHASE_CODECS[phase][0](value)
+
+
+def _rss():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _worker_main(conn, phase_budgets):
+    can_alarm = hasattr(signal, 'setitimer')
+    if can_alarm:
+        signal.signal(signal.SIGALRM, _on_alarm)
+    current = [None]
+
+    @contextlib.contextmanager
+    def budget(phase):
+        current[0] = phase
+        limit = phase_budgets.get(phase)
+        if limit and can_alarm:
+            signal.setitimer(signal.ITIMER_REAL, limit)
+        try:
+            yield
+        finally:
+            if limit and can_alarm:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        source, known, phases, profile = job
+        cache = _JobCache(known)
+        stats = {}
+        try:
+            if profile is None:
+                analyze_source(source, cache, around_phase=budget, phases=phases, stats=stats)
+                reply = ('ok', (cache.produced, stats))
+            else:
+                _, summary = profile_analysis(source, phases, around_phase=budget, cache=cache, **profile)
+                reply = ('ok', (cache.produced, summary))
+        except _PhaseTimeout:
+            reply = ('timeout', current[0])
+        except Exception as e:
+            reply = ('error', f"{type(e).__name__}: {e}")
+        conn.send(reply + (_rss(),))
+
+
+# === Parent side ===
+
+def _mp_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+class _Worker:
+    def __init__(self, ctx, phase_budgets):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child, phase_budgets), daemon=True)
+        self.process.start()
+        child.close()
+        self.jobs = 0
+
+    def stop(self, kill=False):
+        if kill:
+            self.process.kill()
+        else:
+            try:
+                self.conn.send(None)
+            except OSError:
+                pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+def _result(blobs, phases):
+    values = {phase: PHASE_CODECS[phase][1](blobs[phase]) for phase in phases}
+    tokens, lexical_errors = values.get('tokens', (None, None))
+    ast, parser_errors = values.get('ast', (None, None))
+    return AnalysisResult(tokens, lexical_errors, ast, parser_errors, values.get('diagnostics'))
+
+
+class WorkerPool:
+    def __init__(self, size=None, max_queue=None, queue_timeout=5.0, total_budget=10.0,
+                 phase_budgets=None, max_jobs=500, max_rss=512 * 1024 * 1024):
+        self.size = size or multiprocessing.cpu_count()
+        self.max_queue = self.size * 4 if max_queue is None else max_queue
+        self.queue_timeout = queue_timeout
+        self.total_budget = total_budget
+        self.phase_budgets = dict(phase_budgets or {})
+        self.max_jobs = max_jobs
+        self.max_rss = max_rss
+        self.admission = threading.BoundedSemaphore(self.size + self.max_queue)
+        self.idle = queue.LifoQueue()  # most recently used first, its memory is warm
+        self.ctx = _mp_context()
+        self.started = False
+        self.lock = threading.Lock()
+        self.killed = 0
+        self.recycled = 0
+        self.rejected = 0
+
+    def start(self):
+        with self.lock:
+            if not self.started:
+                for _ in range(self.size):
+                    self.idle.put(_Worker(self.ctx, self.phase_budgets))
+                self.started = True
+
+    def _replace(self, worker, kill):
+        worker.stop(kill=kill)
+        self.idle.put(_Worker(self.ctx, self.phase_budgets))
+
+    def run(self, source, known, phases=PHASES, profile=None):
+        """
+        Run one job and return (phase blobs it produced, its phase stats), or
+        with `profile` (profile_analysis keyword arguments) the profile summary
+        in place of the stats. Raises Overloaded, BudgetExceeded or
+        WorkerCrashed; other failures come back as RuntimeError.
+        """
+        self.start()
+        if not self.admission.acquire(blocking=False):
+            with self.lock:
+                self.rejected += 1
+            raise Overloaded("Analysis queue is full", 429)
+        try:
+            try:
+                worker = self.idle.get(timeout=self.queue_timeout)
+            except queue.Empty:
+                with self.lock:
+                    self.rejected += 1
+                raise Overloaded("Timed out waiting for an analysis worker", 503)
+
+            try:
+                worker.conn.send((source, known, phases, profile))
+                if not worker.conn.poll(self.total_budget):
+                    with self.lock:
+                        self.killed += 1
+                    self._replace(worker, kill=True)
+                    raise BudgetExceeded('total', self.total_budget)
+                status, payload, rss = worker.conn.recv()
+            except (EOFError, OSError):
+                self._replace(worker, kill=True)
+                raise WorkerCrashed("Analysis worker exited unexpectedly")
+
+            worker.jobs += 1
+            if worker.jobs >= self.max_jobs or rss > self.max_rss:
+                with self.lock:
+                    self.recycled += 1
+                self._replace(worker, kill=False)
+            else:
+                self.idle.put(worker)
+        finally:
+            self.admission.release()
+
+        if status == 'timeout':
+            raise BudgetExceeded(payload, self.phase_budgets.get(payload, self.total_budget))
+        if status == 'error':
+            raise RuntimeError(payload)
+        return payload
+
+    def analyze(self, source, cache=None, phases=PHASES, stats=None):
+        # Like pipeline.analyze_source, with the missing phases computed in a worker
+        key = source_key(source)
+        blobs = {}
+
+        def lookup(wanted):
+            for phase in wanted:
+                blob = cache.get_blob(key, phase)
+                if blob is not None:
+                    blobs[phase] = blob
+
+        if cache is not None:
+            lookup(phases)
+        if any(phase not in blobs for phase in phases):
+            # Cached earlier phases spare the worker from recomputing them
+            if cache is not None:
+                deepest = max(PHASES.index(phase) for phase in phases)
+                lookup([phase for phase in PHASES[:deepest] if phase not in phases])
+            produced, job_stats = self.run(source, blobs, phases)
+            if stats is not None:
+                stats.update(job_stats)
+            if cache is not None:
+                for phase, blob in produced.items():
+                    cache.put_blob(key, phase, blob)
+            blobs.update(produced)
+        return _result(blobs, phases)
+
+    def profile(self, source, phases=PHASES, directory=None, limit=30, cache=None):
+        # Like profiling.profile_analysis: every phase runs, under the profiler, in a worker
+        produced, summary = self.run(source, {}, phases, profile={"directory": directory, "limit": limit})
+        if cache is not None:
+            key = source_key(source)
+            for phase, blob in produced.items():
+                cache.put_blob(key, phase, blob)
+        return _result(produced, phases), summary
+
+    def stats(self):
+        with self.lock:
+            return {
+                "workers": self.size,
+                "idle": self.idle.qsize(),
+                "maxQueue": self.max_queue,
+                "rejected": self.rejected,
+                "killed": self.killed,
+                "recycled": self.recycled,
+            }
+
+    def shutdown(self):
+        with self.lock:
+            self.started = False
+        while True:
+            try:
+                self.idle.get_nowait().stop()
+            except queue.Empty:
+                break